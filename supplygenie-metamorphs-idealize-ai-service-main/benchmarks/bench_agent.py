@@ -0,0 +1,191 @@
+"""
+Offline benchmark of the recommendation pipeline.
+
+Replays recorded fixtures (see src/replay.py) against src.main:app in-process
+and reports latency, agent steps, LLM tokens, allocations and throughput at
+increasing concurrency. No OpenAI, Tavily or MongoDB access is needed.
+
+    python -m benchmarks.bench_agent --concurrency 1 4 16 --requests 32
+    python -m benchmarks.bench_agent --fixture path/to/recorded.json --llm-latency 0.5
+    python -m benchmarks.bench_agent --fixture benchmarks/fixtures/zinc_die_casting_fast.json
+
+A fixture's "mode" (default "agent") selects the pipeline it is replayed on.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Keys are never sent anywhere; the clients are replaced by replay fakes
+os.environ.setdefault("OPENAI_API_KEY", "replay")
+os.environ.setdefault("TAVILY_API_KEY", "replay")
+# Every request replays the fixture's query; a shared Tavily cache would
+# answer all but the first without the recorded upstream calls
+os.environ.setdefault("SHARED_CACHE_ENABLED", "false")
+
+import httpx
+
+from src import metrics
+from src.main import app
+from src.replay import install_replay, load_fixture
+
+DEFAULT_FIXTURE = Path(__file__).parent / "fixtures" / "zinc_die_casting.json"
+ENDPOINT = "/api/v1/supply-chain/recommendations"
+
+
+def request_payload(fixture: dict) -> dict:
+    return {
+        "query": fixture["query"],
+        "chat_history": fixture.get("chat_history"),
+        "mode": fixture.get("mode", "agent"),
+    }
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _token_total(counters: dict) -> float:
+    return sum(
+        value
+        for name, value in counters.items()
+        if name.startswith("llm.") and name.endswith("_tokens")
+    )
+
+
+async def run_level(fixture: dict, concurrency: int, total: int, stats) -> dict:
+    payload = request_payload(fixture)
+    latencies: list[float] = []
+    failures = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    calls_before = stats.snapshot()["calls"]
+    tokens_before = _token_total(metrics.snapshot()["counters"])
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+
+        async def one_request():
+            nonlocal failures
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(ENDPOINT, json=payload)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200 or not response.json().get("suppliers"):
+                    failures += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+
+    calls_after = stats.snapshot()["calls"]
+    llm_calls = calls_after.get("llm", 0) - calls_before.get("llm", 0)
+    tool_calls = sum(calls_after.values()) - sum(calls_before.values()) - llm_calls
+    tokens = _token_total(metrics.snapshot()["counters"]) - tokens_before
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "failures": failures,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "max_ms": max(latencies) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "throughput_rps": total / elapsed,
+        "llm_steps": llm_calls / total,
+        "tool_calls": tool_calls / total,
+        "tokens": tokens / total,
+    }
+
+
+async def measure_allocations(fixture: dict) -> dict:
+    """
+    Allocation profile of a single request, measured separately because
+    tracemalloc slows everything down and would distort the latency numbers.
+    """
+    payload = request_payload(fixture)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post(ENDPOINT, json=payload)  # warm up imports and caches
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        await client.post(ENDPOINT, json=payload)
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    diff = after.compare_to(before, "filename")
+    allocated = sum(stat.size_diff for stat in diff if stat.size_diff > 0)
+    blocks = sum(stat.count_diff for stat in diff if stat.count_diff > 0)
+    return {
+        "allocated_kb": allocated / 1024,
+        "allocated_blocks": blocks,
+        "peak_kb": peak / 1024,
+    }
+
+
+def print_table(rows: list[dict]) -> None:
+    columns = list(rows[0].keys())
+    print("(llm_steps, tool_calls and tokens are per request)")
+    print(" | ".join(f"{c:>14}" for c in columns))
+    for row in rows:
+        print(
+            " | ".join(
+                f"{row[c]:>14.2f}" if isinstance(row[c], float) else f"{row[c]:>14}"
+                for c in columns
+            )
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fixture", default=str(DEFAULT_FIXTURE))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="requests per level")
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.0, help="simulated seconds per LLM call"
+    )
+    parser.add_argument(
+        "--tool-latency", type=float, default=0.0, help="simulated seconds per Tavily call"
+    )
+    parser.add_argument("--verbose", action="store_true", help="keep service logs")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        from src.utils import get_logger
+
+        get_logger().remove()
+        get_logger().add(sys.stderr, level="ERROR")
+
+    fixture = load_fixture(args.fixture)
+    stats = install_replay(fixture, args.llm_latency, args.tool_latency)
+
+    print(f"Fixture: {args.fixture}")
+    print(f"Query: {fixture['query'][:100]}")
+    rows = [
+        await run_level(fixture, concurrency, args.requests, stats)
+        for concurrency in args.concurrency
+    ]
+    print_table(rows)
+
+    allocations = await measure_allocations(fixture)
+    print(
+        f"Allocations per request: {allocations['allocated_kb']:.1f} KiB in "
+        f"{allocations['allocated_blocks']} blocks (peak traced {allocations['peak_kb']:.1f} KiB)"
+    )
+    misses = stats.snapshot()["misses"]
+    if misses:
+        print(f"Replay misses (served by fallback): {misses}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+"""
+Benchmark of the hot supplier index (src/hotindex.py).
+
+Stores synthetic suppliers, then times repeated query_mongodb searches
+answered from the warm index next to the same searches as MongoDB finds.
+Without --mongo-uri the suppliers live in the replay's in-memory
+collection, whose finds are a Python scan; pass a real server to compare
+against MongoDB round trips:
+
+    python -m benchmarks.bench_hot_index --suppliers 20000 --repeat 200
+    python -m benchmarks.bench_hot_index --mongo-uri mongodb://localhost:27017
+"""
+
+import argparse
+import time
+
+from pymongo import MongoClient
+
+from benchmarks.bench_ranking import synthetic_suppliers
+from src.config import SEARCH_INDEX_NAME, SEARCH_INDEX_SPEC, SUPPLIER_INTERNAL_FIELDS
+from src.hotindex import HotSupplierIndex
+from src.models import SupplierSearchIndexQuery
+from src.ranking import within_numeric_bounds
+from src.replay import InMemoryCollection
+
+QUERIES = {
+    "location": SupplierSearchIndexQuery(location="Shenzhen, China"),
+    "specialties": SupplierSearchIndexQuery(
+        specialties=["zinc die casting"], certifications=["ISO 9001:2015"]
+    ),
+    "text": SupplierSearchIndexQuery(query="zinc casting", location="Pune, India"),
+    "bounds": SupplierSearchIndexQuery(
+        specialties=["zinc die casting"], max_price=8, max_lead_time_days=30
+    ),
+}
+
+
+def mongo_find(collection, search_query: SupplierSearchIndexQuery) -> list[dict]:
+    return [
+        document
+        for document in collection.find(
+            search_query.build_filter(), {name: 0 for name in SUPPLIER_INTERNAL_FIELDS}
+        )
+        if within_numeric_bounds(document, search_query)
+    ]
+
+
+def mean_us(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--suppliers", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--mongo-uri", help="benchmark against this server (uses a scratch collection)")
+    args = parser.parse_args()
+
+    if args.mongo_uri:
+        collection = MongoClient(args.mongo_uri)["supplygenie_bench"]["hot_index"]
+        collection.drop()
+        collection.create_index(SEARCH_INDEX_SPEC, name=SEARCH_INDEX_NAME)
+        collection.create_index("location")
+        collection.create_index("specialties")
+    else:
+        collection = InMemoryCollection("hot_index")
+    collection.insert_many(synthetic_suppliers(args.suppliers))
+
+    index = HotSupplierIndex(
+        max_bytes=512 * 1024 * 1024, eviction="lru", max_posting=args.suppliers, ttl=3600
+    )
+    index.activate("benchmark")
+
+    print(f"Suppliers: {args.suppliers}, mean of {args.repeat} runs")
+    print(f"{'query':>12} | {'results':>7} | {'find_us':>10} | {'index_us':>10} | {'speedup':>8}")
+    for name, search_query in QUERIES.items():
+        expected = sorted(str(document["_id"]) for document in mongo_find(collection, search_query))
+        found = index.search(search_query, collection)  # loads the postings
+        assert found is not None and sorted(d["_id"] for d in found) == expected, name
+        find_us = mean_us(lambda: mongo_find(collection, search_query), max(1, args.repeat // 10))
+        index_us = mean_us(lambda: index.search(search_query, collection), args.repeat)
+        print(
+            f"{name:>12} | {len(expected):>7} | {find_us:>10.1f} | {index_us:>10.1f}"
+            f" | {find_us / index_us:>7.1f}x"
+        )
+    print(f"Index: {index.stats()}")
+    if args.mongo_uri:
+        collection.drop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Benchmark of the shared upstream HTTP pool (src/httpclients.py).
+
+Times bursts of HTTPS calls to a local TLS server through the service's
+pooled clients next to a new client per call, which is how langchain-tavily
+calls Tavily (`requests.post`, a new aiohttp session per async call): each
+of those calls connects, resolves and completes a TLS handshake first.
+
+--rtt-ms simulates the network round trip of a remote upstream: the server
+waits one round trip per request, plus two before the handshake of each
+new connection (TCP, then TLS 1.3). With the default 0 only the local
+cost of connecting and handshaking shows. The server speaks HTTP/1.1, so
+pooled calls running concurrently still open one connection each; needs
+the openssl command line tool for the server's certificate.
+
+    python -m benchmarks.bench_http --calls 50 --concurrency 1 8
+    python -m benchmarks.bench_http --rtt-ms 30
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import ssl
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("TAVILY_API_KEY", "bench")
+
+import httpx
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive
+    disable_nagle_algorithm = True  # Headers and body are written separately
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        time.sleep(self.server.rtt)
+        body = json.dumps({"results": [{"url": "https://example.com", "content": "x" * 512}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class TLSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, context: ssl.SSLContext, rtt: float):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.context = context
+        self.rtt = rtt
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def process_request_thread(self, request, client_address) -> None:
+        with self._lock:
+            self.connections += 1
+        # TCP and TLS handshakes of a remote server, one round trip each
+        time.sleep(2 * self.rtt)
+        try:
+            request = self.context.wrap_socket(request, server_side=True)
+        except (ssl.SSLError, OSError):
+            request.close()
+            return
+        super().process_request_thread(request, client_address)
+
+
+def self_signed_certificate(directory: Path) -> tuple[Path, Path]:
+    cert, key = directory / "cert.pem", directory / "key.pem"
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1",
+            "-nodes", "-days", "1", "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost",
+            "-keyout", str(key), "-out", str(cert),
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return cert, key
+
+
+def summary(latencies: list[float], seconds: float, connections: int) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "calls_per_s": len(latencies) / seconds,
+        "connections": connections,
+    }
+
+
+def run_sync(server: TLSServer, url: str, calls: int, pooled: bool) -> dict:
+    from src.httpclients import get_http_client
+
+    def fresh_post(**kwargs):
+        with httpx.Client() as client:
+            return client.post(url, **kwargs)
+
+    post = (lambda **kwargs: get_http_client().post(url, **kwargs)) if pooled else fresh_post
+    connections, latencies = server.connections, []
+    start = time.perf_counter()
+    for _ in range(calls):
+        call_start = time.perf_counter()
+        post(json={"query": "zinc die casting"}).raise_for_status()
+        latencies.append(time.perf_counter() - call_start)
+    return summary(latencies, time.perf_counter() - start, server.connections - connections)
+
+
+async def run_async(server: TLSServer, url: str, calls: int, concurrency: int, pooled: bool) -> dict:
+    from src.httpclients import get_async_http_client
+
+    async def fresh_post(**kwargs):
+        async with httpx.AsyncClient() as client:
+            return await client.post(url, **kwargs)
+
+    async def pooled_post(**kwargs):
+        return await get_async_http_client().post(url, **kwargs)
+
+    post = pooled_post if pooled else fresh_post
+    connections, latencies = server.connections, []
+    remaining = iter(range(calls))
+
+    async def worker() -> None:
+        for _ in remaining:
+            call_start = time.perf_counter()
+            (await post(json={"query": "zinc die casting"})).raise_for_status()
+            latencies.append(time.perf_counter() - call_start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summary(latencies, time.perf_counter() - start, server.connections - connections)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=50, help="calls per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8], help="async callers")
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="simulated network round trip")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = self_signed_certificate(Path(directory))
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(cert, key)
+        server = TLSServer(context, args.rtt_ms / 1000)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        # Trusted by every httpx client, pooled or not (httpx.create_ssl_context)
+        os.environ["SSL_CERT_FILE"] = str(cert)
+        url = f"https://localhost:{server.server_address[1]}/search"
+
+        from src import metrics
+        from src.httpclients import get_async_http_client, get_http_client
+
+        # Warm up: certificate loading and imports are not part of a call
+        get_http_client().post(url, json={}).raise_for_status()
+
+        print(f"{args.calls} calls per run, simulated round trip {args.rtt_ms:.0f} ms")
+        print(
+            f"{'run':>16} | {'client':>7} | {'mean_ms':>8} | {'p50_ms':>8} | {'p95_ms':>8} "
+            f"| {'calls/s':>8} | {'connections':>11}"
+        )
+
+        def report(run: str, fresh: dict, pooled: dict) -> None:
+            for client, result in (("fresh", fresh), ("pooled", pooled)):
+                print(
+                    f"{run:>16} | {client:>7} | {result['mean_ms']:>8.2f} | {result['p50_ms']:>8.2f} "
+                    f"| {result['p95_ms']:>8.2f} | {result['calls_per_s']:>8.1f} | {result['connections']:>11}"
+                )
+            print(f"{'':>16}   saved per call: {fresh['mean_ms'] - pooled['mean_ms']:.2f} ms")
+
+        report(
+            "sync",
+            run_sync(server, url, args.calls, pooled=False),
+            run_sync(server, url, args.calls, pooled=True),
+        )
+
+        async def run_levels() -> None:
+            await get_async_http_client().post(url, json={})
+            for concurrency in args.concurrency:
+                report(
+                    f"async x{concurrency}",
+                    await run_async(server, url, args.calls, concurrency, pooled=False),
+                    await run_async(server, url, args.calls, concurrency, pooled=True),
+                )
+
+        asyncio.run(run_levels())
+        server.shutdown()
+
+        pool = metrics.snapshot()["http_pool"]["localhost"]
+        print(
+            f"Pool: {pool['requests']} requests over {pool['connections_opened']} connections "
+            f"(reuse rate {pool['reuse_rate']:.1%}), TLS handshake {pool['tls_ms_avg']:.2f} ms, "
+            f"connect {pool['connect_ms_avg']:.2f} ms, {pool['dns_cache_hits']} DNS cache hits"
+        )
+
+
+if __name__ == "__main__":
+    main()
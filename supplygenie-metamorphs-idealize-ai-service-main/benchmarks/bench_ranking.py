@@ -0,0 +1,101 @@
+"""
+Benchmark of the local supplier ranking (src/ranking.py).
+
+Generates synthetic candidate suppliers and times feature extraction,
+vectorized scoring and top-N selection, next to a per-candidate Python
+loop computing the same scores:
+
+    python -m benchmarks.bench_ranking --candidates 100000 --top 10
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from src.config import RANKING_WEIGHTS
+from src.ranking import score_suppliers, supplier_features, top_indices
+from src.retrieval import ranking_criteria
+
+QUERY = "Find 10 zinc die casting suppliers in Asia with ISO 9001 certification and lead time under 30 days"
+LOCATIONS = ["Shenzhen, China", "Pune, India", "Hanoi, Vietnam", "Ohio, USA", "Stuttgart, Germany", "Monterrey, Mexico"]
+SPECIALTIES = ["zinc die casting", "aluminum die casting", "precision machining", "sand casting", "injection molding"]
+CERTIFICATIONS = ["ISO 9001:2015", "IATF 16949", "ISO 14001", "RoHS"]
+
+
+def synthetic_suppliers(count: int, seed: int = 7) -> list[dict]:
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    suppliers = []
+    for index in range(count):
+        low = rng.randint(1, 20)
+        lead = rng.randint(5, 60)
+        suppliers.append(
+            {
+                "company_name": f"Supplier {index} Industries",
+                "location": rng.choice(LOCATIONS),
+                "rating": round(rng.uniform(2.5, 5.0), 1),
+                "price_range": rng.choice([f"${low}-{low + rng.randint(1, 5)} USD", "N/A"]),
+                "lead_time": rng.choice([f"{lead}-{lead + 10} days", f"{lead // 7 + 1} weeks", None]),
+                "moq": f"{rng.randint(1, 50) * 100} units",
+                "certifications": rng.sample(CERTIFICATIONS, rng.randint(0, 3)),
+                "specialties": rng.sample(SPECIALTIES, 2),
+                "response_time": "24 hours",
+                "stock": rng.choice(["In stock", "Made to order", ""]),
+                "time_zone": "UTC+8",
+                "contact": {"email": f"sales@supplier{index}.com", "phone": None, "website": None},
+                "last_verified_at": now - timedelta(days=rng.uniform(0, 180)),
+            }
+        )
+    return suppliers
+
+
+def loop_scores(features: dict[str, np.ndarray], weights: dict[str, float]) -> list[float]:
+    """The same weighted average, one candidate at a time."""
+    columns = {name: features[name].tolist() for name in weights}
+    total = sum(weights.values())
+    return [
+        sum(weight * columns[name][index] for name, weight in weights.items()) / total
+        for index in range(len(columns["relevance"]))
+    ]
+
+
+def timed(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--candidates", type=int, default=100_000)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5, help="best of N runs per step")
+    args = parser.parse_args()
+
+    suppliers = synthetic_suppliers(args.candidates)
+    criteria = ranking_criteria(QUERY)
+    weights = {name: weight for name, weight in RANKING_WEIGHTS.items() if weight}
+
+    features_ms, features = timed(lambda: supplier_features(suppliers, criteria), 1)
+    score_ms, scores = timed(lambda: score_suppliers(features, weights), args.repeat)
+    top_ms, top = timed(lambda: top_indices(scores, args.top), args.repeat)
+    loop_ms, reference = timed(lambda: loop_scores(features, weights), 1)
+    sort_ms, _ = timed(lambda: sorted(range(len(reference)), key=reference.__getitem__, reverse=True)[: args.top], 1)
+
+    assert np.allclose(scores, reference)
+    print(f"Candidates: {args.candidates}, criteria: {criteria}")
+    print(f"Weights: {weights}")
+    print(f"  feature extraction      {features_ms:10.1f} ms")
+    print(f"  vectorized scoring      {score_ms:10.2f} ms   (Python loop: {loop_ms:.1f} ms, {loop_ms / score_ms:.0f}x)")
+    print(f"  top-{args.top} selection        {top_ms:10.2f} ms   (sorted(): {sort_ms:.1f} ms)")
+    print(f"Best: {[suppliers[i]['company_name'] for i in top[:3]]} scores {np.round(scores[top[:3]], 3).tolist()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark of the supplier conversion and serialization path.
+
+Times what happens to the suppliers of one response after they enter the
+service, next to the previous path that kept them as Pydantic models:
+
+- agent: finalize_supplier_search, saving to MongoDB and the HTTP response.
+  Before, each supplier was dumped three times, wrapped in a response
+  model, and FastAPI dumped, re-validated and json-encoded that model.
+- db_first: stored documents validated into the response, before as
+  Supplier models, now as supplier documents.
+
+Validation of the LLM's tool arguments and of stored documents is part of
+both paths; duplicate checks and MongoDB writes are left out of both.
+
+    python -m benchmarks.bench_serialization --suppliers 10 --repeat 2000
+"""
+
+import argparse
+import json
+import os
+import time
+import tracemalloc
+
+os.environ.setdefault("OPENAI_API_KEY", "replay")
+os.environ.setdefault("TAVILY_API_KEY", "replay")
+
+import orjson
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from benchmarks.bench_agent import DEFAULT_FIXTURE
+from src.main import suppliers_response
+from src.models import Supplier, SupplierExplorationAgentResponse, supplier_document
+from src.replay import load_fixture
+
+RESPONSE_FIELD = create_model_field("Response", SupplierExplorationAgentResponse)
+
+
+def fixture_suppliers(path: str, count: int) -> list[dict]:
+    """The suppliers the recorded agent finalized, repeated up to `count`."""
+    fixture = load_fixture(path)
+    call = fixture["llm"][-1]["message"]["data"]["tool_calls"][0]
+    suppliers = call["args"]["suppliers"]
+    return [dict(suppliers[i % len(suppliers)]) for i in range(count)]
+
+
+def _fastapi_body(response: SupplierExplorationAgentResponse) -> bytes:
+    # serialize_response never suspends here; stepping the coroutine keeps
+    # event loop overhead out of the timing
+    coroutine = serialize_response(field=RESPONSE_FIELD, response_content=response)
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return JSONResponse(stop.value).body
+    raise RuntimeError("serialize_response suspended")
+
+
+def agent_before(arguments: list[dict]) -> bytes:
+    models = [Supplier.model_validate(argument) for argument in arguments]
+    checked = [model.model_dump() for model in models]  # validate_suppliers input
+    content = [model.model_dump() for model in models]  # tool message content
+    response = SupplierExplorationAgentResponse(suppliers=models)
+    saved = [model.model_dump() for model in response.suppliers]  # save_suppliers_to_mongodb
+    assert len(checked) == len(content) == len(saved)
+    return _fastapi_body(response)
+
+
+def agent_after(arguments: list[dict]) -> bytes:
+    models = [Supplier.model_validate(argument) for argument in arguments]
+    documents = [supplier_document(model) for model in models]
+    return suppliers_response(documents).body
+
+
+def db_first_before(stored: list[dict]) -> bytes:
+    response = SupplierExplorationAgentResponse(
+        suppliers=[Supplier.model_validate(document) for document in stored]
+    )
+    return _fastapi_body(response)
+
+
+def db_first_after(stored: list[dict]) -> bytes:
+    documents = [supplier_document(Supplier.model_validate(document)) for document in stored]
+    return suppliers_response(documents).body
+
+
+def measure(fn, data, repeat: int) -> tuple[float, float]:
+    """Mean microseconds per call and KiB allocated per call."""
+    fn(data)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(data)
+    elapsed = (time.perf_counter() - start) / repeat * 1e6
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    fn(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, (peak - before) / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fixture", default=str(DEFAULT_FIXTURE))
+    parser.add_argument("--suppliers", type=int, default=10, help="suppliers per response")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    arguments = fixture_suppliers(args.fixture, args.suppliers)
+    stored = [
+        dict(argument, _id=index, entity_keys=["site:example.com"], times_returned=3)
+        for index, argument in enumerate(arguments)
+    ]
+    assert json.loads(agent_before(arguments)) == json.loads(agent_after(arguments))
+    assert json.loads(db_first_before(stored)) == json.loads(db_first_after(stored))
+
+    print(f"Suppliers per response: {args.suppliers}, mean of {args.repeat} runs")
+    print(f"{'path':>10} | {'before_us':>10} | {'after_us':>10} | {'speedup':>8} | {'before_kib':>10} | {'after_kib':>10}")
+    for name, before, after, data in (
+        ("agent", agent_before, agent_after, arguments),
+        ("db_first", db_first_before, db_first_after, stored),
+    ):
+        before_us, before_kib = measure(before, data, args.repeat)
+        after_us, after_kib = measure(after, data, args.repeat)
+        print(
+            f"{name:>10} | {before_us:>10.1f} | {after_us:>10.1f} | {before_us / after_us:>7.1f}x"
+            f" | {before_kib:>10.1f} | {after_kib:>10.1f}"
+        )
+
+    payload = json.loads(agent_after(arguments))
+    json_us, _ = measure(lambda p: json.dumps(p).encode(), payload, args.repeat)
+    orjson_us, _ = measure(orjson.dumps, payload, args.repeat)
+    print(f"JSON encoding alone: json {json_us:.1f} us, orjson {orjson_us:.1f} us ({json_us / orjson_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
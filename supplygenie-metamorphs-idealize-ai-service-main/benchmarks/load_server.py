@@ -0,0 +1,82 @@
+"""
+Runs src.main:app under uvicorn against stub upstreams, for load testing.
+With --workers, the app is forked into that many uvicorn workers by gunicorn,
+as in the Dockerfile (gunicorn.conf.py).
+
+OpenAI traffic goes to OPENAI_BASE_URL (set by benchmarks/load_test.py),
+Tavily traffic to --tavily-url, and MongoDB is replaced by an in-memory
+store seeded from the fixture unless --mongo-uri points at a real local
+instance (e.g. `docker run -p 27017:27017 mongo`). Each worker gets its own
+copy of the in-memory store, so the shared Tavily cache is only shared
+between workers with --mongo-uri.
+"""
+
+import argparse
+import os
+import sys
+
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+os.environ.setdefault("TAVILY_API_KEY", "stub")
+
+import langchain_tavily._utilities as tavily_utilities
+import uvicorn
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fixture", help="defaults to the stub upstreams' fixture")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--tavily-url", default="http://127.0.0.1:8900")
+    parser.add_argument("--mongo-uri", help="use this MongoDB instead of the in-memory store")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (gunicorn)")
+    parser.add_argument("--verbose", action="store_true", help="keep service logs")
+    args = parser.parse_args()
+
+    if args.mongo_uri:
+        os.environ["MONGO_URI"] = args.mongo_uri
+    # Read by src.config (imported from here on), as when gunicorn.conf.py sets it
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+
+    from benchmarks.stub_upstreams import DEFAULT_FIXTURE
+    # langchain-tavily has no base URL setting; it reads this module constant per call
+    tavily_utilities.TAVILY_API_URL = args.tavily_url.rstrip("/")
+
+    from src.main import app
+    from src.replay import install_memory_mongo, load_fixture
+    from src.utils import get_logger
+
+    if not args.verbose:
+        get_logger().remove()
+        get_logger().add(sys.stderr, level="ERROR")
+    if not args.mongo_uri:
+        install_memory_mongo(load_fixture(args.fixture or DEFAULT_FIXTURE))
+
+    if args.workers > 1:
+        run_workers(app, args.host, args.port, args.workers)
+    else:
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning", backlog=4096)
+
+
+def run_workers(app, host: str, port: int, workers: int) -> None:
+    """Fork the imported app into uvicorn workers, as gunicorn.conf.py does."""
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self) -> None:
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("worker_class", "uvicorn_worker.UvicornWorker")
+            self.cfg.set("preload_app", True)
+            self.cfg.set("backlog", 4096)
+            self.cfg.set("graceful_timeout", 5)
+            self.cfg.set("loglevel", "warning")
+
+        def load(self):
+            return app
+
+    Server().run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Load test of src.main:app under uvicorn with stub upstreams.
+
+Starts the stub OpenAI/Tavily server (benchmarks/stub_upstreams.py) and the
+service (benchmarks/load_server.py) as subprocesses, then drives the
+recommendations endpoint at increasing concurrency. For each level it
+reports p50/p95/p99 latency, throughput and, sampled from the service's
+/api/v1/metrics endpoint while the level runs, event-loop lag, thread pool
+saturation and RSS:
+
+    python -m benchmarks.load_test --concurrency 1 8 32 64 --duration 60
+    python -m benchmarks.load_test --llm-latency lognormal:1500:0.6 --thread-pool-size 64
+
+The OpenAI/Tavily governors are lifted by default so the numbers show what
+one container can sustain; pass --keep-rate-limits to measure with the
+configured quotas instead. --workers runs the service as gunicorn does in
+the Dockerfile, with that many forked worker processes.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+import httpx
+
+from benchmarks.bench_agent import _percentile, request_payload
+from benchmarks.stub_upstreams import DEFAULT_FIXTURE
+from src.replay import load_fixture
+
+ENDPOINT = "/api/v1/supply-chain/recommendations"
+UNLIMITED = "1000000000"
+
+
+async def _wait_until_up(url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url, timeout=1.0)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+@contextmanager
+def _process(args: list[str], env: dict):
+    process = subprocess.Popen([sys.executable, "-m", *args], env=env)
+    try:
+        yield process
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def _sample_runtime(client: httpx.AsyncClient, samples: list[dict], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        try:
+            response = await client.get("/api/v1/metrics", timeout=5.0)
+            samples.append(response.json()["runtime"])
+        except (httpx.HTTPError, KeyError):
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_level(base_url: str, payload: dict, concurrency: int, duration: float, timeout: float) -> dict:
+    """
+    Closed-loop load: `concurrency` clients each send requests back to back
+    for `duration` seconds.
+    """
+    latencies: list[float] = []
+    failures = 0
+    samples: list[dict] = []
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=concurrency + 4, max_keepalive_connections=concurrency + 4)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+
+        async def user():
+            nonlocal failures
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    response = await client.post(ENDPOINT, json=payload)
+                    ok = response.status_code == 200 and response.json().get("suppliers")
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append(time.perf_counter() - start)
+                if not ok:
+                    failures += 1
+
+        sampler = asyncio.create_task(_sample_runtime(client, samples, stop))
+        start = time.perf_counter()
+        users = [asyncio.create_task(user()) for _ in range(concurrency)]
+        await asyncio.sleep(duration)
+        stop.set()
+        await asyncio.gather(*users)
+        elapsed = time.perf_counter() - start
+        await sampler
+
+    pools = [s["thread_pool"] for s in samples]
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "failures": failures,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "throughput_rps": (len(latencies) - failures) / elapsed,
+        "loop_lag_ms": max((s["event_loop_lag_ms"] for s in samples), default=0.0),
+        "pool_active": max((p["active"] for p in pools), default=0),
+        "pool_queued": max((p["queued"] for p in pools), default=0),
+        "rss_mb": max((s["rss_mb"] for s in samples), default=0.0),
+    }
+
+
+def print_table(rows: list[dict], pool_size: int) -> None:
+    print(f"(loop_lag_ms, pool_* and rss_mb are maxima sampled during the level; pool size {pool_size})")
+    columns = list(rows[0].keys())
+    print(" | ".join(f"{c:>14}" for c in columns))
+    for row in rows:
+        print(
+            " | ".join(
+                f"{row[c]:>14.2f}" if isinstance(row[c], float) else f"{row[c]:>14}"
+                for c in columns
+            )
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fixture", default=str(DEFAULT_FIXTURE))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32, 64])
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per level")
+    parser.add_argument("--llm-latency", default="lognormal:800:0.5", help="see stub_upstreams.LatencyModel")
+    parser.add_argument("--tool-latency", default="lognormal:600:0.4")
+    parser.add_argument("--tool-error-rate", type=float, default=0.0, help="share of Tavily calls failing")
+    parser.add_argument("--thread-pool-size", type=int, help="THREAD_POOL_SIZE of the service")
+    parser.add_argument("--workers", type=int, default=1, help="service worker processes")
+    parser.add_argument("--mongo-uri", help="use a real local MongoDB instead of the in-memory store")
+    parser.add_argument("--keep-rate-limits", action="store_true")
+    parser.add_argument("--request-timeout", type=float, default=300.0)
+    parser.add_argument("--stub-port", type=int, default=8900)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--verbose", action="store_true", help="keep service logs")
+    args = parser.parse_args()
+
+    fixture = load_fixture(args.fixture)
+    payload = request_payload(fixture)
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    env = dict(os.environ, OPENAI_BASE_URL=f"{stub_url}/v1", OPENAI_API_KEY="stub", TAVILY_API_KEY="stub")
+    env.pop("OPENAI_API_BASE", None)
+    env.setdefault("JOB_WORKER_COUNT", "0")
+    env.setdefault("REFRESH_ENABLED", "false")
+    # Every request repeats the fixture's query, which the shared Tavily
+    # cache would answer after the first
+    env.setdefault("SHARED_CACHE_ENABLED", "false")
+    if args.thread_pool_size:
+        env["THREAD_POOL_SIZE"] = str(args.thread_pool_size)
+    if not args.keep_rate_limits:
+        for name in (
+            "OPENAI_REQUESTS_PER_MINUTE",
+            "OPENAI_TOKENS_PER_MINUTE",
+            "OPENAI_MAX_CONCURRENCY",
+            "TAVILY_REQUESTS_PER_MINUTE",
+            "TAVILY_MAX_CONCURRENCY",
+        ):
+            env[name] = UNLIMITED
+
+    stub_args = [
+        "benchmarks.stub_upstreams",
+        "--fixture", args.fixture,
+        "--port", str(args.stub_port),
+        "--llm-latency", args.llm_latency,
+        "--tool-latency", args.tool_latency,
+        "--tool-error-rate", str(args.tool_error_rate),
+    ]
+    server_args = [
+        "benchmarks.load_server",
+        "--fixture", args.fixture,
+        "--port", str(args.port),
+        "--tavily-url", stub_url,
+        "--workers", str(args.workers),
+    ]
+    if args.mongo_uri:
+        server_args += ["--mongo-uri", args.mongo_uri]
+    if args.verbose:
+        server_args.append("--verbose")
+
+    with _process(stub_args, env), _process(server_args, env):
+        await _wait_until_up(f"{stub_url}/stats")
+        await _wait_until_up(f"{base_url}/")
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout) as client:
+            runtime = (await client.get("/api/v1/metrics")).json()["runtime"]
+            await client.post(ENDPOINT, json=payload)  # warm up imports and clients
+
+        print(f"Fixture: {args.fixture}")
+        print(f"Upstream latency: OpenAI {args.llm_latency}, Tavily {args.tool_latency}")
+        rows = []
+        for concurrency in args.concurrency:
+            rows.append(
+                await run_level(base_url, payload, concurrency, args.duration, args.request_timeout)
+            )
+            print(f"  level {concurrency}: {rows[-1]['throughput_rps']:.2f} req/s", flush=True)
+        print_table(rows, runtime["thread_pool"]["max_workers"])
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
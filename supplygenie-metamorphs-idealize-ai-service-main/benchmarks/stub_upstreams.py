@@ -0,0 +1,180 @@
+"""
+Stub OpenAI and Tavily HTTP servers for load testing.
+
+Serves the responses of a replay fixture (see src/replay.py) over the real
+wire protocols, so the service runs its actual OpenAI/Tavily clients, HTTP
+stacks and thread pools, with a configurable latency distribution per
+upstream:
+
+    python -m benchmarks.stub_upstreams --port 8900 --llm-latency lognormal:900:0.5
+
+--tool-error-rate makes a share of Tavily requests fail with a 502, to
+exercise the circuit breakers.
+
+Point the service at it with OPENAI_BASE_URL=http://127.0.0.1:8900/v1 and
+the Tavily URL http://127.0.0.1:8900 (benchmarks/load_server.py does both).
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+import uuid
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from src.replay import load_fixture, tool_key
+
+DEFAULT_FIXTURE = Path(__file__).parent / "fixtures" / "zinc_die_casting.json"
+STRUCTURED_TOOL = "SupplierExplorationAgentResponse"
+
+
+class LatencyModel:
+    """
+    Response time distribution, parsed from "fixed:MS", "uniform:MIN_MS:MAX_MS"
+    or "lognormal:MEDIAN_MS:SIGMA". A bare number means fixed milliseconds.
+    """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, *params = spec.split(":") if ":" in spec else ("fixed", spec)
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self) -> float:
+        """Returns a delay in seconds."""
+        if self.kind == "fixed":
+            return self.params[0] / 1000
+        if self.kind == "uniform":
+            return random.uniform(self.params[0], self.params[1]) / 1000
+        median, sigma = self.params
+        return random.lognormvariate(0, sigma) * median / 1000
+
+
+def _chat_completion(model: str, record: dict, structured: bool) -> dict:
+    data = record["message"]["data"]
+    usage = data.get("usage_metadata") or {}
+    tool_calls = data.get("tool_calls") or []
+    message: dict = {"role": "assistant", "content": data.get("content") or None}
+    finish_reason = "stop"
+    if structured:
+        # json_schema structured output: the schema instance is the content
+        message["content"] = json.dumps(tool_calls[0]["args"]) if tool_calls else message["content"]
+    elif tool_calls:
+        message["tool_calls"] = [
+            {
+                "id": call.get("id") or f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {"name": call["name"], "arguments": json.dumps(call["args"])},
+            }
+            for call in tool_calls
+        ]
+        finish_reason = "tool_calls"
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason, "logprobs": None}],
+        "usage": {
+            "prompt_tokens": usage.get("input_tokens", 0),
+            "completion_tokens": usage.get("output_tokens", 0),
+            "total_tokens": usage.get("total_tokens", 0),
+        },
+    }
+
+
+def create_stub_app(
+    fixture: dict,
+    llm_latency: LatencyModel,
+    tool_latency: LatencyModel,
+    tool_error_rate: float = 0.0,
+) -> FastAPI:
+    records = fixture["llm"]
+    structured_record = next(
+        (
+            r
+            for r in records
+            if any(c["name"] == STRUCTURED_TOOL for c in r["message"]["data"].get("tool_calls") or [])
+        ),
+        None,
+    )
+    steps = {r["step"]: r for r in records if r is not structured_record}
+    last_step = max(steps)
+    structured_record = structured_record or steps[last_step]
+    tool_records = {kind: fixture.get(kind, []) for kind in ("tavily_search", "tavily_extract")}
+    fallbacks = {kind: itertools.cycle(r) for kind, r in tool_records.items() if r}
+    counts = {"chat": 0, "search": 0, "extract": 0, "tool_errors": 0}
+
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        counts["chat"] += 1
+        await asyncio.sleep(llm_latency.sample())
+        if body.get("response_format"):
+            return _chat_completion(body["model"], structured_record, structured=True)
+        step = sum(1 for m in body["messages"] if m["role"] == "assistant")
+        return _chat_completion(body["model"], steps.get(step, steps[last_step]), structured=False)
+
+    async def _tool_response(kind: str, body: dict):
+        await asyncio.sleep(tool_latency.sample())
+        if random.random() < tool_error_rate:
+            counts["tool_errors"] += 1
+            return JSONResponse({"detail": "Bad Gateway"}, status_code=502)
+        key = tool_key(kind, body)
+        record = next((r for r in tool_records[kind] if r["key"] == key), None)
+        if record is None:
+            if kind not in fallbacks:
+                return {"results": [], "response_time": 0.0}
+            record = next(fallbacks[kind])
+        return record["response"]
+
+    @app.post("/search")
+    async def search(request: Request):
+        counts["search"] += 1
+        return await _tool_response("tavily_search", await request.json())
+
+    @app.post("/extract")
+    async def extract(request: Request):
+        counts["extract"] += 1
+        return await _tool_response("tavily_extract", await request.json())
+
+    @app.get("/stats")
+    async def stats():
+        return counts
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fixture", default=str(DEFAULT_FIXTURE))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--llm-latency", default="lognormal:800:0.5", help="OpenAI response time")
+    parser.add_argument("--tool-latency", default="lognormal:600:0.4", help="Tavily response time")
+    parser.add_argument(
+        "--tool-error-rate", type=float, default=0.0, help="share of Tavily requests failing with 502"
+    )
+    args = parser.parse_args()
+
+    app = create_stub_app(
+        load_fixture(args.fixture),
+        LatencyModel(args.llm_latency),
+        LatencyModel(args.tool_latency),
+        args.tool_error_rate,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", backlog=4096)
+
+
+if __name__ == "__main__":
+    main()
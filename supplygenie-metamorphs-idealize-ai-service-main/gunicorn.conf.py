@@ -0,0 +1,36 @@
+# gunicorn.conf.py - multi-process serving of src.main:app
+#
+#   gunicorn src.main:app
+#
+# The app is imported once in the master process and forked into
+# WEB_CONCURRENCY uvicorn workers (default: the CPUs available to the
+# container), which share the imported code's memory copy-on-write.
+# Clients, thread pools and background workers are created in each worker
+# after the fork. Upstream rate limits are split between the workers
+# (src/config.py SERVER_WORKERS); Tavily results are cached in MongoDB,
+# shared by all of them (src/sharedcache.py).
+import os
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+workers = int(os.getenv("WEB_CONCURRENCY") or available_cpus())
+# Read by src.config in the master before the app is preloaded
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+backlog = 4096
+# Workers whose event loop stalls this long are restarted; agent runs
+# themselves take place in worker threads
+timeout = 120
+# In-flight requests get this long to finish on shutdown or restart
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
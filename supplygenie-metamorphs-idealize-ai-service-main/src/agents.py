@@ -1,7 +1,19 @@
-from langgraph.prebuilt import create_react_agent
-from .utils import get_logger, get_llm
-from .models import SupplierExplorationAgentResponse
+import json
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, SystemMessage, ToolMessage
+from langgraph.graph import END, StateGraph
+from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.prebuilt.chat_agent_executor import AgentState
+from pydantic import ValidationError
+from . import metrics
+from .breaker import CircuitOpenError
+from .utils import get_logger
+from .routing import get_routed_llm
+from .models import Supplier, SupplierExplorationAgentResponse, supplier_document
 from langgraph.graph.state import CompiledStateGraph
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langchain_core.runnables import RunnableConfig
+from typing import Optional
 from .config import AGENT_MAX_SUPPLIERS
 from .tools import (
     web_extract,
@@ -11,11 +23,17 @@ from .tools import (
     validate_supplier_data,
 )
 from .prompts import get_supply_chain_agent_prompt
+from .context import DeadlineExceeded, get_request_context
+from .entities import find_duplicate_suppliers
+from .ranking import rank_suppliers
+from .retrieval import ranking_criteria
 
 logger = get_logger()
 
 
-def supply_chain_agent(chat_history=None) -> CompiledStateGraph:
+def supply_chain_agent(
+    chat_history=None, checkpointer: Optional[BaseCheckpointSaver] = None
+) -> CompiledStateGraph:
     f"""
     Comprehensive supply chain agent that handles requirement analysis and supplier exploration.
     Designed to find EXACTLY {AGENT_MAX_SUPPLIERS} high-quality suppliers through thorough research.
@@ -39,23 +57,225 @@ def supply_chain_agent(chat_history=None) -> CompiledStateGraph:
 
     try:
         logger.info("Initializing LLM model...")
-        # Initialize the model with optimized settings
-        model = get_llm()
+        # Per-phase routing: fast model for tool steps, strong model for evaluation
+        model = get_routed_llm()
         logger.info("LLM model initialized successfully")
 
         logger.info("Creating ReAct agent with tools and prompt...")
-        agent = create_react_agent(
-            model=model,
-            tools=tools,
-            prompt=get_supply_chain_agent_prompt(chat_history),
-            response_format=SupplierExplorationAgentResponse,
+        # No response_format: finalize_supplier_search ends the run and its
+        # validated suppliers are the response, which saves a final
+        # full-history structured-output call
+        agent = react_agent(
+            model, tools, get_supply_chain_agent_prompt(chat_history), checkpointer
         )
         logger.info("Successfully created supply chain agent with ReAct framework")
         logger.debug(
-            f"Agent configuration: model={model.model_name}, tools={len(tools)}, response_format=SupplierExplorationAgentResponse"
+            f"Agent configuration: model={model.model_name}, tools={len(tools)}, terminal_tool={finalize_supplier_search.name}"
         )
         return agent
     except Exception as e:
         logger.error(f"Failed to create supply chain agent: {str(e)}", exc_info=True)
         logger.error(f"Error details: {type(e).__name__}")
         raise
+
+
+def finalized(state: dict) -> bool:
+    """Whether the last tool step was a finalize_supplier_search call that succeeded."""
+    for message in reversed(state.get("messages") or []):
+        if not isinstance(message, ToolMessage):
+            break
+        if message.name == finalize_supplier_search.name and message.status == "success":
+            return True
+    return False
+
+
+def react_agent(
+    model: BaseChatModel,
+    tools: list,
+    prompt: str,
+    checkpointer: Optional[BaseCheckpointSaver] = None,
+) -> CompiledStateGraph:
+    """
+    ReAct loop (model step, tool step, repeat) that ends when the model
+    answers without tool calls or finalize_supplier_search succeeds. A
+    finalize call that fails validation goes back to the model as an error
+    tool message, so it can fix its arguments; create_react_agent's
+    return_direct would end the run on the error with no suppliers.
+    """
+    bound_model = model.bind_tools(tools)
+
+    def call_model(state: AgentState, config: RunnableConfig) -> dict:
+        response = bound_model.invoke(
+            [SystemMessage(content=prompt), *state["messages"]], config
+        )
+        if response.tool_calls and state["remaining_steps"] < 2:
+            # No room left for the tool step and the step after it
+            response = AIMessage(
+                id=response.id, content="Sorry, need more steps to process this request."
+            )
+        return {"messages": [response]}
+
+    workflow = StateGraph(AgentState)
+    workflow.add_node("agent", call_model)
+    workflow.add_node("tools", ToolNode(tools))
+    workflow.set_entry_point("agent")
+    workflow.add_conditional_edges("agent", tools_condition, path_map=["tools", END])
+    workflow.add_conditional_edges(
+        "tools", lambda state: END if finalized(state) else "agent", path_map=["agent", END]
+    )
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def extract_suppliers(raw_output) -> list[dict]:
+    """
+    Pull the supplier documents out of a finished run: the artifact of the
+    finalize_supplier_search call that ended an agent run, or the
+    structured_response of the fast pipeline (and of runs checkpointed
+    before that tool was terminal). Empty when the run produced none.
+    """
+    if not isinstance(raw_output, dict):
+        return []
+
+    structured_response = raw_output.get("structured_response")
+    if structured_response is None:
+        for message in reversed(raw_output.get("messages", [])):
+            if not isinstance(message, ToolMessage):
+                break
+            if message.name == finalize_supplier_search.name and message.status == "success":
+                structured_response = message.artifact
+                break
+
+    if isinstance(structured_response, SupplierExplorationAgentResponse):
+        suppliers = structured_response.suppliers
+    elif isinstance(structured_response, dict):
+        suppliers = structured_response.get("suppliers") or []
+    else:
+        suppliers = structured_response or []
+    if suppliers:
+        logger.info(f"Found response with {len(suppliers)} suppliers")
+    return [supplier_document(supplier) for supplier in suppliers]
+
+
+def candidate_suppliers(raw_output, include_stored: bool = True) -> list:
+    """
+    Every supplier a run came across, in any shape: the lists the agent
+    passed to finalize_supplier_search and validate_supplier_data (latest
+    first) and the query_mongodb results it saw, or the fast pipeline's
+    suppliers and stored suppliers. Without include_stored, only the ones
+    the run researched, not the database records it read.
+    """
+    candidates, stored = [], []
+    if not isinstance(raw_output, dict):
+        return candidates
+    for message in reversed(raw_output.get("messages") or []):
+        if isinstance(message, AIMessage):
+            for call in message.tool_calls:
+                if call["name"] in (finalize_supplier_search.name, validate_supplier_data.name):
+                    candidates.extend(call["args"].get("suppliers") or [])
+        elif isinstance(message, ToolMessage) and message.name == query_mongodb.name:
+            try:
+                content = json.loads(message.content)
+            except (TypeError, ValueError):
+                continue
+            if isinstance(content, list):
+                stored.extend(content)
+    # Fast pipeline state
+    candidates.extend(raw_output.get("suppliers") or [])
+    stored.extend(raw_output.get("stored_suppliers") or [])
+    return candidates + stored if include_stored else candidates
+
+
+def valid_suppliers(candidates) -> list[dict]:
+    """Candidates that validate as suppliers, as supplier documents."""
+    suppliers = []
+    for candidate in candidates:
+        try:
+            suppliers.append(supplier_document(Supplier.model_validate(candidate)))
+        except ValidationError:
+            continue
+    return suppliers
+
+
+def best_so_far(raw_output, query: str) -> tuple[list[dict], list[dict]]:
+    """
+    The best AGENT_MAX_SUPPLIERS suppliers an unfinished run came across,
+    ranked locally: the answer of a run that ran out of time. Also returns
+    the ones among them the run researched, as opposed to database records
+    it only read.
+    """
+    candidates = candidate_suppliers(raw_output)
+    researched = candidate_suppliers(raw_output, include_stored=False)
+    stored = candidates[len(researched) :]
+    researched, stored = valid_suppliers(researched), valid_suppliers(stored)
+    # Researched versions come first, so they win over their duplicates
+    suppliers = researched + stored
+    duplicates = find_duplicate_suppliers(suppliers)
+    kept = [index for index in range(len(suppliers)) if index not in duplicates]
+    ranked = rank_suppliers(
+        [suppliers[index] for index in kept], ranking_criteria(query), limit=AGENT_MAX_SUPPLIERS
+    )
+    answer = [kept[index] for index in ranked]
+    return (
+        [suppliers[index] for index in answer],
+        [suppliers[index] for index in answer if index < len(researched)],
+    )
+
+
+def researched_suppliers(raw_output) -> list[dict]:
+    """
+    The suppliers of a finished run to save to MongoDB: its answer, less
+    the database records a run answered with best_so_far only read. Saving
+    those would stamp them as verified just now.
+    """
+    if isinstance(raw_output, dict) and "researched_suppliers" in raw_output:
+        return raw_output["researched_suppliers"]
+    return extract_suppliers(raw_output)
+
+
+def run_graph(graph: CompiledStateGraph, input_payload: dict, config: RunnableConfig) -> dict:
+    """
+    Invoke the agent or the fast pipeline step by step, so a run whose
+    request was cancelled stops at the next step (raising RunCancelled)
+    instead of running to the end. A run that hits the request's deadline,
+    or loses the LLM to an open OpenAI circuit, ends with the best suppliers
+    it found so far as its structured_response, and so does an agent that
+    stopped with a text answer instead of calling finalize_supplier_search.
+    """
+    context = get_request_context()
+    final_state = None
+    try:
+        for state in graph.stream(input_payload, config=config, stream_mode="values"):
+            final_state = state
+            if context is not None:
+                context.check_cancelled()
+    except (DeadlineExceeded, CircuitOpenError) as e:
+        reason = "deadline" if isinstance(e, DeadlineExceeded) else "breaker"
+        return answer_best_so_far(final_state, input_payload, reason, f"Run stopped ({str(e)})")
+    if unfinalized(final_state):
+        return answer_best_so_far(
+            final_state, input_payload, "agent", "Agent ended without finalizing"
+        )
+    return final_state
+
+
+def unfinalized(state) -> bool:
+    """Whether an agent run ended on a model answer without tool calls."""
+    if not isinstance(state, dict) or "structured_response" in state:
+        return False
+    messages = state.get("messages") or []
+    return bool(messages) and isinstance(messages[-1], AIMessage) and not messages[-1].tool_calls
+
+
+def answer_best_so_far(final_state, input_payload, reason: str, cause: str) -> dict:
+    """
+    The final state of an unfinished run, with best_so_far as its
+    structured_response and the suppliers among them it researched.
+    """
+    final_state = dict(final_state or {})
+    query = final_state.get("query") or (input_payload or {}).get("query") or ""
+    suppliers, researched = best_so_far(final_state, query)
+    logger.warning(f"{cause}, answering with the {len(suppliers)} best suppliers found so far")
+    metrics.increment(f"{reason}.best_so_far")
+    final_state["structured_response"] = suppliers
+    final_state["researched_suppliers"] = researched
+    return final_state
@@ -0,0 +1,148 @@
+"""
+Circuit breakers for upstream APIs. Each governor (src/ratelimit.py) owns
+one and reports every call it makes to it.
+
+A closed breaker lets calls through and keeps their outcomes over the last
+BREAKER_WINDOW_SECONDS. Once the window holds BREAKER_MIN_CALLS calls and
+too many of them failed or were slow, it opens: calls are rejected at once
+instead of each waiting out a timeout. After BREAKER_OPEN_SECONDS it lets a
+single probe call through (half-open). A good probe closes the breaker; a
+failed or slow one opens it again.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from loguru import logger
+
+from . import metrics
+from .config import (
+    BREAKER_FAILURE_RATE,
+    BREAKER_MIN_CALLS,
+    BREAKER_OPEN_SECONDS,
+    BREAKER_SLOW_CALL_RATE,
+    BREAKER_WINDOW_SECONDS,
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        slow_call_seconds: float,
+        window: float = BREAKER_WINDOW_SECONDS,
+        min_calls: int = BREAKER_MIN_CALLS,
+        failure_rate: float = BREAKER_FAILURE_RATE,
+        slow_call_rate: float = BREAKER_SLOW_CALL_RATE,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+    ):
+        self.name = name
+        self.slow_call_seconds = slow_call_seconds
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self._lock = threading.Lock()
+        # (finished at, failed, slow) of the calls in the window
+        self._outcomes: deque[tuple[float, bool, bool]] = deque()
+        self._opened_at = 0.0
+        self._probing = False
+        self._trips = 0
+        self._rejected = 0
+
+    def is_open(self) -> bool:
+        """Whether calls are being rejected (open and not yet due for a probe)."""
+        with self._lock:
+            return self.state == "open" and time.monotonic() - self._opened_at < self.open_seconds
+
+    def admit(self) -> bool:
+        """
+        Let a call through or raise CircuitOpenError. Returns True when the
+        call is the half-open probe; pass that on to record().
+        """
+        with self._lock:
+            if self.state == "closed":
+                return False
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self._reject()
+                self.state = "half_open"
+                logger.info(f"{self.name} circuit half-open, probing the upstream")
+            if self._probing:
+                self._reject()
+            self._probing = True
+            return True
+
+    def record(self, failed: Optional[bool], seconds: float, probe: bool = False) -> None:
+        """
+        Report the outcome of an admitted call. `failed` is None for calls
+        that never reached the upstream or were abandoned (cancellations).
+        """
+        now = time.monotonic()
+        with self._lock:
+            if probe:
+                self._probing = False
+            if failed is None:
+                return
+            slow = seconds >= self.slow_call_seconds
+            if probe:
+                if failed or slow:
+                    self._open(now, "probe failed" if failed else f"probe took {seconds:.1f}s")
+                else:
+                    self.state = "closed"
+                    self._outcomes.clear()
+                    logger.info(f"{self.name} circuit closed, the upstream recovered")
+                    metrics.increment(f"breaker.{self.name}_recoveries")
+                return
+            if self.state != "closed":
+                # Calls started before the breaker opened
+                return
+            self._outcomes.append((now, failed, slow))
+            while self._outcomes and self._outcomes[0][0] < now - self.window:
+                self._outcomes.popleft()
+            calls = len(self._outcomes)
+            if calls < self.min_calls:
+                return
+            failures = sum(1 for _, f, _ in self._outcomes if f)
+            slow_calls = sum(1 for _, _, s in self._outcomes if s)
+            if failures / calls >= self.failure_rate:
+                self._open(now, f"{failures}/{calls} calls failed")
+            elif slow_calls / calls >= self.slow_call_rate:
+                self._open(now, f"{slow_calls}/{calls} calls took over {self.slow_call_seconds:.0f}s")
+
+    def _open(self, now: float, reason: str) -> None:
+        self.state = "open"
+        self._opened_at = now
+        self._outcomes.clear()
+        self._trips += 1
+        logger.warning(f"{self.name} circuit opened ({reason}) for {self.open_seconds:.0f}s")
+        metrics.increment(f"breaker.{self.name}_trips")
+
+    def _reject(self) -> None:
+        self._rejected += 1
+        raise CircuitOpenError(f"{self.name} is unavailable right now (circuit open)")
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            open_remaining = max(self._opened_at + self.open_seconds - now, 0.0)
+            state = self.state
+            if state == "open" and open_remaining == 0:
+                state = "half_open"  # The next call probes
+            return {
+                "state": state,
+                "open_remaining": round(open_remaining, 3) if state == "open" else 0.0,
+                "window_calls": len(self._outcomes),
+                "window_failures": sum(1 for _, f, _ in self._outcomes if f),
+                "window_slow_calls": sum(1 for _, _, s in self._outcomes if s),
+                "trips": self._trips,
+                "rejected": self._rejected,
+            }
@@ -0,0 +1,212 @@
+"""
+LangGraph checkpointer over MongoDB, so job progress survives a pod restart
+and every worker process and instance sees the same checkpoints.
+
+A local SQLite file is lost with its pod and cannot be shared safely by
+several gunicorn workers, while a job interrupted in one process may be
+reclaimed by any other. Checkpoints are kept in `job_checkpoints` and the
+pending writes of each step in `job_checkpoint_writes`, both serialized
+with the saver's serde. Both expire JOB_CHECKPOINT_TTL_HOURS after they
+were written.
+"""
+
+from collections.abc import Iterator, Sequence
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.collection import Collection
+
+from .config import JOB_CHECKPOINT_TTL_HOURS
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class MongoCheckpointSaver(BaseCheckpointSaver[int]):
+    """
+    Synchronous checkpoint saver storing one document per checkpoint and
+    one per pending write. Jobs run their graphs with stream(), so the
+    async methods are left to the base class.
+    """
+
+    def __init__(self, checkpoints: Collection, writes: Collection):
+        super().__init__()
+        self.checkpoints = checkpoints
+        self.writes = writes
+        for collection in (checkpoints, writes):
+            collection.create_index(
+                [
+                    ("thread_id", ASCENDING),
+                    ("checkpoint_ns", ASCENDING),
+                    ("checkpoint_id", DESCENDING),
+                ]
+            )
+            collection.create_index(
+                [("created_at", ASCENDING)], expireAfterSeconds=JOB_CHECKPOINT_TTL_HOURS * 3600
+            )
+
+    @staticmethod
+    def _config(thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> RunnableConfig:
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+            }
+        }
+
+    def _to_tuple(self, document: dict) -> CheckpointTuple:
+        thread_id, checkpoint_ns = document["thread_id"], document["checkpoint_ns"]
+        writes = self.writes.find(
+            {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": document["checkpoint_id"],
+            }
+        ).sort([("task_id", ASCENDING), ("idx", ASCENDING)])
+        parent_id = document.get("parent_checkpoint_id")
+        return CheckpointTuple(
+            self._config(thread_id, checkpoint_ns, document["checkpoint_id"]),
+            self.serde.loads_typed((document["type"], document["checkpoint"])),
+            self.serde.loads_typed((document["metadata_type"], document["metadata"])),
+            self._config(thread_id, checkpoint_ns, parent_id) if parent_id else None,
+            [
+                (
+                    write["task_id"],
+                    write["channel"],
+                    self.serde.loads_typed((write["type"], write["value"])),
+                )
+                for write in writes
+            ],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        query = {
+            "thread_id": str(config["configurable"]["thread_id"]),
+            "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+        }
+        if checkpoint_id := get_checkpoint_id(config):
+            query["checkpoint_id"] = checkpoint_id
+        # Checkpoint ids are time ordered, so the latest sorts first
+        latest = self.checkpoints.find(query).sort("checkpoint_id", DESCENDING).limit(1)
+        document = next(iter(latest), None)
+        return self._to_tuple(document) if document else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = {}
+        if config is not None:
+            query["thread_id"] = str(config["configurable"]["thread_id"])
+            if "checkpoint_ns" in config["configurable"]:
+                query["checkpoint_ns"] = config["configurable"]["checkpoint_ns"]
+            if checkpoint_id := get_checkpoint_id(config):
+                query["checkpoint_id"] = checkpoint_id
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            query.setdefault("checkpoint_id", {})
+            if isinstance(query["checkpoint_id"], dict):
+                query["checkpoint_id"]["$lt"] = before_id
+        returned = 0
+        for document in self.checkpoints.find(query).sort("checkpoint_id", DESCENDING):
+            checkpoint = self._to_tuple(document)
+            # Metadata is stored serialized, so filters are applied here
+            if filter and any(checkpoint.metadata.get(k) != v for k, v in filter.items()):
+                continue
+            yield checkpoint
+            returned += 1
+            if limit and returned >= limit:
+                return
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, serialized = self.serde.dumps_typed(checkpoint)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(
+            get_checkpoint_metadata(config, metadata)
+        )
+        self.checkpoints.update_one(
+            {"_id": f"{thread_id}:{checkpoint_ns}:{checkpoint['id']}"},
+            {
+                "$set": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint["id"],
+                    "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+                    "type": type_,
+                    "checkpoint": serialized,
+                    "metadata_type": metadata_type,
+                    "metadata": serialized_metadata,
+                    "created_at": _utcnow(),
+                }
+            },
+            upsert=True,
+        )
+        return self._config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Special channels (errors, interrupts) replace their earlier write,
+        # other writes of a task are kept as first recorded
+        replace = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+        operator = "$set" if replace else "$setOnInsert"
+        requests = []
+        for idx, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, idx)
+            type_, serialized = self.serde.dumps_typed(value)
+            requests.append(
+                UpdateOne(
+                    {"_id": f"{thread_id}:{checkpoint_ns}:{checkpoint_id}:{task_id}:{idx}"},
+                    {
+                        operator: {
+                            "thread_id": thread_id,
+                            "checkpoint_ns": checkpoint_ns,
+                            "checkpoint_id": checkpoint_id,
+                            "task_id": task_id,
+                            "idx": idx,
+                            "channel": channel,
+                            "type": type_,
+                            "value": serialized,
+                            "created_at": _utcnow(),
+                        }
+                    },
+                    upsert=True,
+                )
+            )
+        if requests:
+            self.writes.bulk_write(requests, ordered=False)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.checkpoints.delete_many({"thread_id": str(thread_id)})
+        self.writes.delete_many({"thread_id": str(thread_id)})
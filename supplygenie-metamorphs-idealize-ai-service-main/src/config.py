@@ -26,4 +26,214 @@ AGENT_RECURSION_LIMIT = 200
 # LLM Performance Configuration  
 MAX_TOKENS = 4096  # Further reduced to prevent context overflow
 REQUEST_TIMEOUT = 300
-MAX_RETRIES = 3 
+MAX_RETRIES = 3
+
+# Request Deadlines (end-to-end time budget of a recommendation request;
+# clients may shorten it with the header or AgentConfig.deadline_seconds)
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "240"))  # 0 disables
+REQUEST_DEADLINE_HEADER = "X-Request-Timeout"  # Seconds
+DEADLINE_FINALIZE_SECONDS = 45.0  # Budget left when the agent is made to finalize
+
+# Background Job Configuration
+JOB_WORKER_COUNT = int(os.getenv("JOB_WORKER_COUNT", "2"))
+JOB_POLL_INTERVAL = 2.0
+JOB_HEARTBEAT_INTERVAL = 15.0
+JOB_HEARTBEAT_TIMEOUT = 2 * REQUEST_TIMEOUT  # A stale heartbeat means the worker died mid-run
+JOB_MAX_ATTEMPTS = 3
+JOB_CHECKPOINT_TTL_HOURS = int(os.getenv("JOB_CHECKPOINT_TTL_HOURS", "72"))  # Checkpoints in MongoDB expire
+
+# Multi-process Serving (gunicorn.conf.py forks WEB_CONCURRENCY workers and
+# exports the count to them); per-process budgets below are split between them
+SERVER_WORKERS = max(int(os.getenv("WEB_CONCURRENCY") or "1"), 1)
+
+# Upstream Rate Limits (account-wide; shared by all concurrent agent runs in a
+# process, each of the SERVER_WORKERS processes gets an equal share)
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500"))
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "30000"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+# Completion tokens reserved per call until real usage has been seen; the
+# reservation then follows the average reported usage and is settled afterwards
+OPENAI_EXPECTED_OUTPUT_TOKENS = int(os.getenv("OPENAI_EXPECTED_OUTPUT_TOKENS", "512"))
+TAVILY_REQUESTS_PER_MINUTE = int(os.getenv("TAVILY_REQUESTS_PER_MINUTE", "100"))
+TAVILY_MAX_CONCURRENCY = int(os.getenv("TAVILY_MAX_CONCURRENCY", "4"))
+RATE_LIMIT_BASE_DELAY = 1.0
+RATE_LIMIT_MAX_DELAY = 60.0
+
+# Upstream HTTP Connections (src/httpclients.py; one keep-alive pool per
+# process shared by the OpenAI and Tavily clients)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "64"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "32"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))  # Seconds an idle connection is kept
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"  # Where the server supports it
+HTTP_DNS_TTL_SECONDS = float(os.getenv("HTTP_DNS_TTL_SECONDS", "300"))  # 0 disables the DNS cache
+HTTP_CONNECT_TIMEOUT = 10.0
+
+# Circuit Breakers (per upstream, src/breaker.py); while the Tavily circuit is
+# open the agent works from MongoDB only
+BREAKER_WINDOW_SECONDS = 60.0  # Call outcomes considered for opening
+BREAKER_MIN_CALLS = 5  # Calls in the window before the breaker may open
+BREAKER_FAILURE_RATE = 0.5
+BREAKER_SLOW_CALL_RATE = 0.8
+BREAKER_SLOW_CALL_SECONDS = {  # Per attempt, excluding rate-limit waits
+    "openai": float(os.getenv("OPENAI_SLOW_CALL_SECONDS", "90")),
+    "tavily": float(os.getenv("TAVILY_SLOW_CALL_SECONDS", "20")),
+}
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))  # Before a probe call
+WEB_TOOLS = {"web_search", "web_extract"}  # Unavailable while the Tavily circuit is open
+
+# Model Routing (per ReAct phase)
+FAST_MODEL_NAME = os.getenv("FAST_MODEL_NAME", "gpt-4o-mini")
+FAST_MAX_TOKENS = 2048
+# tool_selection: planning and choosing the next tool call / search query
+# evaluation: the step that evaluates candidates and calls a STRONG_MODEL_TOOLS tool
+# synthesis: structured output, for agents built with a response_format
+MODEL_ROUTES = {
+    "tool_selection": (FAST_MODEL_NAME, FAST_MAX_TOKENS),
+    "evaluation": (MODEL_NAME, MAX_TOKENS),
+    "synthesis": (MODEL_NAME, MAX_TOKENS),
+}
+STRONG_MODEL_TOOLS = {"finalize_supplier_search"}
+# USD per 1M (input, output) tokens, used for per-phase cost reporting
+MODEL_PRICING = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+}
+
+# Record upstream payloads of every recommendation run into replay fixtures
+REPLAY_RECORD_DIR = os.getenv("REPLAY_RECORD_DIR")
+
+# Request Profiling (src/profiling.py); admin endpoints and the profiling
+# header are disabled while ADMIN_TOKEN is unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+PROFILE_HEADER = "X-Profile"  # "1" profiles the request (with a valid admin token)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Share of requests profiled
+PROFILE_SAMPLE_INTERVAL = 0.005  # Seconds between stack samples
+PROFILE_MAX_DEPTH = 256  # Frames kept per sampled stack
+PROFILE_MAX_STACKS = 5000  # Distinct stacks stored per profile, heaviest first
+PROFILE_TRACEMALLOC_FRAMES = 16  # Frames kept per allocation
+PROFILE_TOP_ALLOCATIONS = 25
+PROFILE_TTL_HOURS = int(os.getenv("PROFILE_TTL_HOURS", "72"))
+
+# Runtime Configuration
+# Worker threads for asyncio.to_thread; every in-flight agent run holds one,
+# so this caps concurrent recommendation requests per process
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", str(min(32, (os.cpu_count() or 1) + 4))))
+EVENT_LOOP_MONITOR_INTERVAL = 0.1
+DISCONNECT_POLL_INTERVAL = 0.5  # Seconds between client disconnect checks per request
+
+# Database-first Retrieval (answer from MongoDB before running the agent)
+DB_FIRST_ENABLED = os.getenv("DB_FIRST_ENABLED", "true").lower() == "true"
+RETRIEVAL_CANDIDATE_LIMIT = 200
+RETRIEVAL_MIN_RELEVANCE = 0.6  # Share of query keywords a supplier must match
+RETRIEVAL_MIN_COMPLETENESS = 90.0
+RETRIEVAL_SEED_LIMIT = 2 * AGENT_MAX_SUPPLIERS  # Candidates handed to the agent
+SUPPLIER_FRESHNESS_DAYS = int(os.getenv("SUPPLIER_FRESHNESS_DAYS", "90"))
+
+# Supplier Ranking (src/ranking.py); weights need not sum to 1 and can be
+# overridden per feature, e.g. RANKING_WEIGHTS="price=0.2,freshness=0"
+def _ranking_weights(defaults: dict, overrides: str) -> dict:
+    weights = dict(defaults)
+    for item in filter(str.strip, overrides.split(",")):
+        name, _, weight = item.partition("=")
+        if name.strip() not in weights:
+            raise ValueError(f"Unknown ranking weight in RANKING_WEIGHTS: {name}")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+RANKING_WEIGHTS = _ranking_weights(
+    {
+        "relevance": 0.35,
+        "certifications": 0.15,
+        "completeness": 0.15,
+        "rating": 0.1,
+        "price": 0.05,
+        "lead_time": 0.1,
+        "freshness": 0.1,
+    },
+    os.getenv("RANKING_WEIGHTS", ""),
+)
+
+# Fast Pipeline (fixed-step mode: one LLM evaluation per pass)
+FAST_PIPELINE_MAX_RETRIES = 1  # Relax-and-retry passes after the first evaluation
+FAST_PIPELINE_EXTRACT_URLS = 6
+FAST_PIPELINE_PAGE_CHARS = 2000  # Per extracted page in the evaluation prompt
+FAST_PIPELINE_RELAXED_RELEVANCE = 0.4
+
+# Entity Resolution (near-duplicate suppliers, src/entities.py)
+ENTITY_MINHASH_PERMUTATIONS = 64
+ENTITY_LSH_BANDS = 16  # 4 rows per band: name pairs above ~0.5 similarity become candidates
+ENTITY_MATCH_THRESHOLD = 0.7  # Estimated Jaccard similarity of name shingles
+ENTITY_INDEX_FIELD = "entity_keys"  # LSH band keys and identifiers, multikey-indexed
+ENTITY_INDEX_NAME = "supplier_entity_index"
+ENTITY_BACKFILL_BATCH_SIZE = 500
+
+# Set by every write that changes what a supplier says (polled by the hot index)
+SUPPLIER_UPDATED_FIELD = "updated_at"
+
+# Bookkeeping fields on stored suppliers, never shown to the model
+SUPPLIER_INTERNAL_FIELDS = (
+    ENTITY_INDEX_FIELD,
+    SUPPLIER_UPDATED_FIELD,
+    "times_returned",
+    "last_returned_at",
+    "refresh_claimed_until",
+    "verification_failures",
+)
+
+# Freshness Refresher (re-verifies stale, frequently returned suppliers)
+REFRESH_ENABLED = os.getenv("REFRESH_ENABLED", "true").lower() == "true"
+REFRESH_INTERVAL = 600.0  # Seconds between refresh passes
+# UTC hours during which passes run, e.g. "0-6" or "22-5"; empty means always
+REFRESH_OFF_PEAK_HOURS = os.getenv("REFRESH_OFF_PEAK_HOURS", "0-6")
+# Refresh ahead of SUPPLIER_FRESHNESS_DAYS, so DB-first answers keep qualifying
+REFRESH_AFTER_DAYS = int(os.getenv("REFRESH_AFTER_DAYS") or SUPPLIER_FRESHNESS_DAYS * 2 // 3)
+REFRESH_MIN_RETURNS = 2  # Times a supplier was returned before it is worth refreshing
+REFRESH_BATCH_SIZE = 10  # Suppliers per pass
+# Tavily + OpenAI, split between the SERVER_WORKERS processes
+REFRESH_CALLS_PER_HOUR = int(os.getenv("REFRESH_CALLS_PER_HOUR", "60"))
+REFRESH_RETRY_AFTER = 24 * 3600.0  # Seconds before a failed refresh is retried
+REFRESH_PAGE_CHARS = 4000
+
+# Bulk Ingestion (python -m src.ingest, streams CSV/JSONL supplier files)
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))  # Upserts per bulk_write
+INGEST_PROGRESS_INTERVAL = 5.0  # Seconds between progress reports
+INGEST_LIST_SEPARATORS = ";|"  # Separators of list cells in CSV files
+INGEST_MAX_REPORTED_ERRORS = 20  # Rejected rows logged in full
+
+# Hot Supplier Index (in-process read-through cache behind query_mongodb)
+HOT_INDEX_ENABLED = os.getenv("HOT_INDEX_ENABLED", "true").lower() == "true"
+# Memory cap, counted as the JSON size of the held suppliers (Python objects
+# take a few times more)
+HOT_INDEX_MAX_MB = float(os.getenv("HOT_INDEX_MAX_MB", "32"))
+HOT_INDEX_EVICTION = os.getenv("HOT_INDEX_EVICTION", "lru")  # "lru" or "lfu"
+HOT_INDEX_MAX_POSTING = 2000  # Predicates matching more suppliers always go to MongoDB
+HOT_INDEX_TTL = 900.0  # Seconds a posting is trusted before it is reloaded
+HOT_INDEX_POLL_INTERVAL = 5.0  # Polling fallback when change streams are unavailable
+HOT_INDEX_POLL_OVERLAP = 5.0  # Seconds re-read per poll, for writers' clock skew
+
+# Shared Upstream Cache (Tavily results in MongoDB, shared by all worker
+# processes and instances)
+SHARED_CACHE_ENABLED = os.getenv("SHARED_CACHE_ENABLED", "true").lower() == "true"
+SHARED_CACHE_TTL_HOURS = float(os.getenv("SHARED_CACHE_TTL_HOURS", "24"))
+
+# Conversation Sessions (server-side chat history)
+SESSION_TTL_DAYS = int(os.getenv("SESSION_TTL_DAYS", "30"))  # Idle sessions expire
+SESSION_RECENT_MESSAGES = 6  # Latest messages kept verbatim in the prompt
+SESSION_SUMMARY_BATCH = 6  # Older messages folded into the summary per LLM call
+SESSION_MAX_MESSAGES = 40  # Messages stored per session (older ones live in the summary)
+SESSION_REPLY_SUPPLIERS = 10  # Suppliers of the last reply described in the prompt
+
+# Run Continuation (next page of suppliers from a finished run)
+RUN_TTL_HOURS = int(os.getenv("RUN_TTL_HOURS", "24"))  # Runs can be continued this long
+RUN_POOL_LIMIT = 50  # Found but unreturned suppliers kept per run
+RUN_LEAD_LIMIT = 20  # Search results a run never extracted, kept as leads
+RUN_MAX_VISITED_URLS = 200
+
+# Speculative Prefetch (web search / MongoDB lookups started with the request)
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+PREFETCH_MAX_SEARCHES = 3  # Raw query plus locally derived variants
+PREFETCH_MAX_WORKERS = 8  # Shared by all requests in this process
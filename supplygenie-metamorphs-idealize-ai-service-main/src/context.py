@@ -0,0 +1,257 @@
+import asyncio
+import json
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, Future
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+from .config import DEADLINE_FINALIZE_SECONDS
+
+
+class RunCancelled(BaseException):
+    """
+    Raised by work done on behalf of a request once the request has been
+    cancelled (the client disconnected or the job was cancelled). Like
+    asyncio.CancelledError it is not an Exception, so tools and graph nodes
+    that turn errors into results let it through.
+    """
+
+
+class DeadlineExceeded(RunCancelled):
+    """
+    Raised by work done on behalf of a request whose deadline has passed.
+    Graph runs catch it and answer with the best suppliers found so far.
+    """
+
+
+def _is_failure(result: Any) -> bool:
+    return isinstance(result, dict) and bool(result.get("error"))
+
+
+@dataclass
+class RequestContext:
+    """
+    Mutable state shared by everything that runs on behalf of one request.
+    The context variable is copied into worker threads (asyncio.to_thread and
+    LangGraph's executors), and since they all share this object, updates
+    made by tools are visible to the request that started them.
+    """
+
+    request_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    query: Optional[str] = None
+    upstream_calls: int = 0
+    llm_phases: dict[str, dict] = field(default_factory=dict)
+    # Tool results of this request by cache key, including speculative
+    # prefetches still in flight
+    tool_cache: dict[str, Future] = field(default_factory=dict)
+    prefetched: set[str] = field(default_factory=set)
+    prefetch_hits: set[str] = field(default_factory=set)
+    # Sites (entities.site_identifier) an earlier run of a continued search
+    # already extracted; web tools skip them
+    visited_sites: set[str] = field(default_factory=set)
+    # Set when the request is cancelled; upstream calls and graph runs stop
+    # at their next check
+    cancelled: threading.Event = field(default_factory=threading.Event)
+    # Event loop upstream calls are run on, so cancel() can abort them in
+    # flight; None runs them in the calling thread
+    loop: Optional[asyncio.AbstractEventLoop] = None
+    # time.monotonic() by which the request must be answered; upstream calls
+    # and MongoDB queries shrink their timeouts to what is left of it
+    deadline: Optional[float] = None
+    # profiling.RequestProfiler of a profiled request
+    profiler: Optional[Any] = None
+    _in_flight: set[Future] = field(default_factory=set, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def cached_call(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Return the cached result for `key`, waiting for it if a prefetch or a
+        concurrent identical call is still running; otherwise run `fn` and
+        cache its result. Failed or cancelled entries are recomputed; tools
+        report failures as {"error": ...} results, which are not kept.
+        """
+        with self._lock:
+            future = self.tool_cache.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.tool_cache[key] = future
+        if not owner:
+            try:
+                result = future.result()
+                if not _is_failure(result):
+                    if key in self.prefetched:
+                        self.prefetch_hits.add(key)
+                    return result
+            except (Exception, CancelledError):
+                pass
+            with self._lock:
+                future = Future()
+                self.tool_cache[key] = future
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self._discard(key, future)
+            future.set_exception(e)
+            raise
+        if _is_failure(result):
+            self._discard(key, future)
+        future.set_result(result)
+        return result
+
+    def _discard(self, key: str, future: Future) -> None:
+        with self._lock:
+            if self.tool_cache.get(key) is future:
+                del self.tool_cache[key]
+
+    def add_prefetch(self, key: str, future: Future) -> bool:
+        """
+        Register a speculative result; False if `key` is already cached.
+        """
+        with self._lock:
+            if key in self.tool_cache:
+                return False
+            self.tool_cache[key] = future
+            self.prefetched.add(key)
+            return True
+
+    def check_cancelled(self) -> None:
+        if self.cancelled.is_set():
+            raise RunCancelled(f"Request {self.request_id} was cancelled")
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the deadline (negative once passed), None without one."""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def check_deadline(self) -> None:
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded(f"Request {self.request_id} ran out of time")
+
+    def finalize_due(self) -> bool:
+        """Whether the run has to wrap up with what it found so far."""
+        remaining = self.remaining()
+        return remaining is not None and remaining <= DEADLINE_FINALIZE_SECONDS
+
+    def cancel(self) -> None:
+        """Cancel the request and abort its in-flight upstream calls."""
+        self.cancelled.set()
+        with self._lock:
+            in_flight = list(self._in_flight)
+        for future in in_flight:
+            future.cancel()
+
+    def run_abortable(self, fn: Callable[[], Any], afn: Optional[Callable[[], Awaitable]]) -> Any:
+        """
+        Run an upstream call. With an event loop and an async variant `afn`,
+        the call runs on the loop while this thread waits, so cancel() can
+        abort the HTTP request mid-flight (raising RunCancelled here), and so
+        can the deadline (raising DeadlineExceeded).
+        """
+        if self.loop is None or afn is None or self.loop.is_closed() or _on_loop(self.loop):
+            return fn()
+
+        async def run_in_context():
+            _current_context.set(self)
+            return await afn()
+
+        future = asyncio.run_coroutine_threadsafe(run_in_context(), self.loop)
+        with self._lock:
+            self._in_flight.add(future)
+        try:
+            if self.cancelled.is_set():
+                # cancel() ran before the call was registered
+                future.cancel()
+            return future.result(timeout=self.remaining())
+        except TimeoutError:
+            future.cancel()
+            raise DeadlineExceeded(f"Request {self.request_id} ran out of time") from None
+        except CancelledError:
+            raise RunCancelled(f"Request {self.request_id} was cancelled") from None
+        finally:
+            with self._lock:
+                self._in_flight.discard(future)
+
+    def phase_summary(self) -> str:
+        return ", ".join(
+            f"{phase}={stats['model']} x{stats['calls']} {stats['seconds']:.1f}s ${stats['cost_usd']:.4f}"
+            for phase, stats in self.llm_phases.items()
+        )
+
+
+def _on_loop(loop: asyncio.AbstractEventLoop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+_current_context: ContextVar[Optional[RequestContext]] = ContextVar(
+    "request_context", default=None
+)
+
+
+def start_request_context(**kwargs) -> RequestContext:
+    context = RequestContext(**kwargs)
+    _current_context.set(context)
+    return context
+
+
+def get_request_context() -> Optional[RequestContext]:
+    return _current_context.get()
+
+
+def time_budget(timeout: Optional[float] = None) -> Optional[float]:
+    """
+    `timeout` shrunk to what is left of the current request's deadline
+    (unchanged without one). Raises DeadlineExceeded once it has passed.
+    """
+    context = get_request_context()
+    remaining = context.remaining() if context is not None else None
+    if remaining is None:
+        return timeout
+    context.check_deadline()
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def tool_cache_key(name: str, args: dict) -> str:
+    """
+    Cache key of a tool call, insensitive to case, punctuation, word order
+    and list order so trivially different calls share a result (searches
+    treat their terms as a set). MongoDB queries only fold case and
+    whitespace of the $text query, whose negations ("-term") and "quoted
+    phrases" change the result; their other fields are exact-match
+    filters and stay as they are (bar list order, as $in ignores it).
+    """
+
+    def normalize(key, value):
+        if isinstance(value, (list, tuple)):
+            return sorted(normalize(key, v) for v in value)
+        if not isinstance(value, str):
+            return value
+        if name != "query_mongodb":
+            return " ".join(sorted(re.findall(r"[a-z0-9]+", value.lower())))
+        if key == "query":
+            return " ".join(value.lower().split())
+        return value
+
+    normalized = {k: normalize(k, v) for k, v in sorted(args.items()) if v is not None}
+    return f"{name}:{json.dumps(normalized, sort_keys=True, default=str)}"
+
+
+def cached_tool_call(name: str, args: dict, fn: Callable[[], Any]) -> Any:
+    """
+    Run a tool body through the current request's tool cache (or directly
+    outside of a request).
+    """
+    context = get_request_context()
+    if context is None:
+        return fn()
+    return context.cached_call(tool_cache_key(name, args), fn)
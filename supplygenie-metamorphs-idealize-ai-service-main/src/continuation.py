@@ -0,0 +1,306 @@
+"""
+Continuation of finished recommendation runs ("10 more suppliers").
+
+A run that answered a request leaves a run record behind: its query, mode
+and chat history, the candidate pool it gathered but did not return
+(suppliers the agent finalized beyond the returned ones, stored suppliers
+it looked at), the URLs it extracted, the search results it never opened
+(leads) and the suppliers returned so far. Continuing the run answers from
+that pool and from stored suppliers first. Only when they cannot fill a
+page does it research the gap: the agent starts from the leads with the
+known suppliers excluded, and the web tools skip the sites already
+extracted.
+"""
+
+import json
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from pymongo import ASCENDING
+from pymongo.collection import Collection
+
+from .agents import (
+    candidate_suppliers,
+    researched_suppliers,
+    run_graph,
+    supply_chain_agent,
+    valid_suppliers,
+)
+from .config import (
+    AGENT_MAX_SUPPLIERS,
+    AGENT_RECURSION_LIMIT,
+    RETRIEVAL_MIN_COMPLETENESS,
+    RUN_LEAD_LIMIT,
+    RUN_MAX_VISITED_URLS,
+    RUN_POOL_LIMIT,
+    RUN_TTL_HOURS,
+)
+from .context import get_request_context
+from .entities import find_duplicate_suppliers, site_identifier
+from .pipeline import fast_pipeline
+from .prompts import get_continuation_request
+from .ranking import rank_suppliers
+from .retrieval import ranking_criteria, retrieve_suppliers
+from .utils import get_logger, get_supplier_db_and_collection
+
+logger = get_logger()
+
+LEADS_TOOL_CALL_ID = "continuation_leads"
+LEAD_CONTENT_CHARS = 300
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@lru_cache
+def get_runs_collection() -> Collection:
+    db, _ = get_supplier_db_and_collection()
+    collection = db["runs"]
+    collection.create_index(
+        [("updated_at", ASCENDING)], expireAfterSeconds=RUN_TTL_HOURS * 3600
+    )
+    return collection
+
+
+def _site(url: str) -> str:
+    return site_identifier(url) or url
+
+
+def _json(content) -> object:
+    try:
+        return json.loads(content) if isinstance(content, str) else content
+    except ValueError:
+        return None
+
+
+def _unreturned(candidates: list[dict], returned: list[dict]) -> list[dict]:
+    """Candidates that are neither returned already nor duplicates of each other."""
+    duplicates = find_duplicate_suppliers(list(returned) + list(candidates))
+    offset = len(returned)
+    return [c for index, c in enumerate(candidates) if index + offset not in duplicates]
+
+
+def _identity(supplier: dict) -> dict:
+    """What entity matching needs to recognize a returned supplier."""
+    return {"company_name": supplier.get("company_name"), "contact": supplier.get("contact")}
+
+
+def run_state(raw_output) -> dict:
+    """
+    The continuable state of a finished agent or fast pipeline run: its
+    candidate pool, the URLs it extracted and the search results it did not.
+    """
+    # Everything the run shortlisted or looked at, not just the kept ones
+    pool, visited_urls, leads = candidate_suppliers(raw_output), [], []
+    if not isinstance(raw_output, dict):
+        return {"pool": pool, "visited_urls": visited_urls, "leads": leads}
+
+    for message in raw_output.get("messages") or []:
+        if isinstance(message, AIMessage):
+            for call in message.tool_calls:
+                if call["name"] == "web_extract":
+                    visited_urls.extend(call["args"].get("urls") or [])
+        elif isinstance(message, ToolMessage):
+            content = _json(message.content)
+            if message.name == "web_search" and isinstance(content, dict):
+                leads.extend(content.get("results") or [])
+
+    # Fast pipeline state
+    visited_urls.extend(page.get("url") for page in raw_output.get("pages") or [])
+    leads.extend(raw_output.get("search_results") or [])
+    return {"pool": pool, "visited_urls": visited_urls, "leads": leads}
+
+
+def _visited(urls: list) -> list[str]:
+    return list(dict.fromkeys(url for url in urls if url))[-RUN_MAX_VISITED_URLS:]
+
+
+def _open_leads(leads: list[dict], visited_urls: list[str]) -> list[dict]:
+    visited = {_site(url) for url in visited_urls}
+    kept = {}
+    for lead in leads:
+        url = lead.get("url")
+        if url and _site(url) not in visited and _site(url) not in kept:
+            kept[_site(url)] = {
+                "title": lead.get("title"),
+                "url": url,
+                "content": (lead.get("content") or "")[:LEAD_CONTENT_CHARS],
+            }
+    return list(kept.values())[:RUN_LEAD_LIMIT]
+
+
+def save_run(
+    run_id: str,
+    query: str,
+    mode: str,
+    chat_history: Optional[list[dict]],
+    returned: list[dict],
+    state: dict,
+) -> bool:
+    """
+    Keep a finished run so it can be continued. `state` is its run_state
+    (empty for answers served from stored suppliers, whose pool is
+    retrieved again on continuation).
+    """
+    try:
+        pool = _unreturned(valid_suppliers(state.get("pool") or []), returned)
+        visited_urls = _visited(state.get("visited_urls") or [])
+        now = _utcnow()
+        get_runs_collection().update_one(
+            {"_id": run_id},
+            {
+                "$set": {
+                    "query": query,
+                    "mode": mode,
+                    "chat_history": chat_history,
+                    "pool": pool[:RUN_POOL_LIMIT],
+                    "visited_urls": visited_urls,
+                    "leads": _open_leads(state.get("leads") or [], visited_urls),
+                    "returned": [_identity(supplier) for supplier in returned],
+                    "pages": 1,
+                    "updated_at": now,
+                },
+                "$setOnInsert": {"created_at": now},
+            },
+            upsert=True,
+        )
+        logger.info(
+            f"Saved run {run_id}: {len(returned)} returned, {len(pool)} in the pool, "
+            f"{len(visited_urls)} pages visited"
+        )
+        return True
+    except Exception as e:
+        # The request is answered all the same, it just cannot be continued
+        logger.error(f"Saving run {run_id} failed: {str(e)}")
+        return False
+
+
+def stored_candidates(query: str) -> list[dict]:
+    """
+    Stored suppliers matching the query that meet its location and lead
+    time requirements and are complete enough to return.
+    """
+    retrieval = retrieve_suppliers(query)
+    return valid_suppliers(
+        candidate["document"]
+        for candidate in retrieval.candidates
+        if candidate["meets_requirements"]
+        and candidate["completeness"] * 100 >= RETRIEVAL_MIN_COMPLETENESS
+    )
+
+
+def lead_messages(query: str, leads: list[dict]) -> list[BaseMessage]:
+    """
+    Present a run's unopened search results as a web_search call the agent
+    has already made, so it can go straight to extracting them.
+    """
+    if not leads:
+        return []
+    return [
+        AIMessage(
+            content="",
+            tool_calls=[{"name": "web_search", "args": {"query": query}, "id": LEADS_TOOL_CALL_ID}],
+        ),
+        ToolMessage(
+            content=json.dumps({"results": leads}),
+            tool_call_id=LEADS_TOOL_CALL_ID,
+            name="web_search",
+        ),
+    ]
+
+
+def research_gap(run: dict, needed: int, known: list[dict]):
+    """Run the agent (or fast pipeline) of a run again for the missing suppliers."""
+    context = get_request_context()
+    if context is not None:
+        context.query = run["query"]  # finalize_supplier_search ranks by it
+        context.visited_sites.update(_site(url) for url in run.get("visited_urls") or [])
+    config = RunnableConfig(recursion_limit=AGENT_RECURSION_LIMIT)
+
+    if run.get("mode") == "fast":
+        # The pipeline's web search repeats the run's; with the extracted
+        # sites skipped, it extracts the results the run did not open
+        return run_graph(
+            fast_pipeline(),
+            {"query": run["query"], "chat_history": run.get("chat_history")},
+            config,
+        )
+
+    request = get_continuation_request(
+        run["query"], needed, [supplier.get("company_name") for supplier in known]
+    )
+    agent = supply_chain_agent(chat_history=run.get("chat_history"))
+    return run_graph(
+        agent,
+        {
+            "query": run["query"],
+            "chat_history": run.get("chat_history"),
+            "messages": [HumanMessage(content=request), *lead_messages(run["query"], run.get("leads") or [])],
+        },
+        config,
+    )
+
+
+def continue_run(run_id: str) -> Optional[tuple[list[dict], list[dict]]]:
+    """
+    The next page of suppliers of a finished run, best ranked first, and
+    the suppliers among them that were researched just now (to be saved).
+    None when the run is unknown or expired.
+    """
+    collection = get_runs_collection()
+    run = collection.find_one({"_id": run_id})
+    if run is None:
+        return None
+    returned = run.get("returned") or []
+    criteria = ranking_criteria(run["query"])
+
+    candidates = _unreturned((run.get("pool") or []) + stored_candidates(run["query"]), returned)
+    logger.info(
+        f"Continuing run {run_id} (page {run.get('pages', 1) + 1}): "
+        f"{len(candidates)} candidates left in the pool and the database"
+    )
+
+    researched, visited_urls, leads = [], run.get("visited_urls") or [], []
+    if len(candidates) < AGENT_MAX_SUPPLIERS:
+        needed = AGENT_MAX_SUPPLIERS - len(candidates)
+        logger.info(f"Run {run_id}: researching {needed} more suppliers")
+        raw_output = research_gap(run, needed, returned + candidates)
+        state = run_state(raw_output)
+        # Not the database records the research read: stored_candidates
+        # covers those, and saving them would stamp them as verified
+        researched = _unreturned(
+            valid_suppliers(
+                researched_suppliers(raw_output)
+                + candidate_suppliers(raw_output, include_stored=False)
+            ),
+            returned + candidates,
+        )
+        candidates += researched
+        visited_urls = _visited(visited_urls + state["visited_urls"])
+        leads = state["leads"]
+
+    ranked = [candidates[index] for index in rank_suppliers(candidates, criteria)]
+    page, rest = ranked[:AGENT_MAX_SUPPLIERS], ranked[AGENT_MAX_SUPPLIERS:]
+    updated = collection.update_one(
+        # Concurrent continuations of one run may return the same page;
+        # only the first records it
+        {"_id": run_id, "pages": run.get("pages", 1)},
+        {
+            "$set": {
+                "pool": rest[:RUN_POOL_LIMIT],
+                "visited_urls": visited_urls,
+                "leads": _open_leads(leads + (run.get("leads") or []), visited_urls),
+                "returned": returned + [_identity(supplier) for supplier in page],
+                "updated_at": _utcnow(),
+            },
+            "$inc": {"pages": 1},
+        },
+    )
+    if updated.modified_count == 0:
+        logger.warning(f"Run {run_id} was continued concurrently, this page was not recorded")
+    researched_ids = {id(supplier) for supplier in researched}
+    return page, [supplier for supplier in page if id(supplier) in researched_ids]
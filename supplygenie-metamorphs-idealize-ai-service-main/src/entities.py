@@ -0,0 +1,317 @@
+"""
+Entity resolution for suppliers. The same company shows up under different
+page titles, subdomains and marketplace listings; two records are the same
+entity when they share an identifier (website domain, phone, email) or
+their names are near-identical by MinHash similarity.
+
+Candidate pairs are found with locality-sensitive hashing: each record's
+MinHash signature is cut into ENTITY_LSH_BANDS bands, and records sharing a
+band key (or an identifier) are compared. Stored suppliers keep these keys
+in ENTITY_INDEX_FIELD under a multikey index, so matching a new supplier
+against the whole collection is one indexed lookup.
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import urlparse
+
+import numpy as np
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+
+from .config import (
+    ENTITY_BACKFILL_BATCH_SIZE,
+    ENTITY_INDEX_FIELD,
+    ENTITY_INDEX_NAME,
+    ENTITY_LSH_BANDS,
+    ENTITY_MATCH_THRESHOLD,
+    ENTITY_MINHASH_PERMUTATIONS,
+)
+
+# Legal-form suffixes ignored when comparing company names
+COMPANY_SUFFIXES = {
+    "inc", "incorporated", "ltd", "limited", "llc", "co", "corp", "corporation",
+    "company", "gmbh", "ag", "sa", "srl", "plc", "pvt", "private", "bv", "oy",
+}
+
+# Industry words shared by unrelated companies ("Lotus Zinc Castings" vs
+# "Crest Zinc Castings"); names are compared on what remains
+GENERIC_NAME_WORDS = {
+    "alloy", "alloys", "casting", "castings", "component", "components", "engineering",
+    "enterprise", "enterprises", "factory", "global", "group", "holdings", "industrial",
+    "industries", "industry", "international", "manufacturer", "manufacturing", "metal",
+    "metals", "part", "parts", "precision", "products", "solutions", "supplier", "suppliers",
+    "supply", "systems", "tech", "technologies", "technology", "trading", "works",
+}
+
+# Page title segments that name the page or site rather than the company
+TITLE_NOISE_WORDS = {
+    "about", "alibaba", "com", "contact", "directory", "home", "homepage", "indiamart",
+    "official", "page", "site", "thomasnet", "us", "website", "welcome",
+}
+TITLE_SEPARATORS = re.compile(r"\s+[-|–—:]\s+|\s*\|\s*")
+
+# Hosts listing many companies: the listing, not the domain, is the identifier
+MARKETPLACE_DOMAINS = {
+    "alibaba.com", "made-in-china.com", "globalsources.com", "indiamart.com", "thomasnet.com",
+    "tradeindia.com", "ec21.com", "dhgate.com", "amazon.com", "linkedin.com", "kompass.com",
+    "europages.com", "dnb.com", "facebook.com", "yellowpages.com", "1688.com",
+}
+MARKETPLACE_HOST_PREFIXES = {"www", "m", "en", "french", "german", "spanish"}
+# Second-level labels under country code TLDs ("example.co.uk")
+SECOND_LEVEL_LABELS = {"co", "com", "net", "org", "gov", "ac", "edu", "ltd"}
+FREE_EMAIL_DOMAINS = {
+    "gmail.com", "yahoo.com", "hotmail.com", "outlook.com", "163.com", "126.com", "qq.com",
+    "aol.com", "icloud.com", "mail.com", "sina.com", "yandex.com", "protonmail.com",
+}
+
+MERSENNE_PRIME = (1 << 61) - 1
+
+
+@lru_cache
+def _permutations() -> tuple[np.ndarray, np.ndarray]:
+    # Fixed seed: signatures are persisted and must be stable across processes
+    rng = np.random.default_rng(20240617)
+    a = rng.integers(1, 1 << 31, ENTITY_MINHASH_PERMUTATIONS, dtype=np.uint64)
+    b = rng.integers(0, 1 << 31, ENTITY_MINHASH_PERMUTATIONS, dtype=np.uint64)
+    return a, b
+
+
+def _token_hash(token: str) -> int:
+    # hash() is salted per process, and signatures are persisted
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=4).digest(), "little")
+
+
+def normalize_company_name(name: str) -> str:
+    words = re.sub(r"[^a-z0-9 ]", " ", (name or "").lower()).split()
+    return " ".join(word for word in words if word not in COMPANY_SUFFIXES)
+
+
+def name_shingles(name: str) -> set[str]:
+    """Character 3-grams of the distinctive part of a company name."""
+    words = normalize_company_name(name).split()
+    distinctive = [word for word in words if word not in GENERIC_NAME_WORDS] or words
+    text = f" {' '.join(distinctive)} "
+    return {text[i : i + 3] for i in range(len(text) - 2)} if distinctive else set()
+
+
+def minhash_signature(shingles: set[str]) -> Optional[np.ndarray]:
+    if not shingles:
+        return None
+    a, b = _permutations()
+    hashes = np.fromiter((_token_hash(s) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((a[:, None] * hashes[None, :] + b[:, None]) % MERSENNE_PRIME).min(axis=1)
+
+
+def site_identifier(url: str) -> str:
+    """
+    The registrable domain of a URL ("shop.apex.com" -> "apex.com"), or the
+    listing on a marketplace ("apexzinc.en.alibaba.com" -> "alibaba.com/apexzinc").
+    Empty when the URL identifies no single company.
+    """
+    url = (url or "").strip().lower()
+    if "." not in url:
+        return ""
+    parsed = urlparse(url if "//" in url else f"//{url}")
+    labels = parsed.netloc.split("@")[-1].split(":")[0].split(".")
+    size = 3 if len(labels) >= 3 and len(labels[-1]) == 2 and labels[-2] in SECOND_LEVEL_LABELS else 2
+    domain = ".".join(labels[-size:])
+    if domain not in MARKETPLACE_DOMAINS:
+        return domain
+    subdomains = [label for label in labels[:-size] if label not in MARKETPLACE_HOST_PREFIXES]
+    path = [part for part in parsed.path.split("/") if part]
+    listing = subdomains[0] if subdomains else "/".join(path[:2])
+    return f"{domain}/{listing}" if listing else ""
+
+
+def title_company_name(title: str) -> str:
+    """
+    The company name in a search result title: the segment with a legal-form
+    suffix, else the first segment that is not site boilerplate.
+    """
+    segments = [s for s in TITLE_SEPARATORS.split(title or "") if s.strip()]
+    named = [
+        s for s in segments if COMPANY_SUFFIXES & set(re.sub(r"[^a-z0-9 ]", " ", s.lower()).split())
+    ]
+    if named:
+        return named[0]
+    for segment in segments:
+        words = set(normalize_company_name(segment).split())
+        if words and not words <= TITLE_NOISE_WORDS:
+            return segment
+    return ""
+
+
+@dataclass
+class EntityProfile:
+    name: str = ""
+    identifiers: set[str] = field(default_factory=set)
+    signature: Optional[np.ndarray] = None
+
+    def keys(self) -> list[str]:
+        """LSH band keys of the name signature plus the identifiers."""
+        keys = sorted(self.identifiers)
+        if self.signature is not None:
+            for band, rows in enumerate(np.array_split(self.signature, ENTITY_LSH_BANDS)):
+                digest = hashlib.blake2b(rows.tobytes(), digest_size=8).hexdigest()
+                keys.append(f"band{band}:{digest}")
+        return keys
+
+    def similarity(self, other: "EntityProfile") -> float:
+        if self.signature is None or other.signature is None:
+            return 0.0
+        return float(np.mean(self.signature == other.signature))
+
+    def same_entity(self, other: "EntityProfile") -> bool:
+        return bool(self.identifiers & other.identifiers) or (
+            self.similarity(other) >= ENTITY_MATCH_THRESHOLD
+        )
+
+
+def _profile(name: str, identifiers: set[str]) -> EntityProfile:
+    return EntityProfile(
+        name=name,
+        identifiers={i for i in identifiers if not i.endswith(":")},
+        signature=minhash_signature(name_shingles(name)),
+    )
+
+
+def supplier_profile(supplier: dict) -> EntityProfile:
+    contact = supplier.get("contact") if isinstance(supplier.get("contact"), dict) else {}
+    identifiers = {f"site:{site_identifier(contact.get('website') or '')}"}
+    phone = re.sub(r"\D", "", str(contact.get("phone") or ""))
+    if len(phone) >= 7:
+        # Country codes and trunk prefixes vary between listings
+        identifiers.add(f"phone:{phone[-9:]}")
+    email = str(contact.get("email") or "").strip().lower()
+    if re.fullmatch(r"[^@\s]+@[^@\s]+\.[a-z]+", email):
+        identifiers.add(f"email:{email}")
+        domain = email.rsplit("@", 1)[1]
+        if domain not in FREE_EMAIL_DOMAINS:
+            identifiers.add(f"site:{site_identifier(domain)}")
+    return _profile(supplier.get("company_name") or "", identifiers)
+
+
+def search_result_profile(result: dict) -> EntityProfile:
+    return _profile(
+        title_company_name(result.get("title") or ""),
+        {f"site:{site_identifier(result.get('url') or '')}"},
+    )
+
+
+def find_duplicates(profiles: list[EntityProfile]) -> dict[int, int]:
+    """
+    Maps the index of every duplicate profile to the index of the first
+    profile of the same entity. Only profiles sharing an LSH key are compared.
+    """
+    buckets: dict[str, list[int]] = {}
+    duplicates: dict[int, int] = {}
+    for index, profile in enumerate(profiles):
+        keys = profile.keys()
+        candidates = sorted({i for key in keys for i in buckets.get(key, [])})
+        original = next(
+            (i for i in candidates if i not in duplicates and profiles[i].same_entity(profile)),
+            None,
+        )
+        if original is not None:
+            duplicates[index] = original
+            continue
+        for key in keys:
+            buckets.setdefault(key, []).append(index)
+    return duplicates
+
+
+def find_duplicate_suppliers(suppliers: list[dict]) -> dict[int, int]:
+    """
+    Maps the index of every duplicate candidate to the index of the first
+    candidate it duplicates.
+    """
+    return find_duplicates([supplier_profile(supplier) for supplier in suppliers])
+
+
+def dedupe_search_results(results: list[dict]) -> tuple[list[dict], int]:
+    """
+    Keep the first (best ranked) search result per company. Returns the
+    kept results and how many were dropped.
+    """
+    duplicates = find_duplicates([search_result_profile(result) for result in results])
+    kept = [result for index, result in enumerate(results) if index not in duplicates]
+    return kept, len(duplicates)
+
+
+def dedupe_urls(urls: list[str]) -> list[str]:
+    """One URL per site or marketplace listing, in the given order."""
+    seen = set()
+    kept = []
+    for url in urls:
+        identifier = site_identifier(url) or url
+        if identifier not in seen:
+            seen.add(identifier)
+            kept.append(url)
+    return kept
+
+
+def create_entity_index_if_not_exists(collection: Collection) -> None:
+    if ENTITY_INDEX_NAME not in collection.index_information():
+        collection.create_index([(ENTITY_INDEX_FIELD, 1)], name=ENTITY_INDEX_NAME)
+
+
+def find_stored_match(collection: Collection, profile: EntityProfile) -> Optional[dict]:
+    """The stored supplier of the same entity as `profile`, if any."""
+    return find_stored_matches(collection, [profile])[0]
+
+
+def find_stored_matches(
+    collection: Collection, profiles: list[EntityProfile]
+) -> list[Optional[dict]]:
+    """
+    The stored supplier of the same entity as each of `profiles` (None
+    where there is none), looked up with a single query over all their keys.
+    """
+    keys = list(dict.fromkeys(key for profile in profiles for key in profile.keys()))
+    if not keys:
+        return [None] * len(profiles)
+    stored = [
+        (document, supplier_profile(document))
+        for document in collection.find({ENTITY_INDEX_FIELD: {"$in": keys}})
+    ]
+    return [
+        next((document for document, other in stored if other.same_entity(profile)), None)
+        if profile.keys()
+        else None
+        for profile in profiles
+    ]
+
+
+def backfill_entity_index(collection: Collection) -> int:
+    """
+    Add entity keys to stored suppliers saved before entity resolution
+    existed. Returns the number of suppliers updated.
+    """
+    create_entity_index_if_not_exists(collection)
+    updated = 0
+    while True:
+        batch = list(
+            collection.find({ENTITY_INDEX_FIELD: {"$exists": False}}).limit(
+                ENTITY_BACKFILL_BATCH_SIZE
+            )
+        )
+        if not batch:
+            return updated
+        # One round trip per batch, not per supplier
+        modified = collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": document["_id"]},
+                    {"$set": {ENTITY_INDEX_FIELD: supplier_profile(document).keys()}},
+                )
+                for document in batch
+            ],
+            ordered=False,
+        ).modified_count
+        updated += modified
+        if len(batch) < ENTITY_BACKFILL_BATCH_SIZE or not modified:
+            return updated
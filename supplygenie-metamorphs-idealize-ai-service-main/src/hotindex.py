@@ -0,0 +1,506 @@
+"""
+In-process read-through index of hot suppliers behind query_mongodb.
+
+Requests keep asking for the same popular categories and regions. Each
+predicate of a SupplierSearchIndexQuery (a text search term, a location, a
+specialty, ...) maps to a posting: the ids of every stored supplier matching
+it, loaded from MongoDB the first time it is asked for. Later queries over
+loaded postings are answered from memory: text terms are unioned (MongoDB's
+$text semantics, with MongoDB's own stemming, since each term's posting is a
+$text result), the remaining fields are checked against the held documents,
+and price and lead time limits are applied to NumPy arrays of the parsed
+values.
+
+The index follows the collection's change stream to stay coherent. Where
+change streams are unavailable (a standalone mongod), it polls for
+suppliers whose SUPPLIER_UPDATED_FIELD moved instead; the service never
+deletes suppliers, and postings are reloaded after HOT_INDEX_TTL anyway.
+Queries go to MongoDB while the index is not following the collection, and
+for predicates matching more than HOT_INDEX_MAX_POSTING suppliers.
+
+Held documents are capped at HOT_INDEX_MAX_MB; postings are evicted least
+recently (lru) or least frequently (lfu) used, per HOT_INDEX_EVICTION.
+"""
+
+import asyncio
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+import orjson
+from pymongo import ASCENDING
+from pymongo.collection import Collection
+from pymongo.errors import OperationFailure, PyMongoError
+
+from . import metrics
+from .config import (
+    HOT_INDEX_ENABLED,
+    HOT_INDEX_EVICTION,
+    HOT_INDEX_MAX_MB,
+    HOT_INDEX_MAX_POSTING,
+    HOT_INDEX_POLL_INTERVAL,
+    HOT_INDEX_POLL_OVERLAP,
+    HOT_INDEX_TTL,
+    SUPPLIER_INTERNAL_FIELDS,
+    SUPPLIER_UPDATED_FIELD,
+)
+from .models import SupplierSearchIndexQuery
+from .ranking import parse_lead_time_days, parse_price
+from .utils import get_logger, get_supplier_db_and_collection
+
+logger = get_logger()
+
+TEXT = "$text"
+# Fields matched exactly by SupplierSearchIndexQuery.build_filter (lists with $in)
+EXACT_FIELDS = ("location", "price_range", "lead_time", "specialties", "certifications")
+PROJECTION = {name: 0 for name in SUPPLIER_INTERNAL_FIELDS}
+# Events after which nothing held can be trusted
+RESET_EVENTS = {"drop", "dropDatabase", "rename", "invalidate"}
+
+
+@dataclass
+class Posting:
+    # None when the predicate matches more than HOT_INDEX_MAX_POSTING suppliers
+    ids: Optional[set[str]]
+    loaded_at: float
+    last_used: float = 0.0
+    uses: int = 0
+
+
+@dataclass
+class Predicate:
+    field: str
+    values: list[str] = field(default_factory=list)
+
+    def keys(self) -> list[tuple[str, str]]:
+        return [(self.field, value) for value in self.values]
+
+    def matches(self, document: dict) -> bool:
+        stored = document.get(self.field)
+        stored = stored if isinstance(stored, list) else [stored]
+        return any(value in stored for value in self.values)
+
+
+def query_predicates(search_query: SupplierSearchIndexQuery) -> Optional[list[Predicate]]:
+    """
+    The query's predicates, text terms first. None when the text search uses
+    phrases or negations, which postings of single terms cannot answer.
+    """
+    predicates = []
+    if search_query.query:
+        if '"' in search_query.query or re.search(r"(^|\s)-\w", search_query.query):
+            return None
+        terms = list(dict.fromkeys(re.findall(r"\w+", search_query.query.lower())))
+        if not terms:
+            return None
+        predicates.append(Predicate(TEXT, terms))
+    for name in EXACT_FIELDS:
+        value = getattr(search_query, name)
+        if value:
+            predicates.append(Predicate(name, list(value) if isinstance(value, list) else [value]))
+    return predicates
+
+
+def _string_values(value) -> list[str]:
+    if isinstance(value, str):
+        return [value.lower()]
+    if isinstance(value, dict):
+        return [text for item in value.values() for text in _string_values(item)]
+    if isinstance(value, list):
+        return [text for item in value for text in _string_values(item)]
+    return []
+
+
+def _term_root(term: str) -> str:
+    # Loose stand-in for MongoDB's stemmer ("castings" -> "cast"), used only
+    # to decide which text postings a changed supplier may have entered
+    return term[: max(3, (len(term) + 1) // 2)]
+
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class HotSupplierIndex:
+    def __init__(self, max_bytes: int, eviction: str, max_posting: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self.max_posting = max_posting
+        self.ttl = ttl
+        self.active = False
+        self.mode = "off"
+        # Bumped by every change, so loads racing a change are not cached
+        self.version = 0
+        self._lock = threading.RLock()
+        self._postings: dict[tuple[str, str], Posting] = {}
+        self._documents: dict[str, dict] = {}
+        self._memberships: dict[str, set[tuple[str, str]]] = {}
+        self._sizes: dict[str, int] = {}
+        self._bytes = 0
+        self._slots: dict[str, int] = {}
+        self._free_slots: list[int] = []
+        self._price = np.full(64, np.nan)
+        self._lead_time = np.full(64, np.nan)
+        # Updated-at of suppliers seen by the last polls, to skip repeats
+        self._seen: dict[str, datetime] = {}
+
+    # Queries
+
+    def search(
+        self, search_query: SupplierSearchIndexQuery, collection: Collection
+    ) -> Optional[list[dict]]:
+        """
+        The suppliers matching the query, as query_mongodb would find them;
+        None when MongoDB has to answer it.
+        """
+        if not self.active:
+            return None
+        predicates = query_predicates(search_query)
+        if not predicates:
+            return None
+
+        # Predicates with postings are intersected; text terms must have them,
+        # while fields too broad to hold are checked on the candidates
+        matched, checks = [], []
+        for predicate in predicates:
+            postings = self._postings_for(predicate.keys(), collection)
+            if postings is not None:
+                matched.append(postings)
+            elif predicate.field == TEXT:
+                # Only MongoDB can evaluate a text search
+                matched = []
+                break
+            else:
+                checks.append(predicate)
+        if not matched:
+            metrics.increment("hot_index.misses")
+            return None
+
+        with self._lock:
+            unions = sorted((set().union(*postings) for postings in matched), key=len)
+            ids = unions[0].intersection(*unions[1:])
+            documents = {supplier_id: self._documents.get(supplier_id) for supplier_id in ids}
+            if None in documents.values():
+                # Evicted by a concurrent load
+                metrics.increment("hot_index.misses")
+                return None
+            ids = [
+                supplier_id
+                for supplier_id in sorted(ids)
+                if all(check.matches(documents[supplier_id]) for check in checks)
+            ]
+            if ids and (
+                search_query.max_price is not None or search_query.max_lead_time_days is not None
+            ):
+                slots = np.fromiter((self._slots[i] for i in ids), dtype=np.intp, count=len(ids))
+                mask = np.ones(len(ids), dtype=bool)
+                if search_query.max_price is not None:
+                    mask &= self._price[slots] <= search_query.max_price
+                if search_query.max_lead_time_days is not None:
+                    mask &= self._lead_time[slots] <= search_query.max_lead_time_days
+                ids = [supplier_id for supplier_id, keep in zip(ids, mask) if keep]
+            results = [dict(documents[supplier_id]) for supplier_id in ids]
+        metrics.increment("hot_index.hits")
+        return results
+
+    def _postings_for(
+        self, keys: list[tuple[str, str]], collection: Collection
+    ) -> Optional[list[set[str]]]:
+        """Id sets of the keys, loading missing ones; None if any is too broad."""
+        result = []
+        for key in keys:
+            with self._lock:
+                posting = self._postings.get(key)
+                if posting is not None and time.monotonic() - posting.loaded_at > self.ttl:
+                    self._drop_posting(key)
+                    posting = None
+            if posting is None:
+                posting = self._load(key, collection)
+                if posting is None:
+                    return None
+            with self._lock:
+                posting.last_used = time.monotonic()
+                posting.uses += 1
+            if posting.ids is None:
+                return None
+            result.append(posting.ids)
+        return result
+
+    def _load(self, key: tuple[str, str], collection: Collection) -> Optional[Posting]:
+        version = self.version
+        name, value = key
+        query_filter = {TEXT: {"$search": value}} if name == TEXT else {name: value}
+        documents = list(
+            collection.find(query_filter, PROJECTION).limit(self.max_posting + 1)
+        )
+        metrics.increment("hot_index.loads")
+        with self._lock:
+            if self.version != version or not self.active:
+                return None
+            now = time.monotonic()
+            posting = Posting(ids=None, loaded_at=now, last_used=now)
+            if len(documents) <= self.max_posting:
+                posting.ids = set()
+                for document in documents:
+                    supplier_id = str(document["_id"])
+                    self._store(supplier_id, document)
+                    posting.ids.add(supplier_id)
+                    self._memberships[supplier_id].add(key)
+            self._postings[key] = posting
+            self._evict(keep=key)
+        return posting
+
+    # Held documents
+
+    def _store(self, supplier_id: str, document: dict) -> None:
+        document = {k: v for k, v in document.items() if k not in SUPPLIER_INTERNAL_FIELDS}
+        document["_id"] = supplier_id
+        size = len(orjson.dumps(document, default=str))
+        self._bytes += size - self._sizes.get(supplier_id, 0)
+        self._sizes[supplier_id] = size
+        self._documents[supplier_id] = document
+        self._memberships.setdefault(supplier_id, set())
+        slot = self._slots.get(supplier_id)
+        if slot is None:
+            slot = self._free_slots.pop() if self._free_slots else len(self._slots)
+            self._slots[supplier_id] = slot
+            if slot >= len(self._price):
+                self._price = np.concatenate([self._price, np.full(len(self._price), np.nan)])
+                self._lead_time = np.concatenate(
+                    [self._lead_time, np.full(len(self._lead_time), np.nan)]
+                )
+        self._price[slot] = parse_price(document.get("price_range"))
+        self._lead_time[slot] = parse_lead_time_days(document.get("lead_time"))
+
+    def _forget(self, supplier_id: str) -> None:
+        self._documents.pop(supplier_id, None)
+        self._memberships.pop(supplier_id, None)
+        self._bytes -= self._sizes.pop(supplier_id, 0)
+        slot = self._slots.pop(supplier_id, None)
+        if slot is not None:
+            self._free_slots.append(slot)
+
+    def _leave(self, key: tuple[str, str], supplier_id: str) -> None:
+        memberships = self._memberships.get(supplier_id)
+        if memberships is not None:
+            memberships.discard(key)
+            if not memberships:
+                self._forget(supplier_id)
+
+    def _drop_posting(self, key: tuple[str, str]) -> None:
+        posting = self._postings.pop(key, None)
+        for supplier_id in (posting.ids if posting and posting.ids else ()):
+            self._leave(key, supplier_id)
+
+    def _evict(self, keep: Optional[tuple[str, str]] = None) -> None:
+        """Drop postings until the held documents fit, sparing `keep` (just loaded)."""
+        if self._bytes <= self.max_bytes:
+            return
+        candidates = [key for key in self._postings if key != keep]
+        if self.eviction == "lfu":
+            candidates.sort(key=lambda k: (self._postings[k].uses, self._postings[k].last_used))
+        else:
+            candidates.sort(key=lambda k: self._postings[k].last_used)
+        evicted = 0
+        for key in candidates:
+            if self._bytes <= self.max_bytes:
+                break
+            self._drop_posting(key)
+            evicted += 1
+        metrics.increment("hot_index.evictions", evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.version += 1
+            self._postings.clear()
+            self._documents.clear()
+            self._memberships.clear()
+            self._sizes.clear()
+            self._slots.clear()
+            self._free_slots.clear()
+            self._bytes = 0
+
+    # Changes
+
+    def apply_change(self, supplier_id: str, document: Optional[dict]) -> None:
+        """Bring the postings up to date with a supplier's new state (None: deleted)."""
+        with self._lock:
+            self.version += 1
+            for key in list(self._memberships.get(supplier_id, ())):
+                # Whether the supplier still matches a text term is only
+                # known to MongoDB, so the term is reloaded when next asked
+                if key[0] == TEXT and document is not None:
+                    self._drop_posting(key)
+                    continue
+                self._postings[key].ids.discard(supplier_id)
+                self._leave(key, supplier_id)
+            if document is None:
+                return
+
+            texts = _string_values(
+                {k: v for k, v in document.items() if k not in SUPPLIER_INTERNAL_FIELDS}
+            )
+            for key in [k for k in self._postings if k[0] == TEXT]:
+                root = _term_root(key[1])
+                if any(root in text for text in texts):
+                    self._drop_posting(key)
+
+            keys = []
+            for name in EXACT_FIELDS:
+                value = document.get(name)
+                for item in value if isinstance(value, list) else [value]:
+                    posting = self._postings.get((name, item)) if isinstance(item, str) else None
+                    if posting is not None and posting.ids is not None:
+                        keys.append((name, item))
+            if not keys:
+                return
+            self._store(supplier_id, document)
+            for key in keys:
+                self._postings[key].ids.add(supplier_id)
+                self._memberships[supplier_id].add(key)
+            self._evict()
+
+    def handle_event(self, change: dict) -> None:
+        operation = change.get("operationType")
+        if operation in RESET_EVENTS:
+            logger.info(f"Hot supplier index cleared after a {operation} event")
+            self.clear()
+            return
+        if operation not in ("insert", "update", "replace", "delete"):
+            return
+        if operation == "update":
+            description = change.get("updateDescription") or {}
+            changed = list(description.get("updatedFields") or {}) + list(
+                description.get("removedFields") or []
+            )
+            # Return counters and refresh claims do not change what a supplier says
+            if changed and all(
+                name.split(".")[0] in SUPPLIER_INTERNAL_FIELDS for name in changed
+            ):
+                return
+        self.apply_change(str(change["documentKey"]["_id"]), change.get("fullDocument"))
+
+    def activate(self, mode: str) -> None:
+        self.clear()
+        self.mode = mode
+        self.active = True
+        logger.info(f"Hot supplier index following the supplier collection ({mode})")
+
+    def deactivate(self) -> None:
+        self.active = False
+        self.mode = "off"
+        self.clear()
+
+    def follow(self, collection: Collection, stop: threading.Event) -> None:
+        """
+        Keep the index coherent with the collection until `stop` is set:
+        through its change stream, else by polling.
+        """
+        while not stop.is_set():
+            try:
+                stream = collection.watch(full_document="updateLookup", max_await_time_ms=1000)
+            except (OperationFailure, AttributeError, NotImplementedError) as e:
+                # Standalone servers (and the replay's in-memory collection)
+                # have no change streams
+                logger.info(f"Change streams unavailable ({str(e)}); polling for supplier updates")
+                self._follow_by_polling(collection, stop)
+                break
+            try:
+                with stream:
+                    self.activate("change stream")
+                    while stream.alive and not stop.is_set():
+                        change = stream.try_next()
+                        if change is not None:
+                            self.handle_event(change)
+            except PyMongoError as e:
+                # Changes may have been missed: start over from an empty index
+                logger.warning(f"Supplier change stream failed, reopening: {str(e)}")
+                self.deactivate()
+                stop.wait(HOT_INDEX_POLL_INTERVAL)
+        self.deactivate()
+
+    def _follow_by_polling(self, collection: Collection, stop: threading.Event) -> None:
+        try:
+            collection.create_index([(SUPPLIER_UPDATED_FIELD, ASCENDING)])
+        except PyMongoError as e:
+            logger.warning(f"Could not index {SUPPLIER_UPDATED_FIELD}: {str(e)}")
+        since = datetime.now(timezone.utc)
+        self._seen.clear()
+        self.activate("polling")
+        while not stop.wait(HOT_INDEX_POLL_INTERVAL):
+            try:
+                since = self.poll(collection, since)
+                if not self.active:
+                    self.activate("polling")
+            except PyMongoError as e:
+                logger.warning(f"Polling for supplier updates failed: {str(e)}")
+                self.deactivate()
+
+    def poll(self, collection: Collection, since: datetime) -> datetime:
+        """Apply suppliers updated since `since`; returns the newest update seen."""
+        cutoff = since - timedelta(seconds=HOT_INDEX_POLL_OVERLAP)
+        for document in collection.find({SUPPLIER_UPDATED_FIELD: {"$gte": cutoff}}).sort(
+            SUPPLIER_UPDATED_FIELD, ASCENDING
+        ):
+            supplier_id = str(document["_id"])
+            updated_at = _utc(document[SUPPLIER_UPDATED_FIELD])
+            if self._seen.get(supplier_id) == updated_at:
+                continue
+            self._seen[supplier_id] = updated_at
+            self.apply_change(supplier_id, document)
+            since = max(since, updated_at)
+        cutoff = since - timedelta(seconds=HOT_INDEX_POLL_OVERLAP)
+        self._seen = {k: v for k, v in self._seen.items() if v >= cutoff}
+        return since
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "active": self.active,
+                "mode": self.mode,
+                "postings": len(self._postings),
+                "suppliers": len(self._documents),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "eviction": self.eviction,
+            }
+
+
+@lru_cache
+def get_hot_index() -> HotSupplierIndex:
+    index = HotSupplierIndex(
+        max_bytes=int(HOT_INDEX_MAX_MB * 1024 * 1024),
+        eviction=HOT_INDEX_EVICTION,
+        max_posting=HOT_INDEX_MAX_POSTING,
+        ttl=HOT_INDEX_TTL,
+    )
+    metrics.register_source("hot_index", index.stats)
+    return index
+
+
+async def hot_index_watcher() -> None:
+    # A dedicated thread: following the collection blocks for the app's lifetime
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hot-index")
+    try:
+        _, collection = get_supplier_db_and_collection()
+        await asyncio.get_running_loop().run_in_executor(
+            executor, get_hot_index().follow, collection, stop
+        )
+    except Exception as e:
+        logger.error(f"Hot supplier index stopped: {str(e)}")
+    finally:
+        stop.set()
+        executor.shutdown(wait=False)
+
+
+def start_hot_index_watcher() -> Optional[asyncio.Task]:
+    if not HOT_INDEX_ENABLED:
+        return None
+    return asyncio.create_task(hot_index_watcher(), name="hot-supplier-index")
@@ -0,0 +1,382 @@
+"""
+Shared HTTP connection pool for the upstream APIs (OpenAI and Tavily).
+
+Each process keeps one tuned httpx client for sync calls and one for async
+calls, injected into the OpenAI clients (src/utils.py get_chat_model) and
+into the Tavily API wrappers below. Connections are kept alive for
+HTTP_KEEPALIVE_EXPIRY between bursts of tool calls, so a call usually
+reuses an open connection instead of paying TCP and TLS setup again, and
+speak HTTP/2 where the server offers it (one connection carries concurrent
+calls). langchain-tavily posts with `requests` and a new aiohttp session
+per call, which never reuses a connection; the pooled wrappers send the
+same requests through the shared clients instead.
+
+Host names are resolved once per HTTP_DNS_TTL_SECONDS (TLS still verifies
+the name, not the address). Per upstream host, the "http_pool" metrics
+source reports requests, the connections opened for them (the rest reused
+one) and the time spent connecting, in the TLS handshake and resolving.
+"""
+
+import asyncio
+import socket
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Optional
+
+import httpcore
+import httpx
+from langchain_tavily import _utilities as tavily_api
+from langchain_tavily._utilities import TavilyExtractAPIWrapper, TavilySearchAPIWrapper
+from loguru import logger
+
+from . import metrics
+from .config import (
+    HTTP2_ENABLED,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_DNS_TTL_SECONDS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    REQUEST_TIMEOUT,
+)
+from .context import time_budget
+
+try:
+    import h2  # noqa: F401 (httpx speaks HTTP/2 only with it installed)
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class PoolStats:
+    """Connection reuse per upstream host, over sync and async calls."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts: dict[str, dict[str, float]] = {}
+
+    def add(self, host: str, **values: float) -> None:
+        with self._lock:
+            counters = self._hosts.setdefault(
+                host,
+                dict.fromkeys(
+                    (
+                        "requests",
+                        "connections",
+                        "connect_seconds",
+                        "tls_handshakes",
+                        "tls_seconds",
+                        "dns_lookups",
+                        "dns_cache_hits",
+                        "dns_seconds",
+                    ),
+                    0.0,
+                ),
+            )
+            for name, value in values.items():
+                counters[name] += value
+
+    def stats(self) -> dict:
+        with self._lock:
+            hosts = {host: dict(counters) for host, counters in self._hosts.items()}
+        result = {}
+        for host, c in hosts.items():
+            requests, connections = int(c["requests"]), int(c["connections"])
+            result[host] = {
+                "requests": requests,
+                "connections_opened": connections,
+                "connections_reused": max(requests - connections, 0),
+                "reuse_rate": round(1 - connections / requests, 3) if requests else 0.0,
+                "connect_ms_avg": round(c["connect_seconds"] / connections * 1000, 2) if connections else 0.0,
+                "tls_handshakes": int(c["tls_handshakes"]),
+                "tls_ms_avg": (
+                    round(c["tls_seconds"] / c["tls_handshakes"] * 1000, 2) if c["tls_handshakes"] else 0.0
+                ),
+                "dns_lookups": int(c["dns_lookups"]),
+                "dns_cache_hits": int(c["dns_cache_hits"]),
+                "dns_ms_avg": round(c["dns_seconds"] / c["dns_lookups"] * 1000, 2) if c["dns_lookups"] else 0.0,
+            }
+        return result
+
+
+_stats = PoolStats()
+
+
+class DnsCache:
+    """Resolved TCP addresses per (host, port), kept for `ttl` seconds."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._addresses: dict[tuple[str, int], tuple[float, list[str]]] = {}
+
+    def get(self, host: str, port: int) -> Optional[list[str]]:
+        with self._lock:
+            cached = self._addresses.get((host, port))
+        if cached is None or cached[0] < time.monotonic():
+            return None
+        _stats.add(host, dns_cache_hits=1)
+        return cached[1]
+
+    def put(self, host: str, port: int, infos: list, seconds: float) -> list[str]:
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        _stats.add(host, dns_lookups=1, dns_seconds=seconds)
+        if self.ttl > 0:
+            with self._lock:
+                self._addresses[(host, port)] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+
+    def forget(self, host: str, port: int) -> None:
+        """Drop addresses that could not be connected to (the host may have moved)."""
+        with self._lock:
+            self._addresses.pop((host, port), None)
+
+
+_dns_cache = DnsCache(HTTP_DNS_TTL_SECONDS)
+
+
+def _resolve(host: str, port: int) -> list[str]:
+    addresses = _dns_cache.get(host, port)
+    if addresses is not None:
+        return addresses
+    start = time.perf_counter()
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except OSError as e:
+        raise httpcore.ConnectError(str(e)) from e
+    return _dns_cache.put(host, port, infos, time.perf_counter() - start)
+
+
+async def _aresolve(host: str, port: int) -> list[str]:
+    addresses = _dns_cache.get(host, port)
+    if addresses is not None:
+        return addresses
+    start = time.perf_counter()
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except OSError as e:
+        raise httpcore.ConnectError(str(e)) from e
+    return _dns_cache.put(host, port, infos, time.perf_counter() - start)
+
+
+class _CountedStream(httpcore.NetworkStream):
+    """A new connection's stream, timing its TLS handshake."""
+
+    def __init__(self, stream: httpcore.NetworkStream, host: str):
+        self._stream = stream
+        self._host = host
+
+    def read(self, max_bytes: int, timeout: Optional[float] = None) -> bytes:
+        return self._stream.read(max_bytes, timeout)
+
+    def write(self, buffer: bytes, timeout: Optional[float] = None) -> None:
+        self._stream.write(buffer, timeout)
+
+    def close(self) -> None:
+        self._stream.close()
+
+    def start_tls(self, ssl_context, server_hostname=None, timeout=None) -> httpcore.NetworkStream:
+        start = time.perf_counter()
+        stream = self._stream.start_tls(ssl_context, server_hostname, timeout)
+        _stats.add(self._host, tls_handshakes=1, tls_seconds=time.perf_counter() - start)
+        return stream
+
+    def get_extra_info(self, info: str) -> Any:
+        return self._stream.get_extra_info(info)
+
+
+class _AsyncCountedStream(httpcore.AsyncNetworkStream):
+    def __init__(self, stream: httpcore.AsyncNetworkStream, host: str):
+        self._stream = stream
+        self._host = host
+
+    async def read(self, max_bytes: int, timeout: Optional[float] = None) -> bytes:
+        return await self._stream.read(max_bytes, timeout)
+
+    async def write(self, buffer: bytes, timeout: Optional[float] = None) -> None:
+        await self._stream.write(buffer, timeout)
+
+    async def aclose(self) -> None:
+        await self._stream.aclose()
+
+    async def start_tls(self, ssl_context, server_hostname=None, timeout=None) -> httpcore.AsyncNetworkStream:
+        start = time.perf_counter()
+        stream = await self._stream.start_tls(ssl_context, server_hostname, timeout)
+        _stats.add(self._host, tls_handshakes=1, tls_seconds=time.perf_counter() - start)
+        return stream
+
+    def get_extra_info(self, info: str) -> Any:
+        return self._stream.get_extra_info(info)
+
+
+class _CachingBackend(httpcore.NetworkBackend):
+    """
+    httpcore's socket backend, connecting to cached addresses. The pool only
+    calls connect_tcp for connections it cannot reuse, so that is where new
+    connections are counted.
+    """
+
+    def __init__(self):
+        self._backend = httpcore.SyncBackend()
+
+    def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        addresses = _resolve(host, port)
+        start = time.perf_counter()
+        error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                stream = self._backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+                continue
+            _stats.add(host, connections=1, connect_seconds=time.perf_counter() - start)
+            return _CountedStream(stream, host)
+        _dns_cache.forget(host, port)
+        raise error or httpcore.ConnectError(f"No addresses for {host}")
+
+    def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return self._backend.connect_unix_socket(path, timeout, socket_options)
+
+    def sleep(self, seconds: float) -> None:
+        self._backend.sleep(seconds)
+
+
+class _AsyncCachingBackend(httpcore.AsyncNetworkBackend):
+    def __init__(self):
+        self._backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        addresses = await _aresolve(host, port)
+        start = time.perf_counter()
+        error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                stream = await self._backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+                continue
+            _stats.add(host, connections=1, connect_seconds=time.perf_counter() - start)
+            return _AsyncCountedStream(stream, host)
+        _dns_cache.forget(host, port)
+        raise error or httpcore.ConnectError(f"No addresses for {host}")
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+def _pool_options() -> dict:
+    return {
+        "ssl_context": httpx.create_ssl_context(),
+        "max_connections": HTTP_MAX_CONNECTIONS,
+        "max_keepalive_connections": HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        "keepalive_expiry": HTTP_KEEPALIVE_EXPIRY,
+        "http2": HTTP2_ENABLED and HTTP2_AVAILABLE,
+    }
+
+
+class PooledTransport(httpx.HTTPTransport):
+    """httpx's transport over a connection pool with the caching backend."""
+
+    def __init__(self):
+        super().__init__()
+        self._pool = httpcore.ConnectionPool(network_backend=_CachingBackend(), **_pool_options())
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        _stats.add(request.url.host, requests=1)
+        return super().handle_request(request)
+
+
+class AsyncPooledTransport(httpx.AsyncHTTPTransport):
+    def __init__(self):
+        super().__init__()
+        self._pool = httpcore.AsyncConnectionPool(network_backend=_AsyncCachingBackend(), **_pool_options())
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        _stats.add(request.url.host, requests=1)
+        return await super().handle_async_request(request)
+
+
+def _timeout() -> httpx.Timeout:
+    # OpenAI calls pass their own (deadline-bounded) timeout per request
+    return httpx.Timeout(REQUEST_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+
+@lru_cache
+def get_http_client() -> httpx.Client:
+    metrics.register_source("http_pool", _stats.stats)
+    logger.info(
+        f"Upstream HTTP pool: {HTTP_MAX_CONNECTIONS} connections, "
+        f"keep-alive {HTTP_KEEPALIVE_EXPIRY:.0f}s, HTTP/2 {'on' if _pool_options()['http2'] else 'off'}"
+    )
+    return httpx.Client(transport=PooledTransport(), timeout=_timeout())
+
+
+@lru_cache
+def get_async_http_client() -> httpx.AsyncClient:
+    metrics.register_source("http_pool", _stats.stats)
+    return httpx.AsyncClient(transport=AsyncPooledTransport(), timeout=_timeout())
+
+
+def _tavily_request(endpoint: str, api_key, params: dict) -> tuple[str, dict, dict]:
+    return (
+        # Read per call, so it can be pointed elsewhere (benchmarks/load_server.py)
+        f"{tavily_api.TAVILY_API_URL}/{endpoint}",
+        {k: v for k, v in params.items() if v is not None},
+        {
+            "Authorization": f"Bearer {api_key.get_secret_value()}",
+            "Content-Type": "application/json",
+            "X-Client-Source": "langchain-tavily",
+        },
+    )
+
+
+def _tavily_response(response: httpx.Response) -> dict:
+    # Same errors as langchain-tavily's, which check_tavily_response parses
+    if response.status_code != 200:
+        try:
+            detail = response.json().get("detail", {})
+        except ValueError:
+            detail = response.text
+        error = detail.get("error") if isinstance(detail, dict) else detail or "Unknown error"
+        raise ValueError(f"Error {response.status_code}: {error}")
+    return response.json()
+
+
+def _tavily_post(endpoint: str, api_key, params: dict) -> dict:
+    url, body, headers = _tavily_request(endpoint, api_key, params)
+    return _tavily_response(
+        get_http_client().post(url, json=body, headers=headers, timeout=time_budget(REQUEST_TIMEOUT))
+    )
+
+
+async def _tavily_apost(endpoint: str, api_key, params: dict) -> dict:
+    url, body, headers = _tavily_request(endpoint, api_key, params)
+    response = await get_async_http_client().post(
+        url, json=body, headers=headers, timeout=time_budget(REQUEST_TIMEOUT)
+    )
+    return _tavily_response(response)
+
+
+class PooledTavilySearchAPIWrapper(TavilySearchAPIWrapper):
+    """Tavily Search API wrapper sending its requests through the shared pool."""
+
+    def raw_results(self, **params) -> dict:
+        return _tavily_post("search", self.tavily_api_key, params)
+
+    async def raw_results_async(self, **params) -> dict:
+        return await _tavily_apost("search", self.tavily_api_key, params)
+
+
+class PooledTavilyExtractAPIWrapper(TavilyExtractAPIWrapper):
+    """Tavily Extract API wrapper sending its requests through the shared pool."""
+
+    def raw_results(self, **params) -> dict:
+        return _tavily_post("extract", self.tavily_api_key, params)
+
+    async def raw_results_async(self, **params) -> dict:
+        return await _tavily_apost("extract", self.tavily_api_key, params)
@@ -0,0 +1,501 @@
+"""
+Bulk supplier ingestion. Streams CSV or JSONL supplier files (optionally
+gzipped) of any size into the supplier collection:
+
+    python -m src.ingest suppliers.csv
+    python -m src.ingest suppliers.jsonl.gz --batch-size 5000
+
+Rows are normalized and validated against the Supplier model, rows of the
+same supplier within a batch are merged, and each batch is written as one
+unordered bulk upsert keyed on the supplier's identifiers (website, phone,
+email). Stored suppliers of the same company are updated rather than
+duplicated, and rows that change nothing are not written, so re-running a
+file is harmless. One batch is written while
+the next one is parsed, so memory stays at about two batches.
+
+Progress is checkpointed next to the file after every written batch, and
+an interrupted run resumes from the last checkpoint (--restart starts
+over).
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, Optional, TextIO, Union
+
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError
+
+from .config import (
+    ENTITY_INDEX_FIELD,
+    INGEST_BATCH_SIZE,
+    INGEST_LIST_SEPARATORS,
+    INGEST_MAX_REPORTED_ERRORS,
+    INGEST_PROGRESS_INTERVAL,
+    SUPPLIER_UPDATED_FIELD,
+)
+from .entities import (
+    EntityProfile,
+    create_entity_index_if_not_exists,
+    normalize_company_name,
+    supplier_profile,
+)
+from .models import Contact, Supplier
+from .utils import create_search_index_if_not_exists, get_logger, get_supplier_db_and_collection
+from .validation import is_missing
+
+logger = get_logger()
+
+FORMATS = {"csv": "csv", "jsonl": "jsonl", "ndjson": "jsonl", "json": "jsonl"}
+LIST_FIELDS = {"certifications", "specialties"}
+# Column names used by common supplier exports
+COLUMN_ALIASES = {
+    "name": "company_name",
+    "company": "company_name",
+    "supplier": "company_name",
+    "supplier_name": "company_name",
+    "country": "location",
+    "min_order_quantity": "moq",
+    "certification": "certifications",
+    "specialty": "specialties",
+    "timezone": "time_zone",
+    "url": "website",
+}
+LIST_SEPARATOR_PATTERN = re.compile(f"[{re.escape(INGEST_LIST_SEPARATORS)}]")
+# Stored for fields a row does not have, so every document parses as a Supplier
+PLACEHOLDERS = {
+    **{field: "N/A" for field in Supplier.model_fields},
+    "rating": 0.0,
+    "certifications": [],
+    "specialties": [],
+    "contact": {field: "N/A" for field in Contact.model_fields},
+}
+
+
+@dataclass
+class IngestStats:
+    rows: int = 0
+    rejected: int = 0
+    merged: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    write_errors: int = 0
+
+
+def source_format(path: Path) -> str:
+    suffixes = [suffix.lstrip(".").lower() for suffix in path.suffixes if suffix != ".gz"]
+    fmt = FORMATS.get(suffixes[-1] if suffixes else "")
+    if fmt is None:
+        raise ValueError(
+            f"Unsupported file type {path.name!r}: expected .csv or .jsonl (optionally .gz)"
+        )
+    return fmt
+
+
+def open_source(path: Path) -> TextIO:
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def read_rows(path: Path, fmt: str) -> Iterator[Union[dict, str]]:
+    """Rows of the file, one at a time: dicts for CSV, raw lines for JSONL."""
+    with open_source(path) as handle:
+        if fmt == "csv":
+            yield from csv.DictReader(handle)
+            return
+        for line in handle:
+            if line.strip():
+                yield line
+
+
+def _column(name: str) -> str:
+    key = re.sub(r"[\s\-]+", "_", name.strip().lower())
+    for prefix in ("contact.", "contact_"):
+        key = key.removeprefix(prefix)
+    return COLUMN_ALIASES.get(key, key)
+
+
+def _text(value) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    return None if is_missing(text) else text
+
+
+def _list(value) -> list[str]:
+    if not isinstance(value, (list, tuple)):
+        value = LIST_SEPARATOR_PATTERN.split(str(value or ""))
+    return [text for text in (_text(item) for item in value) if text]
+
+
+def normalize_row(raw: Union[dict, str]) -> dict:
+    """
+    The supplier fields of one raw row: strings stripped, list cells split,
+    contact fields nested and missing values left out. Raises ValueError
+    (or ValidationError) for rows that are not a valid supplier.
+    """
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+    if not isinstance(raw, dict):
+        raise ValueError("row is not an object")
+
+    flat = {}
+    for key, value in raw.items():
+        if key is None:
+            continue  # CSV cells beyond the header
+        if _column(key) == "contact" and isinstance(value, dict):
+            flat.update({_column(k): v for k, v in value.items() if k is not None})
+        else:
+            flat[_column(key)] = value
+
+    supplier = {}
+    for field in Supplier.model_fields:
+        if field == "contact":
+            contact = {f: _text(flat.get(f)) for f in Contact.model_fields}
+            contact = {f: v for f, v in contact.items() if v}
+            if contact:
+                supplier["contact"] = contact
+        elif field in LIST_FIELDS:
+            items = _list(flat.get(field))
+            if items:
+                supplier[field] = items
+        elif field == "rating":
+            rating = _text(flat.get(field))
+            if rating:
+                try:
+                    supplier["rating"] = float(rating)
+                except ValueError:
+                    raise ValueError(f"rating {rating!r} is not a number") from None
+                if not 0 <= supplier["rating"] <= 5:
+                    raise ValueError(f"rating {rating} is outside 0-5")
+        else:
+            text = _text(flat.get(field))
+            if text:
+                supplier[field] = text
+    if "company_name" not in supplier:
+        raise ValueError("company_name is missing")
+
+    verified_at = _text(flat.get("last_verified_at"))
+    if verified_at:
+        parsed = datetime.fromisoformat(verified_at)
+        supplier["last_verified_at"] = (
+            parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+        )
+
+    Supplier.model_validate(
+        {**PLACEHOLDERS, **supplier, "contact": {**PLACEHOLDERS["contact"], **supplier.get("contact", {})}}
+    )
+    return supplier
+
+
+def merge_rows(stored: dict, row: dict) -> dict:
+    """Later rows win; fields they lack keep the earlier value."""
+    merged = dict(stored, **row)
+    if "contact" in stored and "contact" in row:
+        merged["contact"] = dict(stored["contact"], **row["contact"])
+    return merged
+
+
+def row_keys(profile: EntityProfile) -> set[str]:
+    return profile.identifiers or {f"name:{normalize_company_name(profile.name)}"}
+
+
+class Batch:
+    """Rows to upsert, with rows of the same supplier merged into one."""
+
+    def __init__(self):
+        self.rows: list[dict] = []
+        self.profiles: list[EntityProfile] = []
+        self.slots: dict[str, int] = {}
+        self.merged = 0
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add(self, row: dict) -> None:
+        profile = supplier_profile(row)
+        keys = row_keys(profile)
+        slot = next((self.slots[key] for key in keys if key in self.slots), None)
+        if slot is None:
+            slot = len(self.rows)
+            self.rows.append(row)
+            self.profiles.append(profile)
+        else:
+            self.merged += 1
+            self.rows[slot] = merge_rows(self.rows[slot], row)
+            self.profiles[slot] = supplier_profile(self.rows[slot])
+            keys = keys | row_keys(self.profiles[slot])
+        for key in keys:
+            self.slots[key] = slot
+
+    def operations(self, stored: list[Optional[dict]]) -> list[UpdateOne]:
+        """Upserts of the rows that add or change anything on `stored`."""
+        operations = []
+        for row, profile, document in zip(self.rows, self.profiles, stored):
+            operation = upsert_operation(row, profile, document)
+            if operation is not None:
+                operations.append(operation)
+        return operations
+
+
+def _upsert_query(row: dict, profile: EntityProfile) -> dict:
+    if profile.identifiers:
+        return {ENTITY_INDEX_FIELD: {"$elemMatch": {"$in": sorted(profile.identifiers)}}}
+    return {"company_name": row["company_name"]}
+
+
+def find_stored(collection: Collection, batch: Batch) -> list[Optional[dict]]:
+    """
+    The stored supplier each row's upsert would update (None for new
+    suppliers), looked up with a single query for the whole batch.
+    """
+    identifiers = sorted({i for profile in batch.profiles for i in profile.identifiers})
+    names = sorted(
+        {row["company_name"] for row, profile in zip(batch.rows, batch.profiles) if not profile.identifiers}
+    )
+    clauses = []
+    if identifiers:
+        clauses.append({ENTITY_INDEX_FIELD: {"$in": identifiers}})
+    if names:
+        clauses.append({"company_name": {"$in": names}})
+    documents = list(collection.find({"$or": clauses})) if clauses else []
+
+    def match(row: dict, profile: EntityProfile) -> Optional[dict]:
+        for document in documents:
+            if profile.identifiers:
+                if profile.identifiers & set(document.get(ENTITY_INDEX_FIELD) or []):
+                    return document
+            elif document.get("company_name") == row["company_name"]:
+                return document
+        return None
+
+    return [match(row, profile) for row, profile in zip(batch.rows, batch.profiles)]
+
+
+def _stored_value(document: dict, path: str):
+    value = document
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    if isinstance(value, datetime) and value.tzinfo is None:
+        # MongoDB returns naive UTC datetimes
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def upsert_operation(
+    row: dict, profile: EntityProfile, stored: Optional[dict] = None
+) -> Optional[UpdateOne]:
+    """
+    Update the stored supplier sharing an identifier with the row (or, for
+    rows without any, its exact name); insert it when there is none.
+    SUPPLIER_UPDATED_FIELD only moves when a value changes, and a row that
+    changes nothing on `stored` needs no write (None).
+    """
+    contact = row.get("contact", {})
+    values = {key: value for key, value in row.items() if key != "contact"}
+    values.update({f"contact.{key}": value for key, value in contact.items()})
+    keys = profile.keys()
+    if stored is not None:
+        values = {
+            key: value for key, value in values.items() if _stored_value(stored, key) != value
+        }
+        keys = [key for key in keys if key not in (stored.get(ENTITY_INDEX_FIELD) or [])]
+        if not values and not keys:
+            return None
+    if values:
+        values[SUPPLIER_UPDATED_FIELD] = datetime.now(timezone.utc)
+    placeholders = {
+        key: value for key, value in PLACEHOLDERS.items() if key not in row and key != "contact"
+    }
+    placeholders.update(
+        {
+            f"contact.{key}": value
+            for key, value in PLACEHOLDERS["contact"].items()
+            if key not in contact
+        }
+    )
+    if "last_verified_at" not in row:
+        # Unverified until a refresh or an agent run verifies it; without
+        # the field, its age would count from when it was inserted
+        placeholders["last_verified_at"] = None
+    update = {"$addToSet": {ENTITY_INDEX_FIELD: {"$each": keys}}} if keys else {}
+    if values:
+        update["$set"] = values
+    update["$setOnInsert"] = placeholders
+    return UpdateOne(_upsert_query(row, profile), update, upsert=True)
+
+
+def write_batch(collection: Collection, batch: Batch) -> dict:
+    operations = batch.operations(find_stored(collection, batch))
+    # Rows already stored as they are
+    skipped = len(batch) - len(operations)
+    if not operations:
+        return {"inserted": 0, "updated": 0, "unchanged": skipped, "write_errors": 0}
+    try:
+        result = collection.bulk_write(operations, ordered=False).bulk_api_result
+    except BulkWriteError as e:
+        result = e.details
+        logger.error(
+            f"{len(result['writeErrors'])} of {len(operations)} upserts failed, "
+            f"first: {result['writeErrors'][0].get('errmsg')}"
+        )
+    return {
+        "inserted": result.get("nUpserted", 0),
+        "updated": result.get("nModified", 0),
+        "unchanged": skipped + result.get("nMatched", 0) - result.get("nModified", 0),
+        "write_errors": len(result.get("writeErrors", [])),
+    }
+
+
+def checkpoint_path(path: Path) -> Path:
+    return path.with_name(f"{path.name}.ingest.json")
+
+
+def _source_version(path: Path) -> dict:
+    stat = path.stat()
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def load_checkpoint(path: Path) -> Optional[IngestStats]:
+    """Stats of an interrupted run over this exact file, if any."""
+    try:
+        checkpoint = json.loads(checkpoint_path(path).read_text())
+    except FileNotFoundError:
+        return None
+    if checkpoint.get("source") != _source_version(path):
+        logger.warning(f"{path.name} changed since the last checkpoint; starting over")
+        return None
+    return IngestStats(**checkpoint["stats"])
+
+
+def save_checkpoint(path: Path, stats: IngestStats) -> None:
+    target = checkpoint_path(path)
+    temporary = target.with_suffix(".tmp")
+    temporary.write_text(json.dumps({"source": _source_version(path), "stats": asdict(stats)}))
+    os.replace(temporary, target)
+
+
+def ingest_file(
+    path: Union[str, Path], batch_size: int = INGEST_BATCH_SIZE, restart: bool = False
+) -> dict:
+    """
+    Ingest a CSV/JSONL supplier file, resuming an interrupted run unless
+    `restart`. Returns the final stats with the throughput of this run.
+    """
+    path = Path(path)
+    fmt = source_format(path)
+    _, collection = get_supplier_db_and_collection()
+    create_search_index_if_not_exists()
+    create_entity_index_if_not_exists(collection)
+
+    stats = (None if restart else load_checkpoint(path)) or IngestStats()
+    resumed_at = stats.rows
+    if resumed_at:
+        logger.info(f"Resuming {path.name} after row {resumed_at}")
+
+    start = time.perf_counter()
+    last_report = start
+    # The batch being written, and the read stats as of its last row
+    pending: Optional[tuple[Future, IngestStats]] = None
+
+    def finish_pending() -> None:
+        nonlocal pending
+        if pending is None:
+            return
+        future, read_stats = pending
+        for name, count in future.result().items():
+            setattr(stats, name, getattr(stats, name) + count)
+        # Rows after the batch are read again on resume
+        save_checkpoint(
+            path,
+            IngestStats(
+                **dict(
+                    asdict(stats),
+                    rows=read_stats.rows,
+                    rejected=read_stats.rejected,
+                    merged=read_stats.merged,
+                )
+            ),
+        )
+        pending = None
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest") as executor:
+
+        def submit(batch: Batch) -> None:
+            nonlocal pending
+            stats.merged += batch.merged
+            # One batch in flight: a supplier new to the collection cannot be
+            # inserted twice by concurrent batches, and each batch compares
+            # its rows against what the previous one wrote
+            finish_pending()
+            pending = (
+                executor.submit(write_batch, collection, batch),
+                IngestStats(**asdict(stats)),
+            )
+
+        batch = Batch()
+        for position, raw in enumerate(read_rows(path, fmt), start=1):
+            if position <= resumed_at:
+                continue
+            stats.rows = position
+            try:
+                batch.add(normalize_row(raw))
+            except (ValueError, ValidationError) as e:
+                stats.rejected += 1
+                if stats.rejected <= INGEST_MAX_REPORTED_ERRORS:
+                    logger.warning(f"Rejected row {position}: {str(e).splitlines()[0]}")
+            if len(batch) >= batch_size:
+                submit(batch)
+                batch = Batch()
+
+            now = time.perf_counter()
+            if now - last_report >= INGEST_PROGRESS_INTERVAL:
+                last_report = now
+                logger.info(
+                    f"{path.name}: {stats.rows} rows "
+                    f"({(stats.rows - resumed_at) / (now - start):.0f} rows/s), "
+                    f"{stats.inserted} inserted, {stats.updated} updated, {stats.rejected} rejected"
+                )
+        if len(batch):
+            submit(batch)
+        finish_pending()
+
+    elapsed = time.perf_counter() - start
+    checkpoint_path(path).unlink(missing_ok=True)
+    summary = dict(
+        asdict(stats),
+        resumed_at=resumed_at,
+        seconds=round(elapsed, 2),
+        rows_per_sec=round((stats.rows - resumed_at) / elapsed, 1) if elapsed else 0.0,
+    )
+    logger.info(f"Ingested {path.name}: {summary}")
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("path", help="CSV or JSONL file, optionally gzipped")
+    parser.add_argument(
+        "--batch-size", type=int, default=INGEST_BATCH_SIZE, help="upserts per bulk write"
+    )
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore the checkpoint of an interrupted run"
+    )
+    args = parser.parse_args()
+    print(json.dumps(ingest_file(args.path, args.batch_size, args.restart), indent=2))
+
+
+if __name__ == "__main__":
+    main()
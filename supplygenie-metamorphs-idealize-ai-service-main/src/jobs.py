@@ -0,0 +1,380 @@
+import asyncio
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Optional
+
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableConfig
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.collection import Collection
+
+from .agents import (
+    answer_best_so_far,
+    extract_suppliers,
+    researched_suppliers,
+    supply_chain_agent,
+    unfinalized,
+)
+from .pipeline import fast_pipeline
+from . import continuation, sessions
+from .checkpoints import MongoCheckpointSaver
+from .context import RunCancelled, start_request_context
+from .config import (
+    AGENT_RECURSION_LIMIT,
+    JOB_HEARTBEAT_INTERVAL,
+    JOB_HEARTBEAT_TIMEOUT,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_INTERVAL,
+    JOB_WORKER_COUNT,
+)
+from .models import AgentConfig, JobRecord, supplier_document
+from .utils import (
+    get_logger,
+    get_supplier_db_and_collection,
+    save_suppliers_to_mongodb,
+)
+
+logger = get_logger()
+
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+# Cancellation flags for the jobs running in this process, keyed by job id
+_cancel_events: dict[str, threading.Event] = {}
+
+
+@lru_cache
+def get_jobs_collection() -> Collection:
+    """
+    Returns the MongoDB collection holding background job records.
+    """
+    db, _ = get_supplier_db_and_collection()
+    collection = db["jobs"]
+    collection.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+    return collection
+
+
+@lru_cache
+def get_checkpointer() -> MongoCheckpointSaver:
+    """
+    Returns the LangGraph checkpointer used to persist job progress.
+    Each job uses its job id as the graph thread id, so whichever worker
+    reclaims an interrupted job resumes from its last completed step
+    instead of starting over.
+    """
+    db, _ = get_supplier_db_and_collection()
+    return MongoCheckpointSaver(db["job_checkpoints"], db["job_checkpoint_writes"])
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _to_record(job: dict) -> JobRecord:
+    return JobRecord(
+        job_id=job["_id"],
+        status=job["status"],
+        query=job["query"],
+        attempts=job.get("attempts", 0),
+        supplier_count=len((job.get("result") or {}).get("suppliers", [])),
+        error=job.get("error"),
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+    )
+
+
+def submit_job(requirements: AgentConfig) -> JobRecord:
+    """
+    Queue a recommendation run and return its job record.
+    """
+    now = _utcnow()
+    chat_history = requirements.chat_history
+    if requirements.session_id:
+        # Resolved now: the job keeps the history it was submitted with
+        chat_history = sessions.begin_turn(
+            requirements.session_id, requirements.query, requirements.chat_history
+        )
+    job = {
+        "_id": uuid.uuid4().hex,
+        "status": "queued",
+        "query": requirements.query,
+        "chat_history": chat_history,
+        "session_id": requirements.session_id,
+        "mode": requirements.mode,
+        "attempts": 0,
+        "result": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+    get_jobs_collection().insert_one(job)
+    logger.info(f"Queued job {job['_id']} for query: {requirements.query[:100]}...")
+    return _to_record(job)
+
+
+def get_job(job_id: str) -> Optional[JobRecord]:
+    job = get_jobs_collection().find_one({"_id": job_id})
+    return _to_record(job) if job else None
+
+
+def list_jobs(status: Optional[str] = None, limit: int = 50) -> list[JobRecord]:
+    query_filter = {"status": status} if status else {}
+    cursor = (
+        get_jobs_collection()
+        .find(query_filter, {"chat_history": 0, "result": 0})
+        .sort("created_at", DESCENDING)
+        .limit(limit)
+    )
+    return [_to_record(job) for job in cursor]
+
+
+def get_job_result(job_id: str) -> Optional[dict]:
+    """
+    Returns the raw job document including its result, or None if unknown.
+    """
+    return get_jobs_collection().find_one({"_id": job_id})
+
+
+def cancel_job(job_id: str) -> Optional[JobRecord]:
+    """
+    Cancel a queued or running job. A running job stops at its next graph step.
+    """
+    job = get_jobs_collection().find_one_and_update(
+        {"_id": job_id, "status": {"$in": ["queued", "running"]}},
+        {"$set": {"status": "cancelled", "updated_at": _utcnow()}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if job is None:
+        return get_job(job_id)
+
+    cancel_event = _cancel_events.get(job_id)
+    if cancel_event is not None:
+        cancel_event.set()
+    logger.info(f"Cancelled job {job_id}")
+    return _to_record(job)
+
+
+def _claim_next_job() -> Optional[dict]:
+    """
+    Atomically claim the oldest queued job, or a running job whose worker
+    stopped sending heartbeats (e.g. the pod was restarted mid-run).
+    """
+    collection = get_jobs_collection()
+    now = _utcnow()
+    stale_before = now - timedelta(seconds=JOB_HEARTBEAT_TIMEOUT)
+
+    abandoned = collection.update_many(
+        {
+            "status": "running",
+            "heartbeat_at": {"$lt": stale_before},
+            "attempts": {"$gte": JOB_MAX_ATTEMPTS},
+        },
+        {
+            "$set": {
+                "status": "failed",
+                "error": f"Job was interrupted {JOB_MAX_ATTEMPTS} times",
+                "updated_at": now,
+            }
+        },
+    )
+    if abandoned.modified_count:
+        logger.warning(f"Marked {abandoned.modified_count} abandoned jobs as failed")
+
+    return collection.find_one_and_update(
+        {
+            "$or": [
+                {"status": "queued"},
+                {"status": "running", "heartbeat_at": {"$lt": stale_before}},
+            ],
+            "attempts": {"$lt": JOB_MAX_ATTEMPTS},
+        },
+        {
+            "$set": {
+                "status": "running",
+                "worker_id": WORKER_ID,
+                "heartbeat_at": now,
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _run_job_graph(job: dict, cancel_event: threading.Event) -> Optional[dict]:
+    """
+    Run (or resume) the supply chain graph for a job. Returns the final graph
+    state, or None if the job was cancelled between steps.
+    """
+    job_id = job["_id"]
+    # Upstream calls of a cancelled job stop at their next check as well
+    start_request_context(request_id=job_id, query=job["query"], cancelled=cancel_event)
+    if job.get("mode") == "fast":
+        agent = fast_pipeline(checkpointer=get_checkpointer())
+    else:
+        agent = supply_chain_agent(
+            chat_history=job.get("chat_history"), checkpointer=get_checkpointer()
+        )
+    config = RunnableConfig(
+        recursion_limit=AGENT_RECURSION_LIMIT, configurable={"thread_id": job_id}
+    )
+
+    snapshot = agent.get_state(config)
+    if snapshot.values and not snapshot.next:
+        logger.info(f"Job {job_id} already finished before interruption")
+        return _answered(snapshot.values, job)
+    if snapshot.next:
+        logger.info(f"Resuming job {job_id} from checkpoint at {snapshot.next}")
+        input_payload = None
+    else:
+        logger.info(f"Starting job {job_id} from scratch")
+        input_payload = {
+            "query": job["query"],
+            "chat_history": job.get("chat_history"),
+            "messages": [HumanMessage(content=job["query"])],
+        }
+
+    final_state = None
+    try:
+        for state in agent.stream(input_payload, config=config, stream_mode="values"):
+            final_state = state
+            if cancel_event.is_set():
+                logger.info(f"Job {job_id} stopped at a step boundary after cancellation")
+                return None
+    except RunCancelled:
+        logger.info(f"Job {job_id} stopped during a step after cancellation")
+        return None
+    return _answered(final_state, job)
+
+
+def _answered(final_state: dict, job: dict) -> dict:
+    """A job's final state, answered with best_so_far if the agent never finalized."""
+    if unfinalized(final_state):
+        return answer_best_so_far(
+            final_state, job, "agent", f"Job {job['_id']} ended without finalizing"
+        )
+    return final_state
+
+
+def _finish_job(job_id: str, update: dict) -> None:
+    update["updated_at"] = _utcnow()
+    get_jobs_collection().update_one(
+        {"_id": job_id, "status": "running", "worker_id": WORKER_ID},
+        {"$set": update},
+    )
+
+
+async def _process_job(job: dict) -> None:
+    job_id = job["_id"]
+    collection = get_jobs_collection()
+    cancel_event = threading.Event()
+    _cancel_events[job_id] = cancel_event
+    logger.info(f"Worker {WORKER_ID} picked up job {job_id} (attempt {job['attempts']})")
+
+    run = asyncio.ensure_future(asyncio.to_thread(_run_job_graph, job, cancel_event))
+    try:
+        while True:
+            done, _ = await asyncio.wait({run}, timeout=JOB_HEARTBEAT_INTERVAL)
+            if done:
+                break
+            heartbeat = await asyncio.to_thread(
+                collection.update_one,
+                {"_id": job_id, "status": "running", "worker_id": WORKER_ID},
+                {"$set": {"heartbeat_at": _utcnow()}},
+            )
+            if heartbeat.matched_count == 0:
+                # Cancelled through the API or claimed by another worker
+                cancel_event.set()
+
+        final_state = run.result()
+        if final_state is None:
+            return
+
+        suppliers = extract_suppliers(final_state)
+        if suppliers:
+            save_result = await asyncio.to_thread(
+                save_suppliers_to_mongodb, researched_suppliers(final_state)
+            )
+            logger.info(f"MongoDB save result for job {job_id}: {save_result}")
+        await asyncio.to_thread(
+            _finish_job,
+            job_id,
+            {
+                "status": "succeeded",
+                "result": {"suppliers": suppliers},
+                "error": None,
+            },
+        )
+        logger.info(f"Job {job_id} succeeded with {len(suppliers)} suppliers")
+        # The job id doubles as the run id for continuations
+        await asyncio.to_thread(
+            continuation.save_run,
+            job_id,
+            job["query"],
+            job.get("mode", "agent"),
+            job.get("chat_history"),
+            suppliers,
+            continuation.run_state(final_state),
+        )
+        if job.get("session_id"):
+            await asyncio.to_thread(sessions.record_reply, job["session_id"], suppliers)
+
+    except asyncio.CancelledError:
+        # Worker shutdown: stop the graph at its next step, keep the checkpoint
+        cancel_event.set()
+        raise
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+        retry = job["attempts"] < JOB_MAX_ATTEMPTS
+        await asyncio.to_thread(
+            _finish_job,
+            job_id,
+            {"status": "queued" if retry else "failed", "error": str(e)},
+        )
+        if not retry and job.get("session_id"):
+            await asyncio.to_thread(sessions.record_reply, job["session_id"], [])
+    finally:
+        _cancel_events.pop(job_id, None)
+
+
+async def job_worker(worker_index: int) -> None:
+    logger.info(f"Job worker {worker_index} started on {WORKER_ID}")
+    while True:
+        try:
+            job = await asyncio.to_thread(_claim_next_job)
+        except Exception as e:
+            logger.error(f"Job worker {worker_index} could not claim a job: {str(e)}")
+            job = None
+
+        if job is None:
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            continue
+        await _process_job(job)
+
+
+def start_job_workers() -> list[asyncio.Task]:
+    logger.info(f"Starting {JOB_WORKER_COUNT} background job workers")
+    return [
+        asyncio.create_task(job_worker(i), name=f"job-worker-{i}")
+        for i in range(JOB_WORKER_COUNT)
+    ]
+
+
+async def stop_job_workers(workers: list[asyncio.Task]) -> None:
+    for cancel_event in _cancel_events.values():
+        cancel_event.set()
+    for worker in workers:
+        worker.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    logger.info("Background job workers stopped")
+
+
+def job_result_suppliers(job: dict) -> list[dict]:
+    return [
+        supplier_document(supplier)
+        for supplier in (job.get("result") or {}).get("suppliers", [])
+    ]
@@ -1,35 +1,223 @@
-from fastapi import FastAPI
-from .models import AgentConfig, SupplierExplorationAgentResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response
+from .models import (
+    AgentConfig,
+    SupplierExplorationAgentResponse,
+    JobRecord,
+    JobListResponse,
+    SessionRecord,
+    ProfileRecord,
+    ProfileListResponse,
+)
 import asyncio
-from .agents import supply_chain_agent
-from .utils import get_logger, save_suppliers_to_mongodb
+import hmac
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
+from .agents import supply_chain_agent, extract_suppliers, researched_suppliers, run_graph
+from .pipeline import fast_pipeline
+from .utils import get_logger, get_supplier_db_and_collection, save_suppliers_to_mongodb
 from langchain_core.messages import HumanMessage
 from langchain_core.runnables import RunnableConfig
-from .config import AGENT_RECURSION_LIMIT
+from .config import (
+    ADMIN_TOKEN,
+    ADMIN_TOKEN_HEADER,
+    AGENT_MAX_SUPPLIERS,
+    AGENT_RECURSION_LIMIT,
+    DB_FIRST_ENABLED,
+    DISCONNECT_POLL_INTERVAL,
+    EVENT_LOOP_MONITOR_INTERVAL,
+    PREFETCH_ENABLED,
+    PROFILE_HEADER,
+    PROFILE_SAMPLE_RATE,
+    REPLAY_RECORD_DIR,
+    REQUEST_DEADLINE_HEADER,
+    REQUEST_DEADLINE_SECONDS,
+    RETRIEVAL_SEED_LIMIT,
+    THREAD_POOL_SIZE,
+)
+from .replay import ReplayRecorder
 from fastapi.middleware.cors import CORSMiddleware
+from . import continuation, jobs, profiling, sessions
+from . import metrics
+from .context import DeadlineExceeded, RequestContext, RunCancelled, start_request_context
+from .entities import backfill_entity_index
+from .hotindex import start_hot_index_watcher
+from .retrieval import retrieve_suppliers, seed_messages
+from .prefetch import finish_prefetch, start_prefetch
+from .ratelimit import db_only_mode, get_openai_governor, get_tavily_governor
+from .refresher import record_returned_suppliers, start_refresh_worker
 
 logger = get_logger()
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    runtime_monitor = metrics.start_runtime_monitor(
+        THREAD_POOL_SIZE, EVENT_LOOP_MONITOR_INTERVAL
+    )
+    job_workers = jobs.start_job_workers()
+    entity_backfill = asyncio.create_task(backfill_entity_keys())
+    supplier_refresher = start_refresh_worker()
+    hot_index_watcher = start_hot_index_watcher()
+    yield
+    if hot_index_watcher is not None:
+        hot_index_watcher.cancel()
+    if supplier_refresher is not None:
+        supplier_refresher.cancel()
+    entity_backfill.cancel()
+    await jobs.stop_job_workers(job_workers)
+    runtime_monitor.cancel()
+
+
+async def backfill_entity_keys() -> None:
+    """Index suppliers stored before entity resolution, so saves can match them."""
+    try:
+        _, collection = get_supplier_db_and_collection()
+        updated = await asyncio.to_thread(backfill_entity_index, collection)
+        if updated:
+            logger.info(f"Added entity keys to {updated} stored suppliers")
+    except Exception as e:
+        logger.error(f"Entity index backfill failed: {str(e)}")
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Run-Id", "X-Profile-Id"],
 )
 
 
+def suppliers_response(suppliers: list[dict], run_id: Optional[str] = None) -> ORJSONResponse:
+    """
+    Encode supplier documents with orjson. Returning a response skips
+    FastAPI's re-validation against response_model, which only documents
+    the schema: the documents were validated where they entered the service.
+    The id of a continuable run goes in the X-Run-Id header.
+    """
+    headers = {"X-Run-Id": run_id} if run_id else None
+    return ORJSONResponse({"suppliers": suppliers}, headers=headers)
+
+
+def cancelled_response() -> ORJSONResponse:
+    # 499 (client closed request); nobody is left to read it
+    return ORJSONResponse({"detail": "Client disconnected"}, status_code=499)
+
+
+def request_deadline(request: Request, deadline_seconds: Optional[float] = None) -> Optional[float]:
+    """
+    The time.monotonic() deadline of a request: REQUEST_DEADLINE_SECONDS
+    from now, shortened by the X-Request-Timeout header or the request's
+    deadline_seconds. None when no budget applies.
+    """
+    budgets = [REQUEST_DEADLINE_SECONDS, deadline_seconds]
+    header = request.headers.get(REQUEST_DEADLINE_HEADER)
+    if header:
+        try:
+            budgets.append(float(header))
+        except ValueError:
+            logger.warning(f"Ignoring unparseable {REQUEST_DEADLINE_HEADER} header: {header}")
+    budgets = [budget for budget in budgets if budget and budget > 0]
+    return time.monotonic() + min(budgets) if budgets else None
+
+
+@asynccontextmanager
+async def cancel_on_disconnect(request: Request, context: RequestContext):
+    """
+    Cancel the request's work when the client disconnects before the
+    response is ready: the graph run stops at its next step, in-flight
+    OpenAI/Tavily calls are aborted and queued ones never start.
+    """
+    context.loop = asyncio.get_running_loop()
+
+    async def watch() -> None:
+        while not await request.is_disconnected():
+            await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+        logger.warning(f"Client disconnected, cancelling request {context.request_id}")
+        metrics.increment("cancellation.requests")
+        context.cancel()
+
+    watcher = asyncio.create_task(watch())
+    try:
+        yield
+    finally:
+        watcher.cancel()
+
+
+def is_admin(request: Request) -> bool:
+    token = request.headers.get(ADMIN_TOKEN_HEADER)
+    return bool(ADMIN_TOKEN and token) and hmac.compare_digest(
+        token.encode(), ADMIN_TOKEN.encode()
+    )
+
+
+def require_admin(request: Request) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled")
+    if not is_admin(request):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+def profile_requested(request: Request) -> bool:
+    """
+    Whether to profile a request: asked for with the X-Profile header by a
+    caller holding the admin token, or sampled at PROFILE_SAMPLE_RATE.
+    """
+    if request.headers.get(PROFILE_HEADER, "").lower() in ("1", "true"):
+        if is_admin(request):
+            return True
+        logger.warning(f"Ignoring {PROFILE_HEADER} header without a valid admin token")
+    return random.random() < PROFILE_SAMPLE_RATE
+
+
+@asynccontextmanager
+async def profile_request(request: Request, context: RequestContext):
+    """
+    Profile the request if profile_requested(): CPU samples of its threads
+    and allocations, stored once it is answered (src/profiling.py).
+    """
+    if not profile_requested(request):
+        yield
+        return
+    context.profiler = profiling.RequestProfiler(context.request_id)
+    context.profiler.start()
+    try:
+        yield
+    finally:
+        await asyncio.to_thread(profiling.save_profile, context.profiler, context.query or "")
+
+
 @app.get("/")
 async def root():
     logger.info("Health check endpoint accessed")
-    return {"message": "Hello World"}
+    return {
+        "message": "Hello World",
+        # Upstream circuit breaker states; recommendations degrade to
+        # DB-only answers while the Tavily circuit is open
+        "circuits": {
+            "openai": get_openai_governor().breaker.stats()["state"],
+            "tavily": get_tavily_governor().breaker.stats()["state"],
+        },
+        "db_only": db_only_mode(),
+    }
+
+
+@app.get("/api/v1/metrics")
+async def get_metrics():
+    return metrics.snapshot()
 
 
 @app.post(
     "/api/v1/supply-chain/recommendations",
     response_model=SupplierExplorationAgentResponse,
+    response_class=ORJSONResponse,
 )
-async def get_recommendations(requirements: AgentConfig):
+async def get_recommendations(requirements: AgentConfig, request: Request):
     logger.info("=== NEW RECOMMENDATION REQUEST ===")
     logger.info(
         f"Received recommendation request for query: {requirements.query[:100]}..."
@@ -38,21 +226,109 @@ async def get_recommendations(requirements: AgentConfig):
     logger.debug(
         f"Chat history length: {len(requirements.chat_history) if requirements.chat_history else 0}"
     )
+    request_context = start_request_context(
+        query=requirements.query,
+        deadline=request_deadline(request, requirements.deadline_seconds),
+    )
+    async with cancel_on_disconnect(request, request_context), profile_request(
+        request, request_context
+    ):
+        response = await recommend(requirements, request_context)
+    if request_context.profiler is not None and request_context.profiler.saved:
+        response.headers["X-Profile-Id"] = request_context.request_id
+    return response
+
+
+async def recommend(requirements: AgentConfig, request_context: RequestContext) -> ORJSONResponse:
+    chat_history = requirements.chat_history
+    if requirements.session_id:
+        try:
+            chat_history = await asyncio.to_thread(
+                sessions.begin_turn,
+                requirements.session_id,
+                requirements.query,
+                requirements.chat_history,
+            )
+        except Exception as e:
+            logger.error(f"Loading session {requirements.session_id} failed: {str(e)}")
+
+    async def reply(suppliers: list[dict], run: Optional[dict] = None) -> ORJSONResponse:
+        if requirements.session_id:
+            await asyncio.to_thread(sessions.record_reply, requirements.session_id, suppliers)
+        run_id = None
+        if run is not None and await asyncio.to_thread(
+            continuation.save_run,
+            request_context.request_id,
+            requirements.query,
+            requirements.mode,
+            chat_history,
+            suppliers,
+            run,
+        ):
+            run_id = request_context.request_id
+        return suppliers_response(suppliers, run_id)
 
     # Build input payload with proper message structure and state tracking
     input_payload = {
         "query": requirements.query,
-        "chat_history": requirements.chat_history,
+        "chat_history": chat_history,
         "messages": [HumanMessage(content=requirements.query)],
     }
+
+    if DB_FIRST_ENABLED and not chat_history:
+        # Follow-up turns depend on the conversation, so only fresh queries
+        # can be answered from stored suppliers
+        try:
+            retrieval = await asyncio.to_thread(
+                profiling.in_scope(request_context.profiler, retrieve_suppliers),
+                requirements.query,
+            )
+            served = len(retrieval.qualifying) >= AGENT_MAX_SUPPLIERS
+            # Stale matches count too: refreshing them lets later requests be
+            # served from the database
+            await asyncio.to_thread(
+                record_returned_suppliers,
+                retrieval.qualifying_ids[:AGENT_MAX_SUPPLIERS]
+                if served
+                else [c["document"]["_id"] for c in retrieval.candidates[:RETRIEVAL_SEED_LIMIT]],
+            )
+            if served:
+                logger.info(
+                    f"Serving {AGENT_MAX_SUPPLIERS} suppliers from MongoDB, skipping the agent"
+                )
+                logger.info("=== REQUEST COMPLETED FROM DATABASE ===")
+                # The rest of the stored matches are retrieved again on continuation
+                return await reply(retrieval.qualifying[:AGENT_MAX_SUPPLIERS], run={})
+            if retrieval.candidates and requirements.mode == "agent":
+                input_payload["messages"].extend(seed_messages(retrieval))
+                logger.info(
+                    f"Seeded agent with {len(retrieval.candidates)} stored candidates"
+                )
+        except DeadlineExceeded:
+            logger.warning("=== REQUEST RAN OUT OF TIME IN DB-FIRST RETRIEVAL ===")
+            return await reply([])
+        except Exception as e:
+            logger.error(f"DB-first retrieval failed, running the agent: {str(e)}")
+
+    if PREFETCH_ENABLED:
+        # Started once the request is known to need upstream lookups, so
+        # answers served from MongoDB never spend Tavily quota. The fast
+        # pipeline reads MongoDB itself, only its web search is prefetched.
+        start_prefetch(
+            request_context, requirements.query, include_mongodb=requirements.mode == "agent"
+        )
+
     logger.info("Built input payload for agent")
     logger.debug(f"Payload keys: {list(input_payload.keys())}")
     logger.debug(f"Messages count: {len(input_payload['messages'])}")
 
     try:
-        logger.info("--- CREATING SUPPLY CHAIN AGENT ---")
+        logger.info(f"--- CREATING SUPPLY CHAIN AGENT ({requirements.mode} mode) ---")
         # Create and invoke the supply chain agent with chat history
-        agent = supply_chain_agent(chat_history=requirements.chat_history)
+        if requirements.mode == "fast":
+            agent = fast_pipeline()
+        else:
+            agent = supply_chain_agent(chat_history=chat_history)
         logger.info("Supply chain agent created successfully")
 
         # Configure agent with recursion limit
@@ -67,53 +343,54 @@ async def get_recommendations(requirements: AgentConfig):
 
         # Create runnable config for additional control
         config = RunnableConfig(recursion_limit=AGENT_RECURSION_LIMIT)
-        raw_output = await asyncio.to_thread(agent.invoke, input_payload, config=config)
+        recorder = None
+        callbacks = []
+        if REPLAY_RECORD_DIR:
+            recorder = ReplayRecorder(requirements.query, chat_history)
+            callbacks.append(recorder)
+        if request_context.profiler is not None:
+            callbacks.append(request_context.profiler.callbacks)
+        if callbacks:
+            config["callbacks"] = callbacks
+        try:
+            raw_output = await asyncio.to_thread(run_graph, agent, input_payload, config)
+        finally:
+            finish_prefetch(request_context)
         logger.info("Agent invocation completed")
+        if recorder is not None:
+            recorder.save(REPLAY_RECORD_DIR, request_context.request_id)
+        logger.info(f"LLM phases: {request_context.phase_summary()}")
         logger.debug(
             f"Raw output keys: {list(raw_output.keys()) if isinstance(raw_output, dict) else 'Not a dict'}"
         )
         logger.debug(f"Raw output type: {type(raw_output)}")
 
         logger.info("--- PROCESSING AGENT RESPONSE ---")
-        # Check if we have a structured response
-        if isinstance(raw_output, dict) and "structured_response" in raw_output:
-            logger.debug("Found structured_response in raw output")
-            structured_response = raw_output["structured_response"]
-            if (
-                hasattr(structured_response, "suppliers")
-                and structured_response.suppliers
-            ):
-                logger.info(
-                    f"Found response with {len(structured_response.suppliers)} suppliers"
-                )
-                logger.debug("Saving suppliers to MongoDB...")
-                # Save suppliers to MongoDB after getting response
-                save_result = save_suppliers_to_mongodb(structured_response.suppliers)
-                logger.info(f"MongoDB save result: {save_result}")
-                logger.info("=== REQUEST COMPLETED SUCCESSFULLY ===")
-                return structured_response
-            elif (
-                isinstance(structured_response, dict)
-                and "suppliers" in structured_response
-            ):
-                supplier_count = len(structured_response.get("suppliers", []))
-                logger.info(f"Found dict response with {supplier_count} suppliers")
-                logger.debug("Saving suppliers to MongoDB...")
-                # Save suppliers to MongoDB after getting response
-                save_result = save_suppliers_to_mongodb(
-                    structured_response["suppliers"]
-                )
-                logger.info(f"MongoDB save result: {save_result}")
-                logger.info("=== REQUEST COMPLETED SUCCESSFULLY ===")
-                return SupplierExplorationAgentResponse(
-                    suppliers=structured_response["suppliers"]
-                )
+        suppliers = extract_suppliers(raw_output)
+        if suppliers:
+            logger.debug("Saving suppliers to MongoDB...")
+            # Save suppliers to MongoDB after getting response
+            save_result = await asyncio.to_thread(
+                save_suppliers_to_mongodb, researched_suppliers(raw_output)
+            )
+            logger.info(f"MongoDB save result: {save_result}")
+            logger.info("=== REQUEST COMPLETED SUCCESSFULLY ===")
+            return await reply(suppliers, run=continuation.run_state(raw_output))
 
         # Return empty response if no results found
         logger.warning("No supplier results found in agent response")
         logger.debug(f"Raw output structure: {raw_output}")
         logger.warning("=== REQUEST COMPLETED WITH NO RESULTS ===")
-        return SupplierExplorationAgentResponse(suppliers=[])
+        return await reply([])
+
+    except DeadlineExceeded:
+        # Raised outside the graph run, which answers with what it found so far
+        logger.warning("=== REQUEST RAN OUT OF TIME ===")
+        return await reply([])
+
+    except RunCancelled:
+        logger.warning("=== REQUEST CANCELLED (client disconnected) ===")
+        return cancelled_response()
 
     except Exception as e:
         logger.error(
@@ -121,4 +398,135 @@ async def get_recommendations(requirements: AgentConfig):
         )
         logger.error("Error type: {}", type(e).__name__)
         logger.error("=== REQUEST FAILED ===")
-        return SupplierExplorationAgentResponse(suppliers=[])
+        return await reply([])
+
+
+@app.post("/api/v1/supply-chain/jobs", response_model=JobRecord, status_code=202)
+async def submit_recommendation_job(requirements: AgentConfig):
+    logger.info("=== NEW RECOMMENDATION JOB ===")
+    return await asyncio.to_thread(jobs.submit_job, requirements)
+
+
+@app.get("/api/v1/supply-chain/jobs", response_model=JobListResponse)
+async def list_recommendation_jobs(status: Optional[str] = None, limit: int = 50):
+    job_list = await asyncio.to_thread(jobs.list_jobs, status, min(limit, 200))
+    return JobListResponse(jobs=job_list)
+
+
+@app.get("/api/v1/supply-chain/jobs/{job_id}", response_model=JobRecord)
+async def get_recommendation_job(job_id: str):
+    job = await asyncio.to_thread(jobs.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+@app.post("/api/v1/supply-chain/jobs/{job_id}/cancel", response_model=JobRecord)
+async def cancel_recommendation_job(job_id: str):
+    job = await asyncio.to_thread(jobs.cancel_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+@app.get(
+    "/api/v1/supply-chain/jobs/{job_id}/result",
+    response_model=SupplierExplorationAgentResponse,
+    response_class=ORJSONResponse,
+)
+async def get_recommendation_job_result(job_id: str):
+    job = await asyncio.to_thread(jobs.get_job_result, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job["status"] != "succeeded":
+        raise HTTPException(
+            status_code=409, detail=f"Job {job_id} is {job['status']}, no result yet"
+        )
+    return suppliers_response(jobs.job_result_suppliers(job), job_id)
+
+
+@app.get("/api/v1/supply-chain/sessions/{session_id}", response_model=SessionRecord)
+async def get_conversation_session(session_id: str, request: Request):
+    """
+    A stored conversation. Session ids are built from user and chat ids and
+    are easy to guess, and this service does not know who its callers are,
+    so only holders of the admin token can read them.
+    """
+    require_admin(request)
+    session = await asyncio.to_thread(sessions.get_session, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return sessions.to_record(session)
+
+
+@app.post(
+    "/api/v1/supply-chain/runs/{run_id}/continue",
+    response_model=SupplierExplorationAgentResponse,
+    response_class=ORJSONResponse,
+)
+async def continue_recommendations(run_id: str, request: Request):
+    """
+    The next page of suppliers for a finished run (the X-Run-Id of its
+    response), excluding every supplier the run returned so far.
+    """
+    logger.info(f"=== CONTINUING RUN {run_id} ===")
+    request_context = start_request_context(deadline=request_deadline(request))
+    try:
+        async with cancel_on_disconnect(request, request_context):
+            result = await asyncio.to_thread(continuation.continue_run, run_id)
+    except DeadlineExceeded:
+        logger.warning(f"=== CONTINUATION OF RUN {run_id} RAN OUT OF TIME ===")
+        return suppliers_response([], run_id)
+    except RunCancelled:
+        logger.warning(f"=== CONTINUATION OF RUN {run_id} CANCELLED (client disconnected) ===")
+        return cancelled_response()
+    except Exception as e:
+        logger.error(f"Continuing run {run_id} failed: {str(e)}", exc_info=True)
+        return suppliers_response([], run_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Run {run_id} not found or expired")
+    suppliers, researched = result
+    if researched:
+        save_result = await asyncio.to_thread(save_suppliers_to_mongodb, researched)
+        logger.info(f"MongoDB save result: {save_result}")
+    logger.info(f"=== RUN {run_id} CONTINUED WITH {len(suppliers)} SUPPLIERS ===")
+    return suppliers_response(suppliers, run_id)
+
+
+@app.get("/api/v1/admin/profiles", response_model=ProfileListResponse)
+async def list_request_profiles(request: Request, limit: int = 20):
+    require_admin(request)
+    profiles = await asyncio.to_thread(profiling.list_profiles, min(max(limit, 1), 200))
+    return ProfileListResponse(profiles=profiles)
+
+
+@app.get("/api/v1/admin/profiles/{profile_id}", response_model=ProfileRecord)
+async def get_request_profile(profile_id: str, request: Request):
+    require_admin(request)
+    profile = await asyncio.to_thread(profiling.get_profile, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profiling.to_record(profile)
+
+
+@app.get("/api/v1/admin/profiles/{profile_id}/{kind}.{fmt}")
+async def get_request_flamegraph(
+    profile_id: str,
+    kind: Literal["cpu", "allocations"],
+    fmt: Literal["collapsed", "svg"],
+    request: Request,
+):
+    """
+    A profile's CPU or allocation stacks, collapsed (for flamegraph.pl or
+    speedscope) or as an SVG flame graph.
+    """
+    require_admin(request)
+    profile = await asyncio.to_thread(profiling.get_profile, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    collapsed = profile.get(kind) or ""
+    if fmt == "collapsed":
+        return PlainTextResponse(collapsed)
+    title = f"{'CPU' if kind == 'cpu' else 'Allocations'}: {profile.get('query', '')[:80]}"
+    svg = await asyncio.to_thread(profiling.render_flamegraph, collapsed, title, kind)
+    return Response(svg, media_type="image/svg+xml")
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import resource
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from loguru import logger
+
+_lock = threading.Lock()
+_counters: dict[str, float] = defaultdict(float)
+_sources: dict[str, Callable[[], dict]] = {}
+
+
+def increment(name: str, value: float = 1) -> None:
+    """
+    Increment a process-wide counter.
+    """
+    with _lock:
+        _counters[name] += value
+
+
+def register_source(name: str, source: Callable[[], dict]) -> None:
+    """
+    Register a callable whose state is included in every metrics snapshot.
+    """
+    _sources[name] = source
+
+
+def snapshot() -> dict:
+    with _lock:
+        # Counters and sources are per worker process
+        result = {"pid": os.getpid(), "counters": dict(_counters)}
+    for name, source in list(_sources.items()):
+        try:
+            result[name] = source()
+        except Exception as e:
+            logger.error(f"Metrics source {name} failed: {str(e)}")
+            result[name] = {"error": str(e)}
+    return result
+
+
+class InstrumentedThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    Thread pool that counts queued and running work items, so saturation of
+    the pool behind asyncio.to_thread shows up in the metrics snapshot.
+    """
+
+    def __init__(self, max_workers: int, **kwargs):
+        super().__init__(max_workers=max_workers, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.peak_active = 0
+        self.peak_queued = 0
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._stats_lock:
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+
+        def run():
+            with self._stats_lock:
+                self.queued -= 1
+                self.active += 1
+                self.peak_active = max(self.peak_active, self.active)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._stats_lock:
+                    self.active -= 1
+
+        return super().submit(run)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "max_workers": self._max_workers,
+                "active": self.active,
+                "queued": self.queued,
+                "peak_active": self.peak_active,
+                "peak_queued": self.peak_queued,
+            }
+
+
+def rss_mb() -> float:
+    """
+    Current resident set size of this process in MiB (peak RSS where
+    /proc is not available).
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS reports bytes
+        return max_rss / (1024 * 1024) if max_rss > 1 << 32 else max_rss / 1024
+
+
+async def _monitor_event_loop(interval: float, lag_samples: deque) -> None:
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag_samples.append(max(0.0, time.perf_counter() - start - interval))
+
+
+def start_runtime_monitor(thread_pool_size: int, interval: float) -> asyncio.Task:
+    """
+    Install an instrumented default executor on the running loop and start
+    sampling event-loop lag (how late a sleep wakes up). Adds a "runtime"
+    source with lag over the last ~10s, thread pool usage and RSS.
+    """
+    loop = asyncio.get_running_loop()
+    executor = InstrumentedThreadPoolExecutor(
+        max_workers=thread_pool_size, thread_name_prefix="to_thread"
+    )
+    loop.set_default_executor(executor)
+
+    lag_samples: deque = deque(maxlen=max(1, int(10 / interval)))
+
+    def runtime_stats() -> dict:
+        samples = sorted(lag_samples)
+        return {
+            "event_loop_lag_ms": (samples[-1] if samples else 0.0) * 1000,
+            "event_loop_lag_p50_ms": (samples[len(samples) // 2] if samples else 0.0) * 1000,
+            "thread_pool": executor.stats(),
+            "rss_mb": rss_mb(),
+        }
+
+    register_source("runtime", runtime_stats)
+    logger.info(f"Runtime monitor started with a {thread_pool_size}-thread default executor")
+    return asyncio.create_task(
+        _monitor_event_loop(interval, lag_samples), name="runtime-monitor"
+    )
@@ -1,4 +1,5 @@
-from typing import List, Union, Optional
+from typing import List, Union, Optional, Literal
+from datetime import datetime
 from pydantic import BaseModel, Field, field_validator
 from typing import Dict, Any, TypedDict
 from langchain_core.messages import BaseMessage
@@ -41,6 +42,26 @@ class Supplier(BaseModel):
         return v
 
 
+SUPPLIER_FIELDS = tuple(Supplier.model_fields)
+CONTACT_FIELDS = tuple(Contact.model_fields)
+
+
+def supplier_document(supplier: Union[Supplier, dict]) -> dict:
+    """
+    The plain form of a supplier shared by tools, ranking, persistence and
+    responses: exactly the Supplier fields, built without validation (models
+    are validated where they enter the service). Bookkeeping fields and the
+    _id of stored documents are left out.
+    """
+    if isinstance(supplier, BaseModel):
+        return supplier.model_dump()
+    document = {field: supplier.get(field) for field in SUPPLIER_FIELDS}
+    contact = document["contact"]
+    if isinstance(contact, dict):
+        document["contact"] = {field: contact.get(field) for field in CONTACT_FIELDS}
+    return document
+
+
 class GraphState(TypedDict):
     query: str
     chat_history: Optional[list[Dict[str, Any]]]
@@ -62,6 +83,15 @@ class SupplierSearchIndexQuery(BaseModel):
     lead_time: Optional[str] = Field(default=None, description="Lead time for delivery")
     # Add a general query field for free-text search
     query: Optional[str] = Field(default=None, description="General search query")
+    # Numeric limits on the parsed price range and lead time; applied after the
+    # MongoDB filter, since both fields are stored as free text
+    max_price: Optional[float] = Field(
+        default=None,
+        description="Highest acceptable unit price (midpoint of the supplier's price range)",
+    )
+    max_lead_time_days: Optional[float] = Field(
+        default=None, description="Longest acceptable lead time, in days"
+    )
 
     def build_filter(self) -> dict[str, Union[str, List[str]]]:
         logger.debug("Building MongoDB filter from search query")
@@ -99,6 +129,30 @@ class AgentConfig(BaseModel):
         default=None,
         description="Optional chat history to provide context for the search.",
     )
+    session_id: Optional[str] = Field(
+        default=None,
+        min_length=1,
+        max_length=128,
+        pattern=r"^[A-Za-z0-9_.:-]+$",
+        description=(
+            "Conversation session id (e.g. the client's chat id). The service keeps the "
+            "session's history, so requests carry only the new message; chat_history is "
+            "only used to seed a new session."
+        ),
+    )
+    mode: Literal["agent", "fast"] = Field(
+        default="agent",
+        description="'agent' runs the open-ended ReAct agent; 'fast' runs the fixed-step pipeline with one LLM evaluation per pass.",
+    )
+    deadline_seconds: Optional[float] = Field(
+        default=None,
+        gt=0,
+        description=(
+            "Time budget of the request in seconds; it can only shorten the service's own "
+            "deadline. Near the deadline the run answers with the best suppliers found so far. "
+            "Background jobs run without a deadline."
+        ),
+    )
 
     @field_validator("query")
     def validate_query(cls, v):
@@ -143,8 +197,9 @@ class WebExtractQuery(BaseModel):
 
 
 class SupplierDataValidationQuery(BaseModel):
-    supplier_data: dict = Field(
-        description="Dictionary containing supplier information to validate for completeness and accuracy."
+    suppliers: List[dict] = Field(
+        description="All candidate suppliers to validate for completeness and duplicates, in one call.",
+        min_length=1,
     )
 
 
@@ -172,3 +227,58 @@ class SupplyChainAgentState(BaseModel):
     search_completed: bool = Field(
         default=False, description="Whether the entire search process is completed"
     )
+
+
+class JobRecord(BaseModel):
+    job_id: str = Field(description="Unique identifier of the background job")
+    status: Literal["queued", "running", "succeeded", "failed", "cancelled"] = Field(
+        description="Current lifecycle status of the job"
+    )
+    query: str = Field(description="The query the job is searching suppliers for")
+    attempts: int = Field(
+        default=0, description="Number of times a worker has picked up this job"
+    )
+    supplier_count: int = Field(
+        default=0, description="Number of suppliers in the job result"
+    )
+    error: Optional[str] = Field(default=None, description="Error of a failed job")
+    created_at: datetime = Field(description="When the job was submitted")
+    updated_at: datetime = Field(description="When the job was last updated")
+
+
+class JobListResponse(BaseModel):
+    jobs: List[JobRecord] = Field(description="Jobs ordered by newest first")
+
+
+class SessionRecord(BaseModel):
+    session_id: str = Field(description="Conversation session id")
+    message_count: int = Field(description="Messages in the conversation so far")
+    summary: Optional[str] = Field(
+        default=None, description="Rolling summary of the messages before the recent ones"
+    )
+    recent_messages: List[dict] = Field(
+        description="Messages not yet folded into the summary, oldest first"
+    )
+    suppliers: List[dict] = Field(
+        default_factory=list, description="Suppliers of the last reply"
+    )
+    updated_at: datetime = Field(description="When the session was last used")
+
+
+class ProfileRecord(BaseModel):
+    profile_id: str = Field(description="Id of the profiled request")
+    query: str = Field(description="Query of the profiled request")
+    created_at: datetime = Field(description="When the request was answered")
+    duration_seconds: float = Field(description="Wall time the request was profiled")
+    samples: int = Field(description="Stack samples taken while a thread used CPU")
+    cpu_seconds: float = Field(description="CPU time sampled across the request's threads")
+    allocated_mb: float = Field(
+        description="Memory allocated during the request and still held at its end"
+    )
+    top_allocations: List[dict] = Field(
+        default_factory=list, description="Source lines holding the most of that memory"
+    )
+
+
+class ProfileListResponse(BaseModel):
+    profiles: List[ProfileRecord] = Field(description="Profiles ordered by newest first")
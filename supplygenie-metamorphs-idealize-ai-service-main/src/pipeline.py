@@ -0,0 +1,223 @@
+"""
+Fixed-step "fast" recommendation pipeline, revived from the StateGraph in
+archive/init.py. Lookups run without LLM deliberation:
+
+    parse -> (query_db || web_search -> web_extract) -> evaluate -> finish
+                     ^                                      |
+                     +------------- adjust <----------------+
+
+Each pass makes exactly one LLM call (evaluate), and at most
+FAST_PIPELINE_MAX_RETRIES relaxed passes follow, so a run costs at most
+1 + FAST_PIPELINE_MAX_RETRIES LLM calls.
+"""
+
+import json
+import time
+from typing import Optional
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.state import CompiledStateGraph
+from typing_extensions import TypedDict
+
+from . import metrics
+from .config import (
+    AGENT_MAX_SUPPLIERS,
+    FAST_PIPELINE_EXTRACT_URLS,
+    FAST_PIPELINE_MAX_RETRIES,
+    FAST_PIPELINE_PAGE_CHARS,
+    FAST_PIPELINE_RELAXED_RELEVANCE,
+    MODEL_ROUTES,
+    RETRIEVAL_MIN_RELEVANCE,
+    RETRIEVAL_SEED_LIMIT,
+)
+from .context import get_request_context
+from .models import SupplierExplorationAgentResponse, SupplierSearchIndexQuery, supplier_document
+from .prompts import get_fast_evaluation_prompt
+from .ranking import LOCATION_TERMS, rank_suppliers
+from .retrieval import parse_supplier_query, ranking_criteria, retrieve_suppliers
+from .routing import record_phase
+from .tools import web_extract, web_search
+from .utils import get_chat_model, get_logger
+from .validation import validate_suppliers
+
+logger = get_logger()
+
+
+class FastPipelineState(TypedDict, total=False):
+    query: str
+    chat_history: Optional[list[dict]]
+    search_query: dict  # SupplierSearchIndexQuery fields
+    web_query: str
+    min_relevance: float
+    stored_suppliers: list[dict]
+    search_results: list[dict]
+    pages: list[dict]
+    suppliers: list[dict]
+    evaluation_feedback: str
+    retry_count: int
+    structured_response: list[dict]
+
+
+def _compact(value) -> str:
+    return json.dumps(value, default=str, separators=(",", ":"))
+
+
+def parse_requirements(state: FastPipelineState) -> dict:
+    search_query = parse_supplier_query(state["query"])
+    logger.info(f"Fast pipeline parsed requirements: {search_query.model_dump(exclude_none=True)}")
+    return {
+        "search_query": search_query.model_dump(),
+        "web_query": state["query"],
+        "min_relevance": RETRIEVAL_MIN_RELEVANCE,
+        "suppliers": [],
+        "retry_count": 0,
+    }
+
+
+def query_db(state: FastPipelineState) -> dict:
+    retrieval = retrieve_suppliers(
+        state["query"],
+        search_query=SupplierSearchIndexQuery(**state["search_query"]),
+        min_relevance=state["min_relevance"],
+    )
+    stored = []
+    for candidate in retrieval.candidates[:RETRIEVAL_SEED_LIMIT]:
+        document = dict(candidate["document"])
+        document.pop("_id", None)
+        document.pop("last_verified_at", None)
+        stored.append(document)
+    return {"stored_suppliers": stored}
+
+
+def search_web(state: FastPipelineState) -> dict:
+    response = web_search.invoke({"query": state["web_query"]})
+    results = [
+        {"title": r.get("title"), "url": r.get("url"), "content": r.get("content")}
+        for r in response.get("results", [])
+    ]
+    return {"search_results": results}
+
+
+def extract_pages(state: FastPipelineState) -> dict:
+    urls = [r["url"] for r in state.get("search_results", []) if r.get("url")]
+    if not urls:
+        return {"pages": []}
+    response = web_extract.invoke({"urls": urls[:FAST_PIPELINE_EXTRACT_URLS]})
+    pages = [
+        {"url": r.get("url"), "content": (r.get("raw_content") or "")[:FAST_PIPELINE_PAGE_CHARS]}
+        for r in response.get("results", [])
+    ]
+    return {"pages": pages}
+
+
+def evaluate(state: FastPipelineState) -> dict:
+    """
+    The single LLM call of a pass: pick and complete suppliers from the
+    gathered data, then drop duplicates and keep the best ranked locally.
+    """
+    model_name, max_tokens = MODEL_ROUTES["evaluation"]
+    structured = get_chat_model(model_name, max_tokens).with_structured_output(
+        SupplierExplorationAgentResponse, include_raw=True
+    )
+    prompt = get_fast_evaluation_prompt(
+        state["query"],
+        chat_history=state.get("chat_history"),
+        stored_suppliers=_compact(state.get("stored_suppliers", [])),
+        search_results=_compact(state.get("search_results", [])),
+        pages=_compact(state.get("pages", [])),
+        previous_suppliers=_compact(state.get("suppliers", [])),
+    )
+
+    start = time.perf_counter()
+    output = structured.invoke([HumanMessage(content=prompt)])
+    record_phase("evaluation", model_name, time.perf_counter() - start, output.get("raw"))
+    if output.get("parsing_error"):
+        logger.error(f"Fast pipeline evaluation was not parseable: {output['parsing_error']}")
+        return {"evaluation_feedback": "not good enough"}
+
+    suppliers = [supplier_document(supplier) for supplier in output["parsed"].suppliers]
+    validation = validate_suppliers(suppliers)
+    suppliers = [
+        supplier
+        for supplier, result in zip(suppliers, validation["results"])
+        if result["duplicate_of"] is None
+    ]
+    ranked = rank_suppliers(suppliers, ranking_criteria(state["query"]), limit=AGENT_MAX_SUPPLIERS)
+    suppliers = [suppliers[index] for index in ranked]
+    # Never lose suppliers a previous pass already found
+    if len(suppliers) < len(state.get("suppliers", [])):
+        suppliers = state["suppliers"]
+
+    feedback = "good" if len(suppliers) >= AGENT_MAX_SUPPLIERS else "not good enough"
+    logger.info(
+        f"Fast pipeline evaluation pass {state.get('retry_count', 0) + 1}: "
+        f"{len(suppliers)} suppliers ({feedback})"
+    )
+    return {"suppliers": suppliers, "evaluation_feedback": feedback}
+
+
+def adjust_requirements(state: FastPipelineState) -> dict:
+    """
+    Relax the search for another pass: certifications and region or country
+    words stop being hard requirements and stored suppliers need a weaker match.
+    """
+    search_query = dict(state["search_query"])
+    keywords = [
+        word
+        for word in (search_query.get("query") or "").split()
+        if word not in LOCATION_TERMS
+    ]
+    search_query["certifications"] = None
+    search_query["query"] = " ".join(keywords) or search_query.get("query")
+    web_query = f"{' '.join(keywords)} manufacturers suppliers directory"
+    logger.info(f"Fast pipeline relaxing requirements, retrying with web query '{web_query}'")
+    return {
+        "search_query": search_query,
+        "web_query": web_query,
+        "min_relevance": FAST_PIPELINE_RELAXED_RELEVANCE,
+        "retry_count": state.get("retry_count", 0) + 1,
+    }
+
+
+def finish(state: FastPipelineState) -> dict:
+    return {"structured_response": state.get("suppliers", [])}
+
+
+def after_evaluate(state: FastPipelineState) -> str:
+    if state["evaluation_feedback"] == "good":
+        return "finish"
+    if state.get("retry_count", 0) >= FAST_PIPELINE_MAX_RETRIES:
+        return "finish"
+    context = get_request_context()
+    if context is not None and context.finalize_due():
+        # Another pass would not fit in what is left of the deadline
+        logger.warning(f"Fast pipeline finishing early, {context.remaining():.1f}s left")
+        metrics.increment("deadline.forced_finalize")
+        return "finish"
+    return "adjust"
+
+
+def fast_pipeline(checkpointer: Optional[BaseCheckpointSaver] = None) -> CompiledStateGraph:
+    builder = StateGraph(FastPipelineState)
+    builder.add_node("parse", parse_requirements)
+    builder.add_node("query_db", query_db)
+    builder.add_node("web_search", search_web)
+    builder.add_node("web_extract", extract_pages)
+    builder.add_node("evaluate", evaluate)
+    builder.add_node("adjust", adjust_requirements)
+    builder.add_node("finish", finish)
+
+    builder.add_edge(START, "parse")
+    for source in ("parse", "adjust"):
+        # Database and web lookups run in parallel
+        builder.add_edge(source, "query_db")
+        builder.add_edge(source, "web_search")
+    builder.add_edge("web_search", "web_extract")
+    builder.add_edge(["query_db", "web_extract"], "evaluate")
+    builder.add_conditional_edges(
+        "evaluate", after_evaluate, {"finish": "finish", "adjust": "adjust"}
+    )
+    builder.add_edge("finish", END)
+    return builder.compile(checkpointer=checkpointer)
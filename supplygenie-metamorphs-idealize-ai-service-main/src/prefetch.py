@@ -0,0 +1,118 @@
+"""
+Speculative prefetch of tool results. While the model writes its plan (or
+the fast pipeline parses requirements), likely web searches and a MongoDB
+lookup already run, and land in the request's tool cache so the matching
+tool calls return immediately. Prefetches are bounded per request and a
+summary of used and unused ones is reported when the request finishes.
+"""
+
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+
+from . import metrics
+from .config import PREFETCH_MAX_SEARCHES, PREFETCH_MAX_WORKERS
+from .context import RequestContext, tool_cache_key
+from .models import SupplierSearchIndexQuery
+from .ratelimit import db_only_mode
+from .retrieval import parse_supplier_query
+from .tools import run_mongodb_query, run_web_search
+from .utils import get_logger
+
+logger = get_logger()
+
+
+@lru_cache
+def get_prefetch_executor() -> ThreadPoolExecutor:
+    # Separate from the default executor so speculative work never delays
+    # agent runs waiting for a thread
+    return ThreadPoolExecutor(
+        max_workers=PREFETCH_MAX_WORKERS, thread_name_prefix="prefetch"
+    )
+
+
+def search_variants(query: str) -> list[str]:
+    """
+    The raw query plus variants derived from its parsed keywords and
+    certifications, without an LLM call.
+    """
+    parsed = parse_supplier_query(query)
+    keywords = parsed.query or ""
+    certifications = " ".join(parsed.certifications or [])
+    variants = [query]
+    if keywords:
+        variants.append(f"{keywords} {certifications} suppliers".replace("  ", " "))
+        variants.append(f"{keywords} manufacturers directory")
+    unique = {tool_cache_key("web_search", {"query": v}): v for v in reversed(variants)}
+    return list(reversed(unique.values()))[:PREFETCH_MAX_SEARCHES]
+
+
+def _run_prefetch(future: Future, context: contextvars.Context, fn) -> None:
+    # A prefetch cancelled (finish_prefetch) before it started does not run
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        future.set_result(context.run(fn))
+    except BaseException as e:
+        future.set_exception(e)
+
+
+def start_prefetch(context: RequestContext, query: str, include_mongodb: bool = True) -> int:
+    """
+    Start speculative lookups for `query` into `context`'s tool cache.
+    Returns the number of prefetches issued.
+    """
+    executor = get_prefetch_executor()
+    calls = []
+    if not db_only_mode():
+        # In DB-only mode web searches would only be rejected
+        calls = [
+            ("web_search", {"query": variant}, lambda v=variant: run_web_search(v))
+            for variant in search_variants(query)
+        ]
+    keywords = parse_supplier_query(query).query
+    if include_mongodb and keywords:
+        search_query = SupplierSearchIndexQuery(query=keywords)
+        calls.append(
+            ("query_mongodb", search_query.model_dump(), lambda: run_mongodb_query(search_query))
+        )
+
+    issued = 0
+    for name, args, fn in calls:
+        # Claim the key before starting anything, so a call the run (or a
+        # concurrent prefetch) already made is not paid for twice
+        future = Future()
+        if not context.add_prefetch(tool_cache_key(name, args), future):
+            continue
+        # Each prefetch runs in a copy of the request's context (the
+        # governors prioritise by it)
+        executor.submit(_run_prefetch, future, contextvars.copy_context(), fn)
+        issued += 1
+    metrics.increment("prefetch.issued", issued)
+    logger.info(f"Started {issued} speculative prefetches for request {context.request_id}")
+    return issued
+
+
+def finish_prefetch(context: RequestContext) -> dict:
+    """
+    Cancel prefetches that have not started yet and report how many were
+    used by the run.
+    """
+    unused = context.prefetched - context.prefetch_hits
+    # Failed lookups are dropped from the cache
+    pending = [context.tool_cache.get(key) for key in unused]
+    cancelled = sum(1 for future in pending if future is not None and future.cancel())
+    summary = {
+        "issued": len(context.prefetched),
+        "hits": len(context.prefetch_hits),
+        "unused": len(unused),
+        "cancelled": cancelled,
+    }
+    metrics.increment("prefetch.hits", summary["hits"])
+    metrics.increment("prefetch.unused", summary["unused"])
+    if context.prefetched:
+        logger.info(
+            f"Prefetch for request {context.request_id}: {summary['hits']}/{summary['issued']} "
+            f"used, {summary['unused']} unused ({cancelled} cancelled before running)"
+        )
+    return summary
@@ -0,0 +1,446 @@
+"""
+Per-request profiling of recommendation requests: a statistical CPU profile
+and tracemalloc allocation snapshots, stored for the admin endpoints.
+
+A profiled request gets a sampler thread that records, every
+PROFILE_SAMPLE_INTERVAL seconds, the stacks of the threads working for it.
+Each stack is weighted by the CPU time its thread used since the previous
+sample, so waiting on OpenAI, Tavily or MongoDB costs nothing and the
+profile shows where CPU goes (validation, graph bookkeeping, logging, JSON).
+A thread works for the request while it runs one of the request's graph
+steps, tool calls or LLM calls (tracked by a callback handler on the run)
+or a function wrapped with in_scope(). The event loop thread, which parses
+upstream responses and encodes replies for all requests, is sampled under
+its own "[event loop]" root. CPU used by a thread that is found waiting
+(e.g. the event loop in select) is reported as "[between samples]".
+
+Allocations are the memory still held at the end of the request that was
+allocated since its start, by allocating stack, from tracemalloc snapshots.
+tracemalloc traces the whole process while any request is being profiled,
+so concurrent requests show up in them and run slower meanwhile.
+
+Profiles are kept in the `profiles` collection in collapsed-stack format
+(a "frame;frame;frame weight" line per stack, as read by flamegraph.pl and
+speedscope) and rendered to SVG flame graphs when fetched.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from functools import lru_cache
+from html import escape
+from typing import Any, Callable, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from pymongo import ASCENDING, DESCENDING
+from pymongo.collection import Collection
+
+from . import metrics
+from .config import (
+    PROFILE_MAX_DEPTH,
+    PROFILE_MAX_STACKS,
+    PROFILE_SAMPLE_INTERVAL,
+    PROFILE_TOP_ALLOCATIONS,
+    PROFILE_TRACEMALLOC_FRAMES,
+    PROFILE_TTL_HOURS,
+)
+from .models import ProfileRecord
+from .utils import get_logger, get_supplier_db_and_collection
+
+logger = get_logger()
+
+EVENT_LOOP_FRAME = "[event loop]"
+# Where CPU used by a thread found waiting goes: it was used somewhere
+# between the samples, not in the wait
+IDLE_FRAME = "[between samples]"
+_WAIT_FILES = tuple(os.sep + name for name in ("selectors.py", "threading.py", "queue.py"))
+FLAMEGRAPH_WIDTH = 1200
+FLAMEGRAPH_FRAME_HEIGHT = 16
+FLAMEGRAPH_MIN_WIDTH = 0.5  # Pixels; narrower frames are left out
+
+_ALLOCATION_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+]
+
+_tracing_lock = threading.Lock()
+_tracing_profiles = 0  # Profiles in progress
+_tracing_started = False  # Whether they started tracemalloc (and stop it)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@lru_cache
+def get_profiles_collection() -> Collection:
+    db, _ = get_supplier_db_and_collection()
+    collection = db["profiles"]
+    collection.create_index(
+        [("created_at", ASCENDING)], expireAfterSeconds=PROFILE_TTL_HOURS * 3600
+    )
+    return collection
+
+
+@lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+    """A source path relative to the sys.path entry it was imported from."""
+    for prefix in _path_prefixes():
+        if filename.startswith(prefix + os.sep):
+            return filename[len(prefix) + 1 :]
+    return filename
+
+
+@lru_cache
+def _path_prefixes() -> list[str]:
+    paths = {os.path.abspath(path or os.curdir) for path in sys.path}
+    return sorted(paths, key=len, reverse=True)
+
+
+@lru_cache(maxsize=16384)
+def _frame_name(code) -> str:
+    return f"{code.co_qualname} ({_short_path(code.co_filename)})"
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None and len(names) < PROFILE_MAX_DEPTH:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _thread_cpu_time(ident: int) -> Optional[float]:
+    """CPU seconds used by a live thread; None where the OS cannot tell."""
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError):
+        return None
+
+
+def _start_tracing() -> None:
+    global _tracing_profiles, _tracing_started
+    with _tracing_lock:
+        if _tracing_profiles == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+            _tracing_started = True
+        _tracing_profiles += 1
+
+
+def _stop_tracing() -> None:
+    global _tracing_profiles, _tracing_started
+    with _tracing_lock:
+        _tracing_profiles -= 1
+        if _tracing_profiles == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+
+class _ThreadScope(BaseCallbackHandler):
+    """Marks the threads running a profiled graph run's steps as working for it."""
+
+    def __init__(self, profiler: "RequestProfiler"):
+        self.profiler = profiler
+
+    def on_chain_start(self, *args, **kwargs) -> None:
+        self.profiler.enter()
+
+    def on_chain_end(self, *args, **kwargs) -> None:
+        self.profiler.exit()
+
+    def on_chain_error(self, *args, **kwargs) -> None:
+        self.profiler.exit()
+
+    def on_tool_start(self, *args, **kwargs) -> None:
+        self.profiler.enter()
+
+    def on_tool_end(self, *args, **kwargs) -> None:
+        self.profiler.exit()
+
+    def on_tool_error(self, *args, **kwargs) -> None:
+        self.profiler.exit()
+
+    def on_chat_model_start(self, *args, **kwargs) -> None:
+        self.profiler.enter()
+
+    def on_llm_start(self, *args, **kwargs) -> None:
+        self.profiler.enter()
+
+    def on_llm_end(self, *args, **kwargs) -> None:
+        self.profiler.exit()
+
+    def on_llm_error(self, *args, **kwargs) -> None:
+        self.profiler.exit()
+
+
+class RequestProfiler:
+    """
+    Profile of one request. start() it on the event loop, add `callbacks`
+    to its graph run, stop() it once the request is answered.
+    """
+
+    def __init__(self, request_id: str, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.request_id = request_id
+        self.interval = interval
+        self.callbacks = _ThreadScope(self)
+        self.saved = False
+        self.samples = 0
+        # Collapsed stack -> CPU microseconds
+        self._stacks: Counter[str] = Counter()
+        # Threads working for the request -> nesting depth of their scopes
+        self._scopes: dict[int, int] = {}
+        # Thread -> CPU seconds it had used at its previous sample
+        self._cpu: dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._loop_thread: Optional[int] = None
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._started = 0.0
+
+    def start(self) -> None:
+        self._loop_thread = threading.get_ident()
+        self._cpu[self._loop_thread] = time.thread_time()
+        _start_tracing()
+        self._snapshot = tracemalloc.take_snapshot().filter_traces(_ALLOCATION_FILTERS)
+        self._started = time.monotonic()
+        self._sampler = threading.Thread(
+            target=self._run, name=f"profiler-{self.request_id[:8]}", daemon=True
+        )
+        self._sampler.start()
+        metrics.increment("profiling.requests")
+        logger.info(f"Profiling request {self.request_id}")
+
+    def enter(self) -> None:
+        """Count the calling thread's work towards the request until exit()."""
+        ident = threading.get_ident()
+        with self._lock:
+            depth = self._scopes.get(ident, 0)
+            if depth == 0 and ident != self._loop_thread:
+                self._cpu[ident] = time.thread_time()
+            self._scopes[ident] = depth + 1
+
+    def exit(self) -> None:
+        ident = threading.get_ident()
+        with self._lock:
+            depth = self._scopes.pop(ident, 0) - 1
+            if depth > 0:
+                self._scopes[ident] = depth
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def _sample(self) -> None:
+        frames = sys._current_frames()
+        # Under the lock, threads in scope are inside a step and still alive,
+        # so their CPU clocks can be read
+        with self._lock:
+            for ident in dict.fromkeys([self._loop_thread, *self._scopes]):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                cpu = _thread_cpu_time(ident)
+                if cpu is None:
+                    used = self.interval
+                else:
+                    used = cpu - self._cpu.get(ident, cpu)
+                    self._cpu[ident] = cpu
+                if used <= 0:
+                    continue
+                if frame.f_code.co_filename.endswith(_WAIT_FILES):
+                    stack = IDLE_FRAME
+                else:
+                    stack = _collapse(frame)
+                if ident == self._loop_thread:
+                    stack = f"{EVENT_LOOP_FRAME};{stack}"
+                self._stacks[stack] += round(used * 1e6)
+                self.samples += 1
+        del frames
+
+    def stop(self) -> dict:
+        """Stop sampling; the profile as stored in the profiles collection."""
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        duration = time.monotonic() - self._started
+        try:
+            allocations, top_allocations = self._allocations()
+        finally:
+            _stop_tracing()
+        return {
+            "duration_seconds": round(duration, 3),
+            "sample_interval": self.interval,
+            "samples": self.samples,
+            "cpu_seconds": round(sum(self._stacks.values()) / 1e6, 3),
+            "allocated_mb": round(sum(allocations.values()) / 2**20, 3),
+            "cpu": _collapsed(self._stacks),
+            "allocations": _collapsed(allocations),
+            "top_allocations": top_allocations,
+        }
+
+    def _allocations(self) -> tuple[Counter, list[dict]]:
+        """Memory allocated since start() and still held, by stack and by line."""
+        if self._snapshot is None or not tracemalloc.is_tracing():
+            return Counter(), []
+        snapshot = tracemalloc.take_snapshot().filter_traces(_ALLOCATION_FILTERS)
+        stacks = Counter()
+        for stat in snapshot.compare_to(self._snapshot, "traceback"):
+            if stat.size_diff > 0:
+                # Traceback frames go from the oldest to the most recent
+                stack = ";".join(f"{_short_path(f.filename)}:{f.lineno}" for f in stat.traceback)
+                stacks[stack] += stat.size_diff
+        top = [
+            {
+                "line": f"{_short_path(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                "size_kb": round(stat.size_diff / 1024, 1),
+                "count": stat.count_diff,
+            }
+            for stat in snapshot.compare_to(self._snapshot, "lineno")[:PROFILE_TOP_ALLOCATIONS]
+            if stat.size_diff > 0
+        ]
+        return stacks, top
+
+
+def _collapsed(stacks: Counter) -> str:
+    return "\n".join(
+        f"{stack} {weight}" for stack, weight in stacks.most_common(PROFILE_MAX_STACKS)
+    )
+
+
+def in_scope(profiler: Optional[RequestProfiler], fn: Callable[..., Any]) -> Callable[..., Any]:
+    """`fn`, counting the thread that runs it towards the profile (if any)."""
+    if profiler is None:
+        return fn
+
+    def scoped(*args, **kwargs):
+        profiler.enter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.exit()
+
+    return scoped
+
+
+def save_profile(profiler: RequestProfiler, query: str) -> bool:
+    """Stop a request's profiler and store its profile."""
+    try:
+        profile = profiler.stop()
+        get_profiles_collection().update_one(
+            {"_id": profiler.request_id},
+            {"$set": {"query": query[:200], "created_at": _utcnow(), **profile}},
+            upsert=True,
+        )
+        profiler.saved = True
+        logger.info(
+            f"Saved profile of request {profiler.request_id}: {profile['samples']} samples, "
+            f"{profile['cpu_seconds']:.2f}s CPU, {profile['allocated_mb']:.1f} MB held"
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Saving the profile of request {profiler.request_id} failed: {str(e)}")
+        return False
+
+
+def to_record(profile: dict) -> ProfileRecord:
+    return ProfileRecord(
+        profile_id=profile["_id"],
+        query=profile.get("query", ""),
+        created_at=profile["created_at"],
+        duration_seconds=profile.get("duration_seconds", 0.0),
+        samples=profile.get("samples", 0),
+        cpu_seconds=profile.get("cpu_seconds", 0.0),
+        allocated_mb=profile.get("allocated_mb", 0.0),
+        top_allocations=profile.get("top_allocations") or [],
+    )
+
+
+def list_profiles(limit: int = 20) -> list[ProfileRecord]:
+    cursor = (
+        get_profiles_collection()
+        .find({}, projection={"cpu": 0, "allocations": 0})
+        .sort("created_at", DESCENDING)
+        .limit(limit)
+    )
+    return [to_record(profile) for profile in cursor]
+
+
+def get_profile(profile_id: str) -> Optional[dict]:
+    return get_profiles_collection().find_one({"_id": profile_id})
+
+
+def _color(name: str) -> str:
+    # Warm palette as in flamegraph.pl, stable per frame name
+    h = zlib.crc32(name.encode())
+    return f"rgb({205 + h % 50},{(h >> 8) % 230},{(h >> 16) % 55})"
+
+
+def _format_weight(weight: int, kind: str) -> str:
+    if kind == "cpu":
+        return f"{weight / 1000:,.1f} ms CPU"
+    return f"{weight / 1024:,.1f} KB"
+
+
+def render_flamegraph(collapsed: str, title: str, kind: str) -> str:
+    """
+    An SVG flame graph (root at the top) of a collapsed-stack profile.
+    Hovering a frame shows its weight and share.
+    """
+    root: dict = {"value": 0, "children": {}}
+    for line in collapsed.splitlines():
+        stack, _, weight = line.rpartition(" ")
+        if not stack or not weight.isdigit():
+            continue
+        node = root
+        node["value"] += int(weight)
+        for name in stack.split(";"):
+            node = node["children"].setdefault(name, {"value": 0, "children": {}})
+            node["value"] += int(weight)
+
+    total = root["value"] or 1
+    scale = (FLAMEGRAPH_WIDTH - 20) / total
+    top = 40
+    frames, depth_reached = [], 0
+    pending = [(root, 10.0, 0)]
+    while pending:
+        node, x, depth = pending.pop()
+        for name, child in sorted(node["children"].items()):
+            width = child["value"] * scale
+            if width >= FLAMEGRAPH_MIN_WIDTH:
+                frames.append((name, x, depth, width, child["value"]))
+                depth_reached = max(depth_reached, depth + 1)
+                pending.append((child, x, depth + 1))
+            x += width
+
+    height = top + depth_reached * FLAMEGRAPH_FRAME_HEIGHT + 20
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{FLAMEGRAPH_WIDTH}" height="{height}" '
+        'font-family="Verdana, sans-serif" font-size="11">',
+        '<rect width="100%" height="100%" fill="#fdfdf6"/>',
+        f'<text x="{FLAMEGRAPH_WIDTH / 2}" y="20" font-size="15" text-anchor="middle">'
+        f"{escape(title)} ({escape(_format_weight(root['value'], kind))})</text>",
+    ]
+    for name, x, depth, width, value in frames:
+        y = top + depth * FLAMEGRAPH_FRAME_HEIGHT
+        label = name if width / 7 >= len(name) else name[: int(width / 7) - 2] + ".."
+        parts.append(
+            f"<g><title>{escape(name)} ({escape(_format_weight(value, kind))}, "
+            f"{100 * value / total:.2f}%)</title>"
+            f'<rect x="{x:.1f}" y="{y}" width="{width:.1f}" height="{FLAMEGRAPH_FRAME_HEIGHT - 1}" '
+            f'fill="{_color(name)}" rx="2"/>'
+            + (
+                f'<text x="{x + 3:.1f}" y="{y + FLAMEGRAPH_FRAME_HEIGHT - 4}">{escape(label)}</text>'
+                if width >= 21
+                else ""
+            )
+            + "</g>"
+        )
+    parts.append("</svg>")
+    return "\n".join(parts)
@@ -1,15 +1,22 @@
 from .config import AGENT_MAX_SUPPLIERS
 
 
+def _history_line(msg) -> str:
+    role = msg.get('role', 'unknown')
+    content = msg.get('content', '')
+    if role == "summary":
+        # Rolling summary of a session's older messages (src/sessions.py)
+        return f"- earlier conversation (summary): {content}\n"
+    return f"- {role}: {content}\n"
+
+
 def get_supply_chain_agent_prompt(chat_history=None) -> str:
     # Format chat history context
     chat_context = ""
     if chat_history and len(chat_history) > 0:
         chat_context = "CHAT HISTORY CONTEXT:\nPrevious conversation context:\n"
         for msg in chat_history:
-            role = msg.get('role', 'unknown')
-            content = msg.get('content', '')
-            chat_context += f"- {role}: {content}\n"
+            chat_context += _history_line(msg)
         chat_context += "\nBased on this conversation history:\n"
         chat_context += "- Use insights from past interactions to refine your supplier search and recommendations\n"
         chat_context += "- If the user has expressed preferences for specific regions, price ranges, or supplier characteristics, prioritize those\n"
@@ -98,10 +105,12 @@ DETAILED WORKFLOW:
    - Score each supplier on multiple criteria
    - Ensure diversity in supplier portfolio (size, location, specialization)
    - Verify no critical gaps in coverage
-   - Confirm all data is complete and validated
+   - Confirm all data is complete and validated: pass ALL candidates to a single validate_supplier_data call, never one supplier per call
+     (finalize_supplier_search repeats these checks and drops duplicates, so skip validation when the data is clearly complete)
    If not satisfied, continue researching with renewed focus areas.
 
 7. METICULOUS FINALIZATION: Call finalize_supplier_search with exactly {AGENT_MAX_SUPPLIERS} thoroughly vetted suppliers
+   - This call ends the search and its supplier list is returned to the user as-is, so make it once, as your last action
 
 QUALITY STANDARDS:
 - Prioritize suppliers with verifiable business credentials and strong reputations
@@ -140,3 +149,91 @@ DATA FORMATTING REQUIREMENTS:
 - Ensure all data is realistic and verifiable
 
 Remember: Quality and thoroughness over speed. It's better to find {AGENT_MAX_SUPPLIERS} excellent suppliers through meticulous, comprehensive research than to rush and provide mediocre options. Take the time needed to do thorough analysis - you have extended limits to work with more depth and detail. ALWAYS ensure price ranges are in USD and response times are quantified. Your goal is to provide strategic, well-researched supplier recommendations that will drive long-term business success."""
+
+
+def get_fast_evaluation_prompt(
+    query: str,
+    chat_history=None,
+    stored_suppliers=None,
+    search_results=None,
+    pages=None,
+    previous_suppliers=None,
+) -> str:
+    chat_context = ""
+    if chat_history:
+        chat_context = "CHAT HISTORY CONTEXT:\n"
+        for msg in chat_history:
+            chat_context += _history_line(msg)
+        chat_context += "\n"
+
+    return f"""You are an expert supply chain analyst. Select up to {AGENT_MAX_SUPPLIERS} suppliers for the request below using ONLY the research data provided. Do not ask for more data: this is a single evaluation pass.
+
+REQUEST: {query}
+
+{chat_context}SUPPLIERS ALREADY IN OUR DATABASE (complete records, prefer them when they fit):
+{stored_suppliers or "[]"}
+
+SUPPLIERS SELECTED IN A PREVIOUS PASS (keep the good ones):
+{previous_suppliers or "[]"}
+
+WEB SEARCH RESULTS:
+{search_results or "[]"}
+
+EXTRACTED WEBSITE CONTENT:
+{pages or "[]"}
+
+RULES:
+- Only include real companies that appear in the data above, never invent suppliers
+- Fill every field from the data; when a value is not stated, give your best realistic estimate consistent with the source
+- Price Range: always '$X-Y USD' (convert other currencies to USD)
+- Response Time: always specific units (e.g., '2-4 hours', '1-2 days')
+- No duplicates: one entry per company
+- Rank the best matches for the request first"""
+
+
+def get_supplier_refresh_prompt(stored_supplier: str, pages: str) -> str:
+    return f"""You are re-verifying a supplier record in our database against the company's own website. Return the record updated with what the pages state.
+
+STORED RECORD:
+{stored_supplier}
+
+CURRENT WEBSITE CONTENT:
+{pages}
+
+RULES:
+- Keep the company name as stored
+- Change a field only when the pages state a different value; otherwise keep the stored value
+- Price Range: always '$X-Y USD' (convert other currencies to USD)
+- Response Time: always specific units (e.g., '2-4 hours', '1-2 days')"""
+
+
+def get_session_summary_prompt(summary: str, messages: list[dict]) -> str:
+    conversation = "".join(_history_line(msg) for msg in messages)
+    return f"""Update the running summary of a supplier search conversation with the messages below.
+
+CURRENT SUMMARY:
+{summary or "(none yet)"}
+
+NEW MESSAGES:
+{conversation}
+RULES:
+- Keep every requirement the user stated (products, regions, certifications, price, lead time, quantities) and later changes to them
+- Keep suppliers the user asked about, liked or rejected, by company name
+- Drop greetings and anything already covered
+- At most 150 words, plain sentences, no preamble"""
+
+
+def get_continuation_request(query: str, needed: int, known_suppliers: list[str]) -> str:
+    known = "\n".join(f"- {name}" for name in known_suppliers) or "- (none)"
+    return f"""{query}
+
+This continues an earlier search for the request above. Find {needed} more suppliers that meet it.
+
+ALREADY KNOWN (recommended earlier or already shortlisted, do not include them again):
+{known}
+
+Pages the earlier search extracted are not available again; the web search results it did not open are listed below as leads. Finalize with the new suppliers only."""
+
+
+def get_db_only_note() -> str:
+    return f"""WEB SEARCH IS UNAVAILABLE RIGHT NOW: web_search and web_extract cannot be used for this step. Work only from suppliers in the database: use query_mongodb (try broader keywords if needed), then call finalize_supplier_search with the best suppliers found, up to {AGENT_MAX_SUPPLIERS}."""
@@ -0,0 +1,295 @@
+"""
+Local supplier ranking. Candidate records are turned into per-feature
+arrays once, then scored with vectorized NumPy operations, so choosing the
+final AGENT_MAX_SUPPLIERS out of many candidates costs no LLM tokens.
+"""
+
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+from bson import ObjectId
+
+from .config import RANKING_WEIGHTS, SUPPLIER_FRESHNESS_DAYS
+from .models import SupplierSearchIndexQuery
+from .validation import completeness_score, missing_supplier_fields
+
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+LEAD_TIME_PATTERN = re.compile(
+    r"(\d+(?:\.\d+)?)(?:\s*(?:-|–|to)\s*(\d+(?:\.\d+)?))?\s*(day|week|month)", re.IGNORECASE
+)
+LEAD_TIME_LIMIT_PATTERN = re.compile(
+    r"(?:under|within|less than|below|at most|max(?:imum)?|<=?)\s*(\d+(?:\.\d+)?)\s*(day|week|month)",
+    re.IGNORECASE,
+)
+UNIT_DAYS = {"day": 1, "week": 7, "month": 30}
+
+# Region words in queries never appear in stored locations ("Shenzhen, China")
+REGION_COUNTRIES = {
+    "asia": ["china", "india", "vietnam", "thailand", "malaysia", "indonesia", "taiwan", "korea", "japan", "philippines", "bangladesh", "pakistan", "sri lanka", "singapore"],
+    "europe": ["germany", "italy", "poland", "spain", "france", "netherlands", "czech", "portugal", "turkey", "united kingdom", "uk", "sweden", "austria"],
+    "america": ["usa", "united states", "canada", "mexico", "brazil", "argentina", "chile", "colombia"],
+    "africa": ["south africa", "egypt", "morocco", "kenya", "nigeria", "ethiopia"],
+    "middle": ["uae", "saudi", "israel", "qatar", "oman"],
+}
+# The only two-letter query words kept (others are too ambiguous to match)
+COUNTRY_CODES = {
+    "us": ["usa", "united states"],
+    "uk": ["united kingdom", "england"],
+    "eu": REGION_COUNTRIES["europe"],
+}
+# Query words naming a place, matched against the supplier's location
+LOCATION_TERMS = (
+    set(REGION_COUNTRIES)
+    | set(COUNTRY_CODES)
+    | {country for countries in REGION_COUNTRIES.values() for country in countries if " " not in country}
+)
+
+# Text searched for requirement keywords
+MATCH_FIELDS = ("company_name", "location", "specialties", "certifications")
+
+
+@dataclass
+class RankingCriteria:
+    keywords: list[str] = field(default_factory=list)
+    certifications: list[str] = field(default_factory=list)
+    max_lead_time_days: Optional[float] = None
+    # Keywords naming a region or country (LOCATION_TERMS)
+    locations: list[str] = field(default_factory=list)
+
+    @classmethod
+    def from_search_query(
+        cls, search_query: SupplierSearchIndexQuery, query: str = ""
+    ) -> "RankingCriteria":
+        """Criteria of parsed search fields plus the raw query's lead time limit."""
+        keywords = (search_query.query or "").split()
+        return cls(
+            keywords=keywords,
+            certifications=search_query.certifications or [],
+            max_lead_time_days=parse_lead_time_limit(query),
+            locations=[keyword for keyword in keywords if keyword in LOCATION_TERMS],
+        )
+
+
+def parse_price(text) -> float:
+    """
+    Midpoint of the numbers in a price range ("$3-5 USD" -> 4.0), NaN when
+    there are none. Units differ between suppliers, so prices are only
+    compared by rank.
+    """
+    numbers = [float(n) for n in NUMBER_PATTERN.findall(str(text or "").replace(",", ""))]
+    return sum(numbers[:2]) / len(numbers[:2]) if numbers else np.nan
+
+
+def parse_lead_time_days(text) -> float:
+    """Upper bound of a lead time in days ("2-3 weeks" -> 21.0), NaN if unknown."""
+    match = LEAD_TIME_PATTERN.search(str(text or ""))
+    if not match:
+        return np.nan
+    low, high, unit = match.groups()
+    return float(high or low) * UNIT_DAYS[unit.lower()]
+
+
+def parse_lead_time_limit(query: str) -> Optional[float]:
+    """A lead time requirement in the query ("lead time under 30 days"), in days."""
+    match = LEAD_TIME_LIMIT_PATTERN.search(query or "")
+    if not match:
+        return None
+    return float(match.group(1)) * UNIT_DAYS[match.group(2).lower()]
+
+
+def within_numeric_bounds(document: dict, search_query: SupplierSearchIndexQuery) -> bool:
+    """
+    Whether the supplier's parsed price and lead time are within the query's
+    limits. Suppliers whose value cannot be parsed are excluded by a limit.
+    """
+    if search_query.max_price is not None and not (
+        parse_price(document.get("price_range")) <= search_query.max_price
+    ):
+        return False
+    if search_query.max_lead_time_days is not None and not (
+        parse_lead_time_days(document.get("lead_time")) <= search_query.max_lead_time_days
+    ):
+        return False
+    return True
+
+
+def supplier_age_days(document: dict, now: datetime) -> Optional[float]:
+    """
+    Days since the supplier was last verified (or first stored, for
+    documents saved before verification timestamps existed). None for
+    suppliers stored as never verified (bulk ingested without a date).
+    """
+    verified_at = document.get("last_verified_at")
+    if "last_verified_at" not in document and isinstance(document.get("_id"), ObjectId):
+        verified_at = document["_id"].generation_time
+    if not isinstance(verified_at, datetime):
+        return None
+    if verified_at.tzinfo is None:
+        verified_at = verified_at.replace(tzinfo=timezone.utc)
+    return (now - verified_at).total_seconds() / 86400
+
+
+def _text(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v) for v in value)
+    return str(value or "")
+
+
+def _words(text: str) -> str:
+    """Lowercase words separated by single spaces, with a space at both ends."""
+    return f" {' '.join(re.findall(r'[a-z0-9]+', text.lower()))} "
+
+
+def _contains(texts: np.ndarray, term: str) -> np.ndarray:
+    """
+    Whether each of the _words() texts holds `term` as whole words, or
+    with a plural "s" ("casting" matches "castings"; "us" does not match
+    "industrial").
+    """
+    words = _words(term).strip()
+    if not words:
+        return np.zeros(len(texts), dtype=bool)
+    return (np.char.find(texts, f" {words} ") >= 0) | (np.char.find(texts, f" {words}s ") >= 0)
+
+
+def _places(term: str) -> list[str]:
+    """A location term with the countries it stands for."""
+    return [term, *REGION_COUNTRIES.get(term, []), *COUNTRY_CODES.get(term, [])]
+
+
+def _rank_score(values: np.ndarray) -> np.ndarray:
+    """
+    1.0 for the lowest known value down to 0.0 for the highest (ties share
+    a rank); unknown (NaN) values score 0.
+    """
+    scores = np.zeros(len(values))
+    known = ~np.isnan(values)
+    if known.sum() == 1:
+        scores[known] = 1.0
+    elif known.any():
+        ordered = np.unique(values[known])
+        ranks = np.searchsorted(ordered, values[known])
+        scores[known] = 1 - ranks / max(len(ordered) - 1, 1)
+    return scores
+
+
+def supplier_features(
+    suppliers: list[dict], criteria: RankingCriteria, now: Optional[datetime] = None
+) -> dict[str, np.ndarray]:
+    """
+    Per-candidate feature arrays, each in [0, 1] except the raw parsed
+    values (age_days, price_value, lead_time_days). location_match and
+    within_lead_time are 0/1 checks of the query's hard requirements and
+    take no part in the weighted score.
+    """
+    now = now or datetime.now(timezone.utc)
+    count = len(suppliers)
+    texts = np.array(
+        [_words(" ".join(_text(s.get(key)) for key in MATCH_FIELDS)) for s in suppliers],
+        dtype=str,
+    )
+    places = np.array([_words(_text(s.get("location"))) for s in suppliers], dtype=str)
+    held = np.array([_words(_text(s.get("certifications"))) for s in suppliers], dtype=str)
+    # Unknown ages (None) become NaN
+    ages = np.array([supplier_age_days(s, now) for s in suppliers], dtype=float)
+    prices = np.array([parse_price(s.get("price_range")) for s in suppliers], dtype=float)
+    lead_times = np.array(
+        [parse_lead_time_days(s.get("lead_time")) for s in suppliers], dtype=float
+    )
+    ratings = np.array(
+        [s.get("rating") if isinstance(s.get("rating"), (int, float)) else 0 for s in suppliers],
+        dtype=float,
+    )
+    completeness = np.array(
+        [completeness_score(missing_supplier_fields(s)) / 100 for s in suppliers], dtype=float
+    )
+
+    relevance = np.zeros(count)
+    if count and criteria.keywords:
+        for keyword in criteria.keywords:
+            matched = np.zeros(count, dtype=bool)
+            for term in _places(keyword):
+                matched |= _contains(texts, term)
+            relevance += matched
+        relevance /= len(criteria.keywords)
+
+    certifications = np.ones(count)
+    if count and criteria.certifications:
+        certifications = sum(
+            _contains(held, certification).astype(float)
+            for certification in criteria.certifications
+        ) / len(criteria.certifications)
+
+    # Requirements a direct answer from stored suppliers must meet exactly
+    location_match = np.ones(count, dtype=bool)
+    if count and criteria.locations:
+        location_match = np.zeros(count, dtype=bool)
+        for location in criteria.locations:
+            for term in _places(location):
+                location_match |= _contains(places, term)
+    within_lead_time = np.ones(count, dtype=bool)
+    if criteria.max_lead_time_days:
+        # Unknown lead times (NaN) cannot be shown to be within the limit
+        within_lead_time = lead_times <= criteria.max_lead_time_days
+
+    if criteria.max_lead_time_days:
+        # Full score within the limit, falling off with how far it is exceeded
+        lead_time = np.where(
+            np.isnan(lead_times),
+            0.0,
+            np.clip(criteria.max_lead_time_days / np.fmax(lead_times, 1e-9), 0.0, 1.0),
+        )
+    else:
+        lead_time = _rank_score(lead_times)
+
+    return {
+        "relevance": relevance,
+        "certifications": np.asarray(certifications, dtype=float),
+        "completeness": completeness,
+        "rating": np.clip(ratings, 0.0, 5.0) / 5,
+        "price": _rank_score(prices),
+        "lead_time": lead_time,
+        "freshness": np.nan_to_num(np.clip(1 - ages / SUPPLIER_FRESHNESS_DAYS, 0.0, 1.0)),
+        "location_match": location_match.astype(float),
+        "within_lead_time": within_lead_time.astype(float),
+        "age_days": ages,
+        "price_value": prices,
+        "lead_time_days": lead_times,
+    }
+
+
+def score_suppliers(
+    features: dict[str, np.ndarray], weights: Optional[dict[str, float]] = None
+) -> np.ndarray:
+    """Weighted average of the feature arrays named in `weights`."""
+    weights = weights or RANKING_WEIGHTS
+    names = [name for name, weight in weights.items() if weight]
+    if not names:
+        raise ValueError("At least one ranking weight must be non-zero")
+    matrix = np.vstack([features[name] for name in names])
+    vector = np.array([weights[name] for name in names], dtype=float)
+    return vector @ matrix / vector.sum()
+
+
+def top_indices(scores: np.ndarray, limit: int) -> np.ndarray:
+    """Indices of the `limit` best scores, best first (stable for ties)."""
+    if limit >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    candidates = np.argpartition(-scores, limit - 1)[:limit]
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+def rank_suppliers(
+    suppliers: list[dict],
+    criteria: RankingCriteria,
+    limit: Optional[int] = None,
+    weights: Optional[dict[str, float]] = None,
+) -> list[int]:
+    """Indices of `suppliers`, best first, at most `limit` of them."""
+    if not suppliers:
+        return []
+    scores = score_suppliers(supplier_features(suppliers, criteria), weights)
+    return top_indices(scores, limit or len(suppliers)).tolist()
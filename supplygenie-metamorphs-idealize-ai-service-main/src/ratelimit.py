@@ -0,0 +1,527 @@
+import asyncio
+import heapq
+import itertools
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+import openai
+from langchain_openai import ChatOpenAI
+from loguru import logger
+
+from . import metrics
+from .breaker import CircuitBreaker, CircuitOpenError
+from .config import (
+    BREAKER_SLOW_CALL_SECONDS,
+    MAX_RETRIES,
+    OPENAI_EXPECTED_OUTPUT_TOKENS,
+    OPENAI_MAX_CONCURRENCY,
+    OPENAI_REQUESTS_PER_MINUTE,
+    OPENAI_TOKENS_PER_MINUTE,
+    RATE_LIMIT_BASE_DELAY,
+    RATE_LIMIT_MAX_DELAY,
+    SERVER_WORKERS,
+    TAVILY_MAX_CONCURRENCY,
+    TAVILY_REQUESTS_PER_MINUTE,
+)
+from .context import DeadlineExceeded, RunCancelled, get_request_context, time_budget
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RateLimitedError(Exception):
+    """
+    Raised for upstream responses that signal throttling without raising,
+    e.g. langchain_tavily returns {"error": ...} instead of an HTTP error.
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class UpstreamFailure(Exception):
+    """
+    Raised for upstream failures reported in the response instead of raised
+    (langchain_tavily returns 5xx and connection errors as {"error": ...}),
+    so the circuit breaker sees them.
+    """
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute` tokens per minute.
+    Not thread-safe on its own; callers hold the governor lock.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.tokens -= amount
+
+    def give_back(self, amount: float) -> None:
+        # A negative amount charges tokens used beyond the reservation
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class UpstreamGovernor:
+    """
+    Shared throttle for one upstream API: a requests-per-minute bucket, an
+    optional tokens-per-minute bucket and a concurrency limit. Waiters are
+    served by priority (requests that already made more upstream calls are
+    closer to finishing), then in arrival order. A throttling response from
+    the upstream pauses every caller until its Retry-After has passed, and
+    an outage opens the circuit breaker, which rejects calls outright.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: int,
+        max_concurrency: int,
+        tokens_per_minute: Optional[int] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        expected_output_tokens: float = 0,
+    ):
+        self.name = name
+        self.breaker = breaker
+        self.max_concurrency = max_concurrency
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._cond = threading.Condition()
+        self._waiters: list[tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._cooldown_until = 0.0
+        self._calls = 0
+        self._throttled = 0
+        self._retries = 0
+        self._wait_seconds = 0.0
+        self._output_tokens = float(expected_output_tokens)
+
+    def _wait_time(self, now: float, tokens: float) -> Optional[float]:
+        """
+        Seconds until a call reserving `tokens` may start, or None when it
+        has to wait for a concurrency slot to be released.
+        """
+        if self._in_flight >= self.max_concurrency:
+            return None
+        self.request_bucket.refill(now)
+        wait = max(self._cooldown_until - now, self.request_bucket.wait_time(1))
+        if self.token_bucket is not None:
+            self.token_bucket.refill(now)
+            wait = max(wait, self.token_bucket.wait_time(tokens))
+        return max(wait, 0.0)
+
+    def acquire(self, tokens: float = 0, priority: int = 0) -> float:
+        """
+        Block until a call may start and reserve its slot. Returns the number
+        of seconds spent waiting.
+        """
+        if self.token_bucket is not None:
+            tokens = min(tokens, self.token_bucket.capacity)
+        context = get_request_context()
+        entry = (-priority, next(self._sequence))
+        start = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    if context is not None:
+                        # Waiters of a cancelled or overdue request give up their place
+                        context.check_cancelled()
+                        context.check_deadline()
+                    wait = None
+                    if self._waiters[0] == entry:
+                        wait = self._wait_time(time.monotonic(), tokens)
+                        if wait == 0:
+                            break
+                    self._cond.wait(timeout=min(wait, 1.0) if wait else 1.0)
+            except BaseException:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+                raise
+
+            heapq.heappop(self._waiters)
+            self.request_bucket.take(1)
+            if self.token_bucket is not None:
+                self.token_bucket.take(tokens)
+            self._in_flight += 1
+            self._calls += 1
+            waited = time.monotonic() - start
+            self._wait_seconds += waited
+            self._cond.notify_all()
+        return waited
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def expected_output_tokens(self, max_tokens: Optional[int] = None) -> float:
+        """
+        Completion tokens to reserve for a call: the recent average output,
+        never more than the call's max_tokens.
+        """
+        with self._cond:
+            expected = self._output_tokens
+        return min(expected, max_tokens) if max_tokens else expected
+
+    def settle_tokens(
+        self, reserved: float, used: float, output: Optional[float] = None
+    ) -> None:
+        """
+        Reconcile a token reservation with the usage the upstream reported;
+        calls that used more than they reserved are charged the difference.
+        """
+        if self.token_bucket is None:
+            return
+        with self._cond:
+            self.token_bucket.give_back(reserved - used)
+            if output is not None:
+                # Moving average, so the reservation follows what calls produce
+                self._output_tokens += 0.2 * (output - self._output_tokens)
+            self._cond.notify_all()
+
+    def penalize(self, retry_after: float) -> None:
+        """
+        Pause all callers after the upstream signalled throttling.
+        """
+        with self._cond:
+            self._throttled += 1
+            self._cooldown_until = max(
+                self._cooldown_until, time.monotonic() + retry_after
+            )
+
+    def _current_priority(self) -> int:
+        context = get_request_context()
+        return context.upstream_calls if context else 0
+
+    def _backoff(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        Returns the jittered delay before retrying, or None if the error is
+        not retryable or retries are exhausted.
+        """
+        retry_after = retry_after_seconds(error)
+        if retry_after is None or attempt >= MAX_RETRIES:
+            return None
+        if retry_after > 0:
+            self.penalize(retry_after)
+        with self._cond:
+            self._retries += 1
+        # Full jitter keeps retrying callers from synchronizing into bursts
+        delay = random.uniform(0, min(RATE_LIMIT_MAX_DELAY, RATE_LIMIT_BASE_DELAY * 2**attempt))
+        logger.warning(
+            f"{self.name} call failed ({type(error).__name__}), retry {attempt + 1}/{MAX_RETRIES} "
+            f"in {delay:.2f}s (retry-after {retry_after:.2f}s)"
+        )
+        return delay
+
+    def _record_success(self) -> None:
+        context = get_request_context()
+        if context is not None:
+            context.upstream_calls += 1
+
+    def call(
+        self,
+        fn: Callable[[], T],
+        tokens: float = 0,
+        afn: Optional[Callable[[], Awaitable[T]]] = None,
+    ) -> T:
+        """
+        Run `fn` when the limits allow, retrying throttled calls. Pass its
+        async variant `afn` to make the call abortable when the request is
+        cancelled (see RequestContext.run_abortable).
+        """
+        context = get_request_context()
+        priority = self._current_priority()
+        for attempt in range(MAX_RETRIES + 1):
+            probe = self._admit()
+            try:
+                self.acquire(tokens, priority)
+            except RunCancelled as e:
+                self._settle(None, 0.0, probe)
+                metrics.increment(f"{_stop_reason(e)}.{self.name}_calls_skipped")
+                raise
+            failed, start = None, time.monotonic()
+            try:
+                if context is None:
+                    result = fn()
+                else:
+                    try:
+                        context.check_cancelled()
+                        context.check_deadline()
+                    except RunCancelled as e:
+                        metrics.increment(f"{_stop_reason(e)}.{self.name}_calls_skipped")
+                        raise
+                    try:
+                        result = context.run_abortable(fn, afn)
+                    except RunCancelled as e:
+                        metrics.increment(f"{_stop_reason(e)}.{self.name}_calls_aborted")
+                        raise
+                failed = False
+                self._record_success()
+                return result
+            except Exception as e:
+                failed = is_upstream_failure(e)
+                delay = self._backoff(e, attempt)
+                if delay is None:
+                    raise
+                remaining = context.remaining() if context is not None else None
+                if remaining is not None and delay >= remaining:
+                    # The retry would start after the deadline
+                    metrics.increment(f"deadline.{self.name}_calls_skipped")
+                    raise DeadlineExceeded(
+                        f"Request {context.request_id} ran out of time retrying {self.name}"
+                    ) from e
+            finally:
+                self.release()
+                self._settle(failed, time.monotonic() - start, probe)
+            # Retried calls move ahead of fresh ones
+            priority += 1
+            if context is None:
+                time.sleep(delay)
+            elif context.cancelled.wait(delay):
+                metrics.increment(f"cancellation.{self.name}_calls_skipped")
+                context.check_cancelled()
+
+    async def acall(self, fn: Callable[[], Awaitable[T]], tokens: float = 0) -> T:
+        priority = self._current_priority()
+        for attempt in range(MAX_RETRIES + 1):
+            probe = self._admit()
+            try:
+                await asyncio.to_thread(self.acquire, tokens, priority)
+            except BaseException:
+                self._settle(None, 0.0, probe)
+                raise
+            failed, start = None, time.monotonic()
+            try:
+                result = await fn()
+                failed = False
+                self._record_success()
+                return result
+            except Exception as e:
+                failed = is_upstream_failure(e)
+                delay = self._backoff(e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.release()
+                self._settle(failed, time.monotonic() - start, probe)
+            priority += 1
+            await asyncio.sleep(delay)
+
+    def _admit(self) -> bool:
+        """Ask the circuit breaker for a call; True if it is the half-open probe."""
+        if self.breaker is None:
+            return False
+        try:
+            return self.breaker.admit()
+        except CircuitOpenError:
+            metrics.increment(f"breaker.{self.name}_calls_rejected")
+            raise
+
+    def _settle(self, failed: Optional[bool], seconds: float, probe: bool) -> None:
+        if self.breaker is not None:
+            self.breaker.record(failed, seconds, probe)
+
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            self.request_bucket.refill(now)
+            stats = {
+                "in_flight": self._in_flight,
+                "max_concurrency": self.max_concurrency,
+                "waiting": len(self._waiters),
+                "cooldown_remaining": round(max(self._cooldown_until - now, 0.0), 3),
+                "request_tokens_available": round(self.request_bucket.tokens, 1),
+                "calls": self._calls,
+                "throttled": self._throttled,
+                "retries": self._retries,
+                "wait_seconds_total": round(self._wait_seconds, 3),
+            }
+            if self.token_bucket is not None:
+                self.token_bucket.refill(now)
+                stats["llm_tokens_available"] = round(self.token_bucket.tokens, 1)
+                stats["expected_output_tokens"] = round(self._output_tokens, 1)
+        if self.breaker is not None:
+            stats["circuit"] = self.breaker.stats()
+        return stats
+
+
+def _stop_reason(error: RunCancelled) -> str:
+    return "deadline" if isinstance(error, DeadlineExceeded) else "cancellation"
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """
+    Whether an error says the upstream is failing (server errors, connection
+    errors and timeouts), as opposed to throttling or a bad request.
+    """
+    if isinstance(error, (UpstreamFailure, openai.APIConnectionError)):
+        return True
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    return status is not None and status >= 500
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Returns how long the upstream asked us to wait (0.0 if it did not say),
+    or None if the error should not be retried.
+    """
+    if isinstance(error, RateLimitedError):
+        return error.retry_after or 0.0
+    if isinstance(error, openai.APIConnectionError):
+        return 0.0
+
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status not in RETRYABLE_STATUS_CODES:
+        return None
+
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            value = headers["retry-after"]
+            try:
+                return float(value)
+            except ValueError:
+                return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        logger.debug(f"Unparseable Retry-After header: {headers.get('retry-after')}")
+    return 0.0
+
+
+def check_tavily_response(response: Any) -> Any:
+    """
+    langchain_tavily swallows HTTP errors into {"error": ...}; surface
+    throttling so the governor can back off and retry, and outages (server
+    and connection errors) so the circuit breaker counts them. Other client
+    errors stay in the response.
+    """
+    if isinstance(response, dict) and "error" in response:
+        message = str(response["error"])
+        if "Error 429" in message:
+            raise RateLimitedError(message)
+        status = re.match(r"Error (\d{3})", message)
+        if status is None or int(status.group(1)) >= 500:
+            raise UpstreamFailure(message)
+    return response
+
+
+def worker_share(limit: int) -> int:
+    """This process's share of an account-wide limit, split between the workers."""
+    return max(limit // SERVER_WORKERS, 1)
+
+
+def estimate_tokens(messages: list) -> int:
+    # Roughly 4 characters per token, plus per-message overhead
+    return sum(len(str(message.content)) // 4 + 4 for message in messages)
+
+
+@lru_cache
+def get_openai_governor() -> UpstreamGovernor:
+    governor = UpstreamGovernor(
+        "openai",
+        requests_per_minute=worker_share(OPENAI_REQUESTS_PER_MINUTE),
+        max_concurrency=worker_share(OPENAI_MAX_CONCURRENCY),
+        tokens_per_minute=worker_share(OPENAI_TOKENS_PER_MINUTE),
+        breaker=CircuitBreaker("openai", BREAKER_SLOW_CALL_SECONDS["openai"]),
+        expected_output_tokens=OPENAI_EXPECTED_OUTPUT_TOKENS,
+    )
+    metrics.register_source("openai_governor", governor.stats)
+    return governor
+
+
+@lru_cache
+def get_tavily_governor() -> UpstreamGovernor:
+    governor = UpstreamGovernor(
+        "tavily",
+        requests_per_minute=worker_share(TAVILY_REQUESTS_PER_MINUTE),
+        max_concurrency=worker_share(TAVILY_MAX_CONCURRENCY),
+        breaker=CircuitBreaker("tavily", BREAKER_SLOW_CALL_SECONDS["tavily"]),
+    )
+    metrics.register_source("tavily_governor", governor.stats)
+    return governor
+
+
+def db_only_mode() -> bool:
+    """Whether runs have to work from MongoDB alone (the Tavily circuit is open)."""
+    return get_tavily_governor().breaker.is_open()
+
+
+def _usage(result) -> tuple[Optional[int], Optional[int]]:
+    """Total and completion tokens the upstream reported for a call, if any."""
+    message = getattr(result.generations[0], "message", None) if result.generations else None
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        return usage.get("total_tokens"), usage.get("output_tokens")
+    usage = (result.llm_output or {}).get("token_usage") or {}
+    return usage.get("total_tokens"), usage.get("completion_tokens")
+
+
+class GovernedChatOpenAI(ChatOpenAI):
+    """
+    ChatOpenAI whose requests go through the shared OpenAI governor. Construct
+    it with max_retries=0 so the governor's backoff is the only retry layer.
+    """
+
+    def _budgeted(self, kwargs: dict) -> dict:
+        """
+        Request options with the timeout shrunk to what is left of the
+        request's deadline, computed when the call actually starts.
+        """
+        timeout = time_budget(self.request_timeout)
+        return kwargs if timeout == self.request_timeout else {**kwargs, "timeout": timeout}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        governor = get_openai_governor()
+        reserved = estimate_tokens(messages) + governor.expected_output_tokens(self.max_tokens)
+        generate = super()._generate
+        agenerate = super()._agenerate
+        result = governor.call(
+            lambda: generate(messages, stop=stop, run_manager=run_manager, **self._budgeted(kwargs)),
+            tokens=reserved,
+            # No streaming, so the sync run manager has nothing to report
+            afn=lambda: agenerate(messages, stop=stop, **self._budgeted(kwargs)),
+        )
+        total, output = _usage(result)
+        governor.settle_tokens(reserved, total or reserved, output)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        governor = get_openai_governor()
+        reserved = estimate_tokens(messages) + governor.expected_output_tokens(self.max_tokens)
+        agenerate = super()._agenerate
+        result = await governor.acall(
+            lambda: agenerate(
+                messages, stop=stop, run_manager=run_manager, **self._budgeted(kwargs)
+            ),
+            tokens=reserved,
+        )
+        total, output = _usage(result)
+        governor.settle_tokens(reserved, total or reserved, output)
+        return result
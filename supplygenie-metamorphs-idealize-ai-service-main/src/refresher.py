@@ -0,0 +1,250 @@
+"""
+Background freshness refresher. Stored suppliers that requests keep
+returning are re-verified against their own website before they go stale:
+the website and contact pages are re-extracted and the record is updated in
+place by one structured LLM call on the tool_selection (cheap) route.
+
+Passes run every REFRESH_INTERVAL seconds during REFRESH_OFF_PEAK_HOURS and
+spend at most REFRESH_CALLS_PER_HOUR Tavily/OpenAI calls. Suppliers are
+claimed atomically, so several instances can run the refresher at once.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from langchain_core.messages import HumanMessage
+from pymongo import DESCENDING, ReturnDocument
+from pymongo.collection import Collection
+
+from . import metrics, tools
+from .config import (
+    ENTITY_INDEX_FIELD,
+    MODEL_ROUTES,
+    REFRESH_AFTER_DAYS,
+    REFRESH_BATCH_SIZE,
+    REFRESH_CALLS_PER_HOUR,
+    REFRESH_ENABLED,
+    REFRESH_INTERVAL,
+    REFRESH_MIN_RETURNS,
+    REFRESH_OFF_PEAK_HOURS,
+    REFRESH_PAGE_CHARS,
+    REFRESH_RETRY_AFTER,
+    SUPPLIER_INTERNAL_FIELDS,
+    SUPPLIER_UPDATED_FIELD,
+)
+from .entities import supplier_profile
+from .models import Supplier
+from .prompts import get_supplier_refresh_prompt
+from .ratelimit import (
+    check_tavily_response,
+    get_openai_governor,
+    get_tavily_governor,
+    worker_share,
+)
+from .routing import record_phase
+from .utils import get_chat_model, get_logger, get_supplier_db_and_collection
+from .validation import is_missing
+
+logger = get_logger()
+
+
+class CallBudget:
+    """Calls allowed per hour, refilled continuously; never blocks."""
+
+    def __init__(self, per_hour: int):
+        self.capacity = float(per_hour)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_spend(self, calls: int) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.capacity / 3600
+            )
+            self.updated = now
+            if self.tokens < calls:
+                return False
+            self.tokens -= calls
+            return True
+
+
+_budget = CallBudget(worker_share(REFRESH_CALLS_PER_HOUR))
+
+
+def parse_hours(spec: str) -> Optional[set[int]]:
+    """UTC hours of a "START-END" window (END exclusive, may wrap midnight); None means always."""
+    if not spec.strip():
+        return None
+    start, _, end = spec.partition("-")
+    start, end = int(start), int(end or int(start) + 1)
+    return {hour % 24 for hour in range(start, end if end > start else end + 24)}
+
+
+def is_off_peak(now: datetime) -> bool:
+    hours = parse_hours(REFRESH_OFF_PEAK_HOURS)
+    return hours is None or now.hour in hours
+
+
+def record_returned_suppliers(ids: list) -> None:
+    """Count that stored suppliers were returned, so popular ones get refreshed."""
+    if not ids:
+        return
+    _, collection = get_supplier_db_and_collection()
+    collection.update_many(
+        {"_id": {"$in": ids}},
+        {"$inc": {"times_returned": 1}, "$set": {"last_returned_at": datetime.now(timezone.utc)}},
+    )
+
+
+def claim_stale_supplier(collection: Collection, now: datetime) -> Optional[dict]:
+    """
+    Claim the most returned supplier not verified within REFRESH_AFTER_DAYS.
+    The claim lasts REFRESH_RETRY_AFTER, so failed refreshes back off.
+    """
+    cutoff = now - timedelta(days=REFRESH_AFTER_DAYS)
+    return collection.find_one_and_update(
+        {
+            "times_returned": {"$gte": REFRESH_MIN_RETURNS},
+            "$and": [
+                # None matches both never verified and unstamped suppliers
+                {"$or": [{"last_verified_at": {"$lt": cutoff}}, {"last_verified_at": None}]},
+                {"$or": [{"refresh_claimed_until": {"$lt": now}}, {"refresh_claimed_until": {"$exists": False}}]},
+            ],
+        },
+        {"$set": {"refresh_claimed_until": now + timedelta(seconds=REFRESH_RETRY_AFTER)}},
+        sort=[("times_returned", DESCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def refresh_urls(supplier: dict) -> list[str]:
+    contact = supplier.get("contact") if isinstance(supplier.get("contact"), dict) else {}
+    website = str(contact.get("website") or "").strip()
+    if is_missing(website) or "." not in website:
+        return []
+    if "//" not in website:
+        website = f"https://{website}"
+    return [website, f"{website.rstrip('/')}/contact"]
+
+
+def refresh_supplier(collection: Collection, supplier: dict) -> bool:
+    """
+    Re-extract the supplier's pages and update the record in place. Returns
+    False when the pages could not be read or the update was not usable.
+    """
+    name = supplier.get("company_name")
+    urls = refresh_urls(supplier)
+    if not urls:
+        logger.info(f"Cannot refresh {name}: no website on record")
+        return False
+
+    response = get_tavily_governor().call(
+        lambda: check_tavily_response(tools.tavily_extract.invoke({"urls": urls}))
+    )
+    pages = [
+        {"url": page.get("url"), "content": (page.get("raw_content") or "")[:REFRESH_PAGE_CHARS]}
+        for page in (response or {}).get("results", [])
+        if page.get("raw_content")
+    ]
+    if not pages:
+        collection.update_one({"_id": supplier["_id"]}, {"$inc": {"verification_failures": 1}})
+        logger.warning(f"Refresh of {name} failed: website returned no content")
+        return False
+
+    stored = {
+        k: v
+        for k, v in supplier.items()
+        if k not in SUPPLIER_INTERNAL_FIELDS and k not in ("_id", "last_verified_at")
+    }
+    model_name, max_tokens = MODEL_ROUTES["tool_selection"]
+    structured = get_chat_model(model_name, max_tokens).with_structured_output(
+        Supplier, include_raw=True
+    )
+    prompt = get_supplier_refresh_prompt(
+        json.dumps(stored, default=str), json.dumps(pages, separators=(",", ":"))
+    )
+    start = time.perf_counter()
+    output = structured.invoke([HumanMessage(content=prompt)])
+    record_phase("refresh", model_name, time.perf_counter() - start, output.get("raw"))
+    if output.get("parsing_error"):
+        logger.warning(f"Refresh of {name} failed: {output['parsing_error']}")
+        return False
+
+    refreshed = output["parsed"].model_dump()
+    refreshed["company_name"] = supplier.get("company_name") or refreshed["company_name"]
+    update = {k: v for k, v in refreshed.items() if not is_missing(v)}
+    update[ENTITY_INDEX_FIELD] = list(
+        dict.fromkeys(
+            (supplier.get(ENTITY_INDEX_FIELD) or [])
+            + supplier_profile(dict(supplier, **update)).keys()
+        )
+    )
+    update["last_verified_at"] = update[SUPPLIER_UPDATED_FIELD] = datetime.now(timezone.utc)
+    update["verification_failures"] = 0
+    collection.update_one(
+        {"_id": supplier["_id"]},
+        {"$set": update, "$unset": {"refresh_claimed_until": ""}},
+    )
+    changed = sorted(k for k in refreshed if k in stored and stored[k] != refreshed[k])
+    logger.info(f"Refreshed {name}; changed fields: {changed or 'none'}")
+    return True
+
+
+def run_refresh_pass() -> dict:
+    """
+    Refresh up to REFRESH_BATCH_SIZE stale suppliers within the call budget
+    (one extract and one LLM call each).
+    """
+    summary = {"refreshed": 0, "failed": 0, "budget_exhausted": False}
+    if get_tavily_governor().breaker.is_open() or get_openai_governor().breaker.is_open():
+        logger.info("Skipping the refresh pass while an upstream circuit is open")
+        return summary
+    _, collection = get_supplier_db_and_collection()
+    for _ in range(REFRESH_BATCH_SIZE):
+        supplier = claim_stale_supplier(collection, datetime.now(timezone.utc))
+        if supplier is None:
+            break
+        if not _budget.try_spend(2):
+            collection.update_one(
+                {"_id": supplier["_id"]}, {"$unset": {"refresh_claimed_until": ""}}
+            )
+            summary["budget_exhausted"] = True
+            break
+        try:
+            refreshed = refresh_supplier(collection, supplier)
+        except Exception as e:
+            logger.error(f"Refresh of {supplier.get('company_name')} failed: {str(e)}")
+            refreshed = False
+        summary["refreshed" if refreshed else "failed"] += 1
+
+    metrics.increment("refresh.refreshed", summary["refreshed"])
+    metrics.increment("refresh.failed", summary["failed"])
+    if summary["refreshed"] or summary["failed"]:
+        logger.info(f"Refresh pass: {summary}")
+    return summary
+
+
+async def refresh_worker() -> None:
+    logger.info(
+        f"Supplier refresher started (every {REFRESH_INTERVAL:.0f}s, "
+        f"off-peak hours '{REFRESH_OFF_PEAK_HOURS or 'any'}' UTC)"
+    )
+    while True:
+        if is_off_peak(datetime.now(timezone.utc)):
+            try:
+                await asyncio.to_thread(run_refresh_pass)
+            except Exception as e:
+                logger.error(f"Refresh pass failed: {str(e)}")
+        await asyncio.sleep(REFRESH_INTERVAL)
+
+
+def start_refresh_worker() -> Optional[asyncio.Task]:
+    if not REFRESH_ENABLED:
+        return None
+    return asyncio.create_task(refresh_worker(), name="supplier-refresher")
@@ -0,0 +1,588 @@
+"""
+Record/replay support for running the agent pipeline offline.
+
+Recording: pass a ReplayRecorder as a callback of an agent run (main.py does
+this when REPLAY_RECORD_DIR is set). It captures every LLM response, Tavily
+search/extract payload and MongoDB result of the run into a JSON fixture.
+
+Replay: install_replay(fixture) swaps the OpenAI models, Tavily clients and
+MongoDB client for fakes that serve the recorded payloads, so the pipeline
+(and src.main:app) runs without network access. Used by benchmarks/.
+"""
+
+import asyncio
+import copy
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage, messages_from_dict, messages_to_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+from pymongo.results import BulkWriteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+from .utils import get_logger
+
+logger = get_logger()
+
+RECORDED_TOOLS = {"web_search": "tavily_search", "web_extract": "tavily_extract", "query_mongodb": "mongo"}
+
+
+def message_key(messages: list[BaseMessage]) -> str:
+    """
+    Stable key for an LLM input: message types, contents and tool calls,
+    ignoring generated ids so a replayed conversation maps to the same key.
+    """
+    parts = [
+        (
+            message.type,
+            str(message.content),
+            [(call["name"], call["args"]) for call in getattr(message, "tool_calls", [])],
+        )
+        for message in messages
+    ]
+    encoded = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(encoded.encode()).hexdigest()
+
+
+def tool_key(kind: str, inputs: dict) -> str:
+    if kind == "tavily_search":
+        return inputs.get("query", "")
+    if kind == "tavily_extract":
+        return json.dumps(inputs.get("urls", []))
+    return json.dumps(inputs, sort_keys=True, default=str)
+
+
+def _tool_payload(output: Any) -> Any:
+    if isinstance(output, ToolMessage):
+        output = output.content
+    if isinstance(output, str):
+        try:
+            return json.loads(output)
+        except ValueError:
+            return None
+    return output
+
+
+class ReplayRecorder(BaseCallbackHandler):
+    """
+    Callback handler that captures upstream payloads of an agent run.
+    """
+
+    def __init__(self, query: str, chat_history: Optional[list] = None):
+        self.fixture = {
+            "query": query,
+            "chat_history": chat_history,
+            "llm": [],
+            "tavily_search": [],
+            "tavily_extract": [],
+            "mongo": [],
+        }
+        self._lock = threading.Lock()
+        self._llm_inputs: dict[Any, tuple[str, int]] = {}
+        self._tool_inputs: dict[Any, tuple[str, dict]] = {}
+        self._routed_runs: set = set()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs) -> None:
+        params = kwargs.get("invocation_params") or {}
+        if params.get("_type") == "phase-routed":
+            self._routed_runs.add(run_id)
+        elif parent_run_id in self._routed_runs:
+            # Delegate call of the phase router; the router's own output is recorded
+            return
+        step = sum(1 for message in messages[0] if message.type == "ai")
+        self._llm_inputs[run_id] = (message_key(messages[0]), step)
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        self._routed_runs.discard(run_id)
+        key_and_step = self._llm_inputs.pop(run_id, None)
+        if key_and_step is None:
+            return
+        message = response.generations[0][0].message
+        with self._lock:
+            self.fixture["llm"].append(
+                {
+                    "key": key_and_step[0],
+                    "step": key_and_step[1],
+                    "message": messages_to_dict([message])[0],
+                }
+            )
+
+    def on_tool_start(self, serialized, input_str, *, run_id, inputs=None, **kwargs) -> None:
+        kind = RECORDED_TOOLS.get((serialized or {}).get("name"))
+        if kind is not None:
+            self._tool_inputs[run_id] = (kind, inputs or {})
+
+    def on_tool_end(self, output, *, run_id, **kwargs) -> None:
+        kind_and_inputs = self._tool_inputs.pop(run_id, None)
+        if kind_and_inputs is None:
+            return
+        kind, inputs = kind_and_inputs
+        payload = _tool_payload(output)
+        if payload is None:
+            return
+        with self._lock:
+            self.fixture[kind].append({"key": tool_key(kind, inputs), "response": payload})
+
+    def save(self, directory: str, name: str) -> Path:
+        path = Path(directory) / f"{name}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.fixture, indent=2, default=str))
+        logger.info(
+            f"Recorded fixture {path}: {len(self.fixture['llm'])} LLM calls, "
+            f"{len(self.fixture['tavily_search'])} searches, "
+            f"{len(self.fixture['tavily_extract'])} extractions, "
+            f"{len(self.fixture['mongo'])} MongoDB queries"
+        )
+        return path
+
+
+def load_fixture(path: str) -> dict:
+    return json.loads(Path(path).read_text())
+
+
+class ReplayStats:
+    """
+    Counters of replayed upstream calls, read by the benchmarks.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: dict[str, int] = {}
+        self.misses: dict[str, int] = {}
+
+    def hit(self, kind: str) -> None:
+        with self._lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def miss(self, kind: str) -> None:
+        with self._lock:
+            self.misses[kind] = self.misses.get(kind, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"calls": dict(self.counts), "misses": dict(self.misses)}
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    Chat model that answers from recorded LLM responses: by exact input key
+    first, then by step number (count of prior AI messages) when the prompt
+    changed since recording. `latency` simulates upstream response time.
+    """
+
+    model_name: str = "replay"
+    fixture: dict
+    stats: Any
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def bind_tools(self, tools, **kwargs) -> "ReplayChatModel":
+        return self
+
+    def _lookup(self, messages: list[BaseMessage]) -> AIMessage:
+        records = self.fixture["llm"]
+        key = message_key(messages)
+        record = next((r for r in records if r["key"] == key), None)
+        if record is None:
+            self.stats.miss("llm")
+            step = sum(1 for message in messages if message.type == "ai")
+            record = next((r for r in records if r["step"] == step), None)
+        if record is None:
+            raise LookupError(f"No recorded LLM response for step with key {key}")
+        self.stats.hit("llm")
+        if self.latency:
+            time.sleep(self.latency)
+        return messages_from_dict([copy.deepcopy(record["message"])])[0]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self._lookup(messages))])
+
+    def with_structured_output(self, schema, *, include_raw: bool = False, **kwargs) -> Runnable:
+        def parse(messages):
+            if hasattr(messages, "to_messages"):
+                messages = messages.to_messages()
+            raw = self._lookup(messages)
+            if raw.tool_calls:
+                parsed = schema.model_validate(raw.tool_calls[0]["args"])
+            else:
+                parsed = schema.model_validate_json(str(raw.content))
+            if include_raw:
+                return {"raw": raw, "parsed": parsed, "parsing_error": None}
+            return parsed
+
+        return RunnableLambda(parse)
+
+
+class ReplayTavily:
+    """
+    Stand-in for TavilySearch/TavilyExtract serving recorded payloads.
+    """
+
+    def __init__(self, kind: str, fixture: dict, stats: ReplayStats, latency: float = 0.0):
+        self.kind = kind
+        self.records = fixture.get(kind, [])
+        self.stats = stats
+        self.latency = latency
+        self._fallback = itertools.cycle(self.records) if self.records else None
+        self._lock = threading.Lock()
+
+    def _response(self, payload: dict) -> dict:
+        key = tool_key(self.kind, payload)
+        record = next((r for r in self.records if r["key"] == key), None)
+        if record is None:
+            self.stats.miss(self.kind)
+            if self._fallback is None:
+                return {"results": []}
+            with self._lock:
+                record = next(self._fallback)
+        self.stats.hit(self.kind)
+        return copy.deepcopy(record["response"])
+
+    def invoke(self, payload: dict, *args, **kwargs) -> dict:
+        response = self._response(payload)
+        if self.latency:
+            time.sleep(self.latency)
+        return response
+
+    async def ainvoke(self, payload: dict, *args, **kwargs) -> dict:
+        response = self._response(payload)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return response
+
+
+def _get_path(document: dict, path: str) -> Any:
+    value: Any = document
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _match_value(value: Any, condition: Any) -> bool:
+    if isinstance(condition, dict) and any(op.startswith("$") for op in condition):
+        for op, operand in condition.items():
+            values = value if isinstance(value, list) else [value]
+            if op == "$in":
+                if not any(v in operand for v in values):
+                    return False
+            elif op == "$nin":
+                if any(v in operand for v in values):
+                    return False
+            elif op == "$ne":
+                if value == operand:
+                    return False
+            elif op == "$exists":
+                if (value is not None) != bool(operand):
+                    return False
+            elif op == "$regex":
+                if not any(isinstance(v, str) and re.search(operand, v, re.IGNORECASE if "i" in condition.get("$options", "") else 0) for v in values):
+                    return False
+            elif op in ("$lt", "$lte", "$gt", "$gte"):
+                try:
+                    if value is None or not {
+                        "$lt": value < operand,
+                        "$lte": value <= operand,
+                        "$gt": value > operand,
+                        "$gte": value >= operand,
+                    }[op]:
+                        return False
+                except TypeError:
+                    return False
+            elif op == "$elemMatch":
+                if not any(_match_value(v, operand) for v in values):
+                    return False
+            elif op == "$options":
+                continue
+            else:
+                raise NotImplementedError(f"Operator {op} is not supported in memory")
+        return True
+    if isinstance(value, list) and not isinstance(condition, list):
+        return condition in value
+    return value == condition
+
+
+def _text_match(document: dict, search: str) -> bool:
+    text = json.dumps(document, default=str).lower()
+    return any(term in text for term in search.lower().split())
+
+
+def matches(document: dict, query_filter: dict) -> bool:
+    for key, condition in query_filter.items():
+        if key == "$or":
+            if not any(matches(document, sub) for sub in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, sub) for sub in condition):
+                return False
+        elif key == "$text":
+            if not _text_match(document, condition["$search"]):
+                return False
+        elif not _match_value(_get_path(document, key), condition):
+            return False
+    return True
+
+
+def _set_path(document: dict, path: str, value: Any) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        document = document.setdefault(part, {})
+    document[last] = value
+
+
+def _apply_update(document: dict, update: dict, inserting: bool = False) -> None:
+    for key, value in update.get("$set", {}).items():
+        _set_path(document, key, value)
+    if inserting:
+        for key, value in update.get("$setOnInsert", {}).items():
+            _set_path(document, key, value)
+    for key, value in update.get("$addToSet", {}).items():
+        each = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+        items = document.setdefault(key, [])
+        items.extend(item for item in dict.fromkeys(each) if item not in items)
+    for key, value in update.get("$inc", {}).items():
+        document[key] = document.get(key, 0) + value
+    for key in update.get("$unset", {}):
+        document.pop(key, None)
+    for key, value in update.get("$push", {}).items():
+        each = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+        items = document.get(key, []) + list(each)
+        if isinstance(value, dict) and "$slice" in value:
+            items = items[value["$slice"]:] if value["$slice"] < 0 else items[: value["$slice"]]
+        document[key] = items
+
+
+class InMemoryCursor:
+    def __init__(self, documents: list[dict]):
+        self._documents = documents
+
+    def sort(self, key, direction: int = 1) -> "InMemoryCursor":
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, order in reversed(keys):
+            if isinstance(order, dict):
+                continue  # {"$meta": "textScore"}: keep match order
+            self._documents.sort(
+                key=lambda d: (_get_path(d, field) is None, _get_path(d, field)),
+                reverse=order < 0,
+            )
+        return self
+
+    def limit(self, count: int) -> "InMemoryCursor":
+        if count:
+            self._documents = self._documents[:count]
+        return self
+
+    def __iter__(self):
+        return iter(self._documents)
+
+
+class InMemoryCollection:
+    """
+    Minimal mongomock-style collection covering the operations this service
+    uses: find/find_one, inserts, updates, bulk UpdateOne writes,
+    find_one_and_update and indexes.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        # A frozen collection acknowledges writes without applying them
+        self.frozen = False
+        self._documents: list[dict] = []
+        self._indexes: dict[str, Any] = {"_id_": [("_id", 1)]}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def _project(self, document: dict, projection: Optional[dict]) -> dict:
+        document = copy.deepcopy(document)
+        # Text score projections ({"$meta": "textScore"}) are not modelled
+        projection = {k: v for k, v in (projection or {}).items() if not isinstance(v, dict)}
+        if not projection:
+            return document
+        if all(not v for v in projection.values()):
+            for key in projection:
+                document.pop(key, None)
+            return document
+        kept = {k: document[k] for k, v in projection.items() if v and k in document}
+        if projection.get("_id", 1):
+            kept["_id"] = document.get("_id")
+        return kept
+
+    def find(self, query_filter: Optional[dict] = None, projection: Optional[dict] = None, **kwargs) -> InMemoryCursor:
+        with self._lock:
+            found = [
+                self._project(d, projection)
+                for d in self._documents
+                if matches(d, query_filter or {})
+            ]
+        return InMemoryCursor(found)
+
+    def find_one(self, query_filter: Optional[dict] = None, projection: Optional[dict] = None) -> Optional[dict]:
+        return next(iter(self.find(query_filter, projection)), None)
+
+    def count_documents(self, query_filter: dict) -> int:
+        return sum(1 for _ in self.find(query_filter))
+
+    def insert_one(self, document: dict) -> InsertOneResult:
+        with self._lock:
+            document.setdefault("_id", f"mem{next(self._ids)}")
+            if not self.frozen:
+                self._documents.append(copy.deepcopy(document))
+        return InsertOneResult(document["_id"], True)
+
+    def insert_many(self, documents: list[dict], ordered: bool = True) -> InsertManyResult:
+        ids = [self.insert_one(document).inserted_id for document in documents]
+        return InsertManyResult(ids, True)
+
+    def _update(self, query_filter: dict, update: dict, many: bool, upsert: bool) -> UpdateResult:
+        with self._lock:
+            targets = [d for d in self._documents if matches(d, query_filter)]
+            if not many:
+                targets = targets[:1]
+            if self.frozen:
+                targets = []
+            for document in targets:
+                _apply_update(document, update)
+            upserted_id = None
+            if not targets and upsert:
+                document = {k: v for k, v in query_filter.items() if not k.startswith("$") and not isinstance(v, dict)}
+                _apply_update(document, update, inserting=True)
+                document.setdefault("_id", f"mem{next(self._ids)}")
+                self._documents.append(document)
+                upserted_id = document["_id"]
+        raw = {"n": len(targets) or int(upserted_id is not None), "nModified": len(targets)}
+        if upserted_id is not None:
+            raw["upserted"] = upserted_id
+        return UpdateResult(raw, True)
+
+    def update_one(self, query_filter: dict, update: dict, upsert: bool = False) -> UpdateResult:
+        return self._update(query_filter, update, many=False, upsert=upsert)
+
+    def update_many(self, query_filter: dict, update: dict, upsert: bool = False) -> UpdateResult:
+        return self._update(query_filter, update, many=True, upsert=upsert)
+
+    def bulk_write(self, requests: list, ordered: bool = True) -> BulkWriteResult:
+        raw = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []}
+        for index, request in enumerate(requests):
+            # pymongo.UpdateOne, the only write operation this service bulk writes
+            result = self._update(request._filter, request._doc, many=False, upsert=request._upsert)
+            if result.upserted_id is not None:
+                raw["nUpserted"] += 1
+                raw["upserted"].append({"index": index, "_id": result.upserted_id})
+            else:
+                raw["nMatched"] += result.matched_count
+                raw["nModified"] += result.modified_count
+        return BulkWriteResult(raw, True)
+
+    def find_one_and_update(self, query_filter: dict, update: dict, projection=None, sort=None, upsert: bool = False, return_document=False, **kwargs) -> Optional[dict]:
+        with self._lock:
+            candidates = InMemoryCursor([d for d in self._documents if matches(d, query_filter)])
+            if sort:
+                candidates.sort(sort)
+            document = next(iter(candidates), None)
+            if document is None:
+                if not upsert:
+                    return None
+                document = {k: v for k, v in query_filter.items() if not k.startswith("$") and not isinstance(v, dict)}
+                document.setdefault("_id", f"mem{next(self._ids)}")
+                self._documents.append(document)
+                before = None
+            else:
+                before = self._project(document, projection)
+            _apply_update(document, update, inserting=before is None)
+            return self._project(document, projection) if return_document else before
+
+    def delete_many(self, query_filter: dict) -> None:
+        with self._lock:
+            self._documents = [d for d in self._documents if not matches(d, query_filter)]
+
+    def create_index(self, keys, name: Optional[str] = None, **kwargs) -> str:
+        name = name or "_".join(f"{k}_{v}" for k, v in keys)
+        self._indexes[name] = keys
+        return name
+
+    def index_information(self) -> dict:
+        return {name: {"key": keys} for name, keys in self._indexes.items()}
+
+
+class InMemoryDatabase:
+    def __init__(self):
+        self._collections: dict[str, InMemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> InMemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = InMemoryCollection(name)
+        return self._collections[name]
+
+
+class InMemoryMongoClient:
+    def __init__(self):
+        self._databases: dict[str, InMemoryDatabase] = {}
+
+    def __getitem__(self, name: str) -> InMemoryDatabase:
+        if name not in self._databases:
+            self._databases[name] = InMemoryDatabase()
+        return self._databases[name]
+
+
+def install_replay(
+    fixture: dict,
+    llm_latency: float = 0.0,
+    tool_latency: float = 0.0,
+    persist_suppliers: bool = False,
+) -> ReplayStats:
+    """
+    Swap upstream clients for replay fakes serving `fixture`. Returns the
+    stats object counting replayed calls. Meant for offline benchmarks only.
+    Unless `persist_suppliers` is set, suppliers saved by a run are not
+    stored, so repeated runs see the same database and replay identically.
+    """
+    from . import pipeline, refresher, routing, sessions, tools, utils
+
+    stats = ReplayStats()
+    install_memory_mongo(fixture, persist_suppliers)
+
+    model = ReplayChatModel(fixture=fixture, stats=stats, latency=llm_latency)
+    utils.get_chat_model = lambda model_name, max_tokens: model
+    routing.get_chat_model = utils.get_chat_model
+    pipeline.get_chat_model = utils.get_chat_model
+    refresher.get_chat_model = utils.get_chat_model
+    sessions.get_chat_model = utils.get_chat_model
+    tools.tavily_search = ReplayTavily("tavily_search", fixture, stats, tool_latency)
+    tools.tavily_extract = ReplayTavily("tavily_extract", fixture, stats, tool_latency)
+    logger.info(f"Installed replay fixture: {len(fixture.get('llm', []))} LLM responses")
+    return stats
+
+
+def install_memory_mongo(fixture: dict, persist_suppliers: bool = False) -> InMemoryMongoClient:
+    """
+    Replace the MongoDB client with an in-memory store seeded with every
+    document MongoDB returned while `fixture` was recorded.
+    """
+    from . import utils
+
+    client = InMemoryMongoClient()
+    utils.get_supplier_db_and_collection.cache_clear()
+    utils.get_mongo_client = lambda: client
+
+    _, collection = utils.get_supplier_db_and_collection()
+    seen = set()
+    for record in fixture.get("mongo", []):
+        for document in record["response"] or []:
+            if document.get("_id") not in seen:
+                seen.add(document.get("_id"))
+                collection.insert_one(dict(document))
+    collection.frozen = not persist_suppliers
+    logger.info(f"Seeded in-memory MongoDB with {len(seen)} documents")
+    return client
@@ -0,0 +1,214 @@
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from pydantic import ValidationError
+from pymongo import DESCENDING
+
+from .config import (
+    RETRIEVAL_CANDIDATE_LIMIT,
+    RETRIEVAL_MIN_COMPLETENESS,
+    RETRIEVAL_MIN_RELEVANCE,
+    RETRIEVAL_SEED_LIMIT,
+    SUPPLIER_FRESHNESS_DAYS,
+    SUPPLIER_INTERNAL_FIELDS,
+)
+from .models import Supplier, SupplierSearchIndexQuery, supplier_document
+from .ranking import (
+    COUNTRY_CODES,
+    RankingCriteria,
+    score_suppliers,
+    supplier_features,
+    top_indices,
+)
+from .utils import (
+    create_search_index_if_not_exists,
+    get_logger,
+    get_supplier_db_and_collection,
+    mongo_deadline,
+)
+from .entities import find_duplicate_suppliers
+
+logger = get_logger()
+
+CERTIFICATION_PATTERN = re.compile(
+    r"\b(ISO[\s-]?\d{4,5}|IATF[\s-]?16949|AS[\s-]?9100|RoHS|REACH|FDA|GMP|HACCP|BRC|FSC|UL|CE)\b",
+    re.IGNORECASE,
+)
+
+# Words that describe the request rather than the supplier
+QUERY_STOPWORDS = {
+    "a", "an", "and", "any", "are", "at", "be", "best", "by", "can", "certification",
+    "certifications", "certified", "company", "companies", "day", "days", "find", "for",
+    "from", "get", "give", "good", "have", "i", "in", "is", "lead", "less", "list", "looking",
+    "manufacturer", "manufacturers", "me", "need", "of", "on", "or", "over", "please", "provide",
+    "quality", "recommend", "show", "some", "than", "that", "the", "time", "to", "top", "under",
+    "vendor", "vendors", "want", "we", "week", "weeks", "who", "with", "within", "supplier",
+    "suppliers",
+}
+
+SEED_TOOL_CALL_ID = "db_first_lookup"
+
+
+@dataclass
+class RetrievalResult:
+    search_query: SupplierSearchIndexQuery
+    # Scored candidates, best first, each with the scores used for ranking
+    candidates: list[dict] = field(default_factory=list)
+    # Supplier documents (see models.supplier_document)
+    qualifying: list[dict] = field(default_factory=list)
+    qualifying_ids: list = field(default_factory=list)
+
+
+def _canonical_certification(text: str) -> str:
+    text = re.sub(r"[\s-]+", " ", text.strip())
+    return "RoHS" if text.lower() == "rohs" else text.upper()
+
+
+def parse_supplier_query(query: str) -> SupplierSearchIndexQuery:
+    """
+    Turn a free-text request into search criteria without an LLM call:
+    certifications are pattern-matched, the remaining content words
+    become the text search. Two-letter words are dropped unless they are
+    country codes ("us" would otherwise match any word containing it).
+    """
+    certifications = list(
+        dict.fromkeys(_canonical_certification(m) for m in CERTIFICATION_PATTERN.findall(query))
+    )
+    remainder = CERTIFICATION_PATTERN.sub(" ", query)
+    keywords = [
+        word
+        for word in re.findall(r"[a-z][a-z0-9-]*", remainder.lower())
+        if word not in QUERY_STOPWORDS and (len(word) > 2 or word in COUNTRY_CODES)
+    ]
+    return SupplierSearchIndexQuery(
+        query=" ".join(dict.fromkeys(keywords)) or None,
+        certifications=certifications or None,
+    )
+
+
+def ranking_criteria(query: str, search_query: Optional[SupplierSearchIndexQuery] = None) -> RankingCriteria:
+    return RankingCriteria.from_search_query(search_query or parse_supplier_query(query), query)
+
+
+def retrieve_suppliers(
+    query: str,
+    search_query: Optional[SupplierSearchIndexQuery] = None,
+    min_relevance: float = RETRIEVAL_MIN_RELEVANCE,
+) -> RetrievalResult:
+    """
+    Search stored suppliers for a recommendation request and rank them.
+    A supplier qualifies for a direct answer when it matches the query,
+    holds every requested certification, is located in the requested
+    region or country and within the lead time limit (meets_requirements),
+    is complete and was verified within SUPPLIER_FRESHNESS_DAYS. Pass `search_query` to use criteria
+    other than those parsed from `query` (e.g. relaxed ones).
+    """
+    search_query = search_query or parse_supplier_query(query)
+    result = RetrievalResult(search_query=search_query)
+    if not search_query.query:
+        return result
+
+    create_search_index_if_not_exists()
+    _, collection = get_supplier_db_and_collection()
+    # Certifications are checked after retrieval: stored values carry
+    # revisions ("ISO 9001:2015") that an exact $in would not match
+    query_filter = search_query.model_copy(update={"certifications": None}).build_filter()
+    with mongo_deadline():
+        documents = list(
+            collection.find(
+                query_filter,
+                {
+                    "text_score": {"$meta": "textScore"},
+                    **{field: 0 for field in SUPPLIER_INTERNAL_FIELDS},
+                },
+            )
+            .sort([("text_score", {"$meta": "textScore"}), ("rating", DESCENDING)])
+            .limit(RETRIEVAL_CANDIDATE_LIMIT)
+        )
+
+    duplicates = find_duplicate_suppliers(documents)
+    documents = [document for index, document in enumerate(documents) if index not in duplicates]
+    for document in documents:
+        document.pop("text_score", None)
+    criteria = ranking_criteria(query, search_query)
+    features = supplier_features(documents, criteria)
+    scores = score_suppliers(features)
+    # Certifications are hard requirements here, unlike in the ranking
+    eligible = (features["relevance"] >= min_relevance) & (features["certifications"] == 1)
+    for index in top_indices(scores, len(documents)):
+        if not eligible[index]:
+            continue
+        age_days = features["age_days"][index]
+        result.candidates.append(
+            {
+                "document": documents[index],
+                "score": float(scores[index]),
+                "relevance": float(features["relevance"][index]),
+                "completeness": float(features["completeness"][index]),
+                # Candidates that miss these still seed the agent, which can
+                # judge them, but are never served directly
+                "meets_requirements": bool(
+                    features["location_match"][index] and features["within_lead_time"][index]
+                ),
+                "age_days": None if np.isnan(age_days) else float(age_days),
+            }
+        )
+
+    for candidate in result.candidates:
+        fresh = (
+            candidate["age_days"] is not None
+            and candidate["age_days"] <= SUPPLIER_FRESHNESS_DAYS
+        )
+        if (
+            not fresh
+            or not candidate["meets_requirements"]
+            or candidate["completeness"] * 100 < RETRIEVAL_MIN_COMPLETENESS
+        ):
+            continue
+        try:
+            # Stored documents may predate the current schema
+            supplier = Supplier.model_validate(candidate["document"])
+        except ValidationError:
+            continue
+        result.qualifying.append(supplier_document(supplier))
+        result.qualifying_ids.append(candidate["document"].get("_id"))
+
+    logger.info(
+        f"DB-first retrieval for '{search_query.query}' (certifications: "
+        f"{search_query.certifications or []}): {len(documents)} matches, "
+        f"{len(result.candidates)} relevant, {len(result.qualifying)} qualifying"
+    )
+    return result
+
+
+def seed_messages(result: RetrievalResult) -> list[BaseMessage]:
+    """
+    Present the best stored candidates to the agent as a query_mongodb call
+    it has already made, so it starts from them instead of re-querying.
+    """
+    documents = []
+    for candidate in result.candidates[:RETRIEVAL_SEED_LIMIT]:
+        document = dict(candidate["document"])
+        document["_id"] = str(document.get("_id"))
+        documents.append(document)
+    return [
+        AIMessage(
+            content="",
+            tool_calls=[
+                {
+                    "name": "query_mongodb",
+                    "args": result.search_query.model_dump(exclude_none=True),
+                    "id": SEED_TOOL_CALL_ID,
+                }
+            ],
+        ),
+        ToolMessage(
+            content=json.dumps(documents, default=str),
+            tool_call_id=SEED_TOOL_CALL_ID,
+            name="query_mongodb",
+        ),
+    ]
@@ -0,0 +1,270 @@
+import json
+import time
+from functools import lru_cache
+from typing import Any, Optional
+
+from langchain_core.callbacks import AsyncCallbackManager, CallbackManager
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from pydantic import Field
+
+from . import metrics
+from .config import (
+    AGENT_MAX_SUPPLIERS,
+    MODEL_PRICING,
+    MODEL_ROUTES,
+    STRONG_MODEL_TOOLS,
+    WEB_TOOLS,
+)
+from .context import get_request_context
+from .prompts import get_db_only_note
+from .ratelimit import db_only_mode
+from .utils import get_chat_model, get_logger
+
+logger = get_logger()
+
+
+def _phase_cost(model_name: str, input_tokens: int, output_tokens: int) -> float:
+    input_price, output_price = MODEL_PRICING.get(model_name, (0.0, 0.0))
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def record_phase(
+    phase: str, model_name: str, seconds: float, message: Optional[AIMessage]
+) -> None:
+    """
+    Record latency, tokens and cost of one LLM call for its routing phase,
+    both process-wide (metrics endpoint) and for the current request.
+    """
+    usage = (getattr(message, "usage_metadata", None) or {}) if message else {}
+    input_tokens = usage.get("input_tokens", 0)
+    output_tokens = usage.get("output_tokens", 0)
+    cost = _phase_cost(model_name, input_tokens, output_tokens)
+
+    metrics.increment(f"llm.{phase}.calls")
+    metrics.increment(f"llm.{phase}.seconds", seconds)
+    metrics.increment(f"llm.{phase}.input_tokens", input_tokens)
+    metrics.increment(f"llm.{phase}.output_tokens", output_tokens)
+    metrics.increment(f"llm.{phase}.cost_usd", cost)
+
+    context = get_request_context()
+    if context is not None:
+        stats = context.llm_phases.setdefault(
+            phase,
+            {"model": model_name, "calls": 0, "seconds": 0.0, "tokens": 0, "cost_usd": 0.0},
+        )
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["tokens"] += input_tokens + output_tokens
+        stats["cost_usd"] += cost
+    logger.debug(
+        f"LLM phase {phase} ({model_name}): {seconds:.2f}s, "
+        f"{input_tokens}+{output_tokens} tokens, ${cost:.4f}"
+    )
+
+
+class PhaseRoutedChatModel(BaseChatModel):
+    """
+    Chat model that routes each ReAct step to the model configured for its
+    phase in MODEL_ROUTES, chosen before the call from the messages so far.
+    Steps run on the tool_selection model; the step after a
+    validate_supplier_data call (or a failed finalize) runs on the
+    evaluation model, forced to finalize when the validated shortlist is
+    full. A fast-model step that calls a STRONG_MODEL_TOOLS tool directly is
+    re-issued on the evaluation model, forced to the same tool, so the
+    supplier list is always committed by the strong model. While the Tavily
+    circuit is open, steps get no web tools and are told to work from
+    MongoDB (DB-only mode).
+    """
+
+    model_name: str = "phase-routed"
+    routes: dict[str, tuple[str, int]] = Field(default_factory=lambda: dict(MODEL_ROUTES))
+    bound_tools: Optional[list] = None
+    bind_kwargs: dict[str, Any] = Field(default_factory=dict)
+
+    @property
+    def _llm_type(self) -> str:
+        return "phase-routed"
+
+    def bind_tools(self, tools, **kwargs) -> "PhaseRoutedChatModel":
+        return self.model_copy(update={"bound_tools": list(tools), "bind_kwargs": kwargs})
+
+    def _phase_runnable(
+        self, phase: str, tool_choice: Optional[str] = None
+    ) -> tuple[str, Runnable]:
+        model_name, max_tokens = self.routes[phase]
+        model = get_chat_model(model_name, max_tokens)
+        if self.bound_tools is not None:
+            tools = self.bound_tools
+            if db_only_mode():
+                tools = [tool for tool in tools if getattr(tool, "name", None) not in WEB_TOOLS]
+            bind_kwargs = dict(self.bind_kwargs)
+            if tool_choice:
+                bind_kwargs["tool_choice"] = tool_choice
+            return model_name, model.bind_tools(tools, **bind_kwargs)
+        return model_name, model
+
+    def _with_mode_note(self, messages) -> list:
+        if self.bound_tools is None or not db_only_mode():
+            return messages
+        logger.warning("Tavily circuit is open, running the step in DB-only mode")
+        metrics.increment("breaker.db_only_steps")
+        return [*messages, SystemMessage(content=get_db_only_note())]
+
+    def _forced_finalize(self) -> Optional[str]:
+        """
+        The STRONG_MODEL_TOOLS tool the step must call because the request's
+        deadline is near, so the run ends with the suppliers gathered so far.
+        """
+        context = get_request_context()
+        if context is None or not context.finalize_due():
+            return None
+        name = self._strong_tool()
+        if name:
+            logger.warning(
+                f"Request {context.request_id} has {context.remaining():.1f}s left, forcing {name}"
+            )
+            metrics.increment("deadline.forced_finalize")
+        return name
+
+    def _routes_differ(self) -> bool:
+        return self.routes["tool_selection"] != self.routes["evaluation"]
+
+    def _strong_tool(self) -> Optional[str]:
+        for tool in self.bound_tools or []:
+            name = getattr(tool, "name", None)
+            if name in STRONG_MODEL_TOOLS:
+                return name
+        return None
+
+    def _route(self, messages) -> tuple[str, Optional[str]]:
+        """
+        The phase of the next step and the tool it must call, if any. The
+        last tool round tells: after validate_supplier_data the shortlist
+        is evaluated, and finalized outright when validation passed for a
+        full list; after a failed finalize the strong model tries again.
+        """
+        finalize = self._forced_finalize()
+        if finalize:
+            return "evaluation", finalize
+        if self.bound_tools is None or not self._routes_differ():
+            return "tool_selection", None
+        for message in reversed(messages):
+            if not isinstance(message, ToolMessage):
+                break
+            if message.name in STRONG_MODEL_TOOLS and message.status == "error":
+                return "evaluation", None
+            if message.name == "validate_supplier_data" and message.status != "error":
+                try:
+                    valid_count = json.loads(message.content).get("valid_count", 0)
+                except (TypeError, ValueError, AttributeError):
+                    valid_count = 0
+                if valid_count >= AGENT_MAX_SUPPLIERS:
+                    logger.info("Shortlist validated, finalizing on the strong model")
+                    return "evaluation", self._strong_tool()
+                return "evaluation", None
+        return "tool_selection", None
+
+    def _strong_call(self, phase: str, message: AIMessage) -> Optional[str]:
+        """
+        The STRONG_MODEL_TOOLS tool a fast-model step called, which the
+        evaluation model has to make instead.
+        """
+        if phase != "tool_selection" or self.bound_tools is None or not self._routes_differ():
+            return None
+        for call in getattr(message, "tool_calls", None) or []:
+            if call["name"] in STRONG_MODEL_TOOLS:
+                logger.info(f"Fast model called {call['name']}, re-issuing it on the strong model")
+                metrics.increment("llm.reissued_strong_calls")
+                return call["name"]
+        return None
+
+    def _child_config(self, run_manager, manager_class) -> RunnableConfig:
+        """
+        Trace delegated calls as children of this model's run (LLM run
+        managers have no get_child(), so build the child manager directly).
+        """
+        if run_manager is None:
+            return RunnableConfig()
+        manager = manager_class(handlers=[], parent_run_id=run_manager.run_id)
+        manager.set_handlers(run_manager.inheritable_handlers)
+        manager.add_tags(run_manager.inheritable_tags)
+        manager.add_metadata(run_manager.inheritable_metadata)
+        return RunnableConfig(callbacks=manager)
+
+    def _run_phase(
+        self, phase: str, messages, stop, run_manager, tool_choice: Optional[str] = None
+    ) -> AIMessage:
+        model_name, runnable = self._phase_runnable(phase, tool_choice)
+        start = time.perf_counter()
+        config = self._child_config(run_manager, CallbackManager)
+        message = runnable.invoke(messages, config, stop=stop)
+        record_phase(phase, model_name, time.perf_counter() - start, message)
+        return message
+
+    async def _arun_phase(
+        self, phase: str, messages, stop, run_manager, tool_choice: Optional[str] = None
+    ) -> AIMessage:
+        model_name, runnable = self._phase_runnable(phase, tool_choice)
+        start = time.perf_counter()
+        config = self._child_config(run_manager, AsyncCallbackManager)
+        message = await runnable.ainvoke(messages, config, stop=stop)
+        record_phase(phase, model_name, time.perf_counter() - start, message)
+        return message
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        messages = self._with_mode_note(messages)
+        phase, tool_choice = self._route(messages)
+        message = self._run_phase(phase, messages, stop, run_manager, tool_choice)
+        strong_tool = self._strong_call(phase, message)
+        if strong_tool:
+            message = self._run_phase("evaluation", messages, stop, run_manager, strong_tool)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> ChatResult:
+        messages = self._with_mode_note(messages)
+        phase, tool_choice = self._route(messages)
+        message = await self._arun_phase(phase, messages, stop, run_manager, tool_choice)
+        strong_tool = self._strong_call(phase, message)
+        if strong_tool:
+            message = await self._arun_phase(
+                "evaluation", messages, stop, run_manager, strong_tool
+            )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def with_structured_output(self, schema, **kwargs) -> Runnable:
+        model_name, max_tokens = self.routes["synthesis"]
+        structured = get_chat_model(model_name, max_tokens).with_structured_output(
+            schema, include_raw=True, **kwargs
+        )
+
+        def _unwrap(output: dict, seconds: float):
+            record_phase("synthesis", model_name, seconds, output.get("raw"))
+            if output.get("parsing_error"):
+                raise output["parsing_error"]
+            return output["parsed"]
+
+        def synthesize(messages, config: RunnableConfig):
+            start = time.perf_counter()
+            output = structured.invoke(messages, config)
+            return _unwrap(output, time.perf_counter() - start)
+
+        async def asynthesize(messages, config: RunnableConfig):
+            start = time.perf_counter()
+            output = await structured.ainvoke(messages, config)
+            return _unwrap(output, time.perf_counter() - start)
+
+        return RunnableLambda(synthesize, afunc=asynthesize, name="synthesis")
+
+
+@lru_cache
+def get_routed_llm() -> PhaseRoutedChatModel:
+    routes = dict(MODEL_ROUTES)
+    return PhaseRoutedChatModel(
+        routes=routes,
+        model_name=" -> ".join(dict.fromkeys(name for name, _ in routes.values())),
+    )
@@ -0,0 +1,227 @@
+"""
+Server-side conversation sessions. Clients send a session id with only the
+new message instead of re-sending the whole conversation every turn.
+
+A session keeps its latest SESSION_MAX_MESSAGES messages and the suppliers
+of its last reply. Prompts get the latest SESSION_RECENT_MESSAGES messages
+verbatim and a rolling summary of everything before them. The summary is
+cached on the session and extended in the background, one cheap-route LLM
+call per SESSION_SUMMARY_BATCH messages, so prompts stay the same size
+however long the conversation gets.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Optional
+
+from langchain_core.messages import HumanMessage
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.collection import Collection
+
+from .config import (
+    MODEL_ROUTES,
+    SESSION_MAX_MESSAGES,
+    SESSION_RECENT_MESSAGES,
+    SESSION_REPLY_SUPPLIERS,
+    SESSION_SUMMARY_BATCH,
+    SESSION_TTL_DAYS,
+)
+from .models import SessionRecord
+from .prompts import get_session_summary_prompt
+from .routing import record_phase
+from .utils import get_chat_model, get_logger, get_supplier_db_and_collection
+
+logger = get_logger()
+
+# One summary at a time, off the request path
+_summarizer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-summary")
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@lru_cache
+def get_sessions_collection() -> Collection:
+    db, _ = get_supplier_db_and_collection()
+    collection = db["sessions"]
+    collection.create_index(
+        [("updated_at", ASCENDING)], expireAfterSeconds=SESSION_TTL_DAYS * 86400
+    )
+    return collection
+
+
+def _message(role: str, content: str) -> dict:
+    return {"role": role, "content": content}
+
+
+def _unsummarized(session: dict) -> list[dict]:
+    """Stored messages not yet folded into the summary."""
+    messages = session.get("messages") or []
+    first = session.get("message_count", 0) - len(messages)
+    skip = max(session.get("summarized_count", 0) - first, 0)
+    return messages[skip:]
+
+
+def prompt_history(session: dict) -> list[dict]:
+    """
+    The conversation before the newest message, as chat history entries:
+    the summary (role "summary") followed by the recent messages.
+    """
+    recent = _unsummarized(session)[:-1][-SESSION_RECENT_MESSAGES:]
+    summary = session.get("summary")
+    return ([_message("summary", summary)] if summary else []) + recent
+
+
+def begin_turn(
+    session_id: str, query: str, chat_history: Optional[list[dict]] = None
+) -> list[dict]:
+    """
+    Append the user's message to the session (created on first use) and
+    return the chat history to prompt with. A chat_history sent with the
+    first message of a session seeds it, so existing conversations can move
+    to sessions; once the session exists it is ignored.
+    """
+    collection = get_sessions_collection()
+    now = _utcnow()
+    if chat_history:
+        prior = [_message(m.get("role", "user"), m.get("content", "")) for m in chat_history]
+        if prior and prior[-1] == _message("user", query):
+            prior.pop()
+        collection.update_one(
+            {"_id": session_id},
+            {
+                "$setOnInsert": {
+                    "messages": prior[-SESSION_MAX_MESSAGES:],
+                    "message_count": len(prior),
+                    "summarized_count": 0,
+                    "created_at": now,
+                }
+            },
+            upsert=True,
+        )
+    session = collection.find_one_and_update(
+        {"_id": session_id},
+        {
+            "$push": {
+                "messages": {"$each": [_message("user", query)], "$slice": -SESSION_MAX_MESSAGES}
+            },
+            "$inc": {"message_count": 1},
+            "$set": {"updated_at": now},
+            "$setOnInsert": {"summarized_count": 0, "created_at": now},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    history = prompt_history(session)
+    logger.info(
+        f"Session {session_id}: message {session['message_count']}, "
+        f"{len(history)} history entries in the prompt"
+    )
+    return history
+
+
+def reply_content(suppliers: list[dict]) -> str:
+    """The assistant's turn as the prompt will see it in later turns."""
+    if not suppliers:
+        return "No suppliers found."
+    lines = [f"Recommended {len(suppliers)} suppliers:"]
+    for supplier in suppliers[:SESSION_REPLY_SUPPLIERS]:
+        details = [
+            supplier.get("location"),
+            supplier.get("price_range"),
+            supplier.get("lead_time"),
+            ", ".join(supplier.get("certifications") or []),
+        ]
+        lines.append(
+            f"{supplier.get('company_name')} ({'; '.join(d for d in details if d)})"
+        )
+    return "\n".join(lines)
+
+
+def record_reply(session_id: str, suppliers: list[dict]) -> None:
+    """
+    Append the assistant's reply and cache its suppliers on the session;
+    schedules a summary update when enough messages have aged out.
+    """
+    try:
+        session = get_sessions_collection().find_one_and_update(
+            {"_id": session_id},
+            {
+                "$push": {
+                    "messages": {
+                        "$each": [_message("assistant", reply_content(suppliers))],
+                        "$slice": -SESSION_MAX_MESSAGES,
+                    }
+                },
+                "$inc": {"message_count": 1},
+                "$set": {"suppliers": suppliers, "updated_at": _utcnow()},
+            },
+            projection={"message_count": 1, "summarized_count": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+    except Exception as e:
+        # The reply itself is already on its way to the client
+        logger.error(f"Recording the reply in session {session_id} failed: {str(e)}")
+        return
+    if session is None:
+        logger.warning(f"Session {session_id} expired before its reply was recorded")
+        return
+    aged = session["message_count"] - SESSION_RECENT_MESSAGES - session.get("summarized_count", 0)
+    if aged >= SESSION_SUMMARY_BATCH:
+        _summarizer.submit(summarize_session, session_id)
+
+
+def summarize_session(session_id: str) -> bool:
+    """
+    Fold the messages before the recent window into the session's summary.
+    Returns False when there was nothing to fold or the update lost a race.
+    """
+    try:
+        collection = get_sessions_collection()
+        session = collection.find_one({"_id": session_id})
+        if session is None:
+            return False
+        summarized = session.get("summarized_count", 0)
+        first = session["message_count"] - len(session.get("messages") or [])
+        fold_until = session["message_count"] - SESSION_RECENT_MESSAGES
+        aged = _unsummarized(session)[: max(fold_until - max(summarized, first), 0)]
+        if not aged:
+            return False
+
+        model_name, max_tokens = MODEL_ROUTES["tool_selection"]
+        prompt = get_session_summary_prompt(session.get("summary") or "", aged)
+        start = time.perf_counter()
+        response = get_chat_model(model_name, max_tokens).invoke([HumanMessage(content=prompt)])
+        record_phase("session_summary", model_name, time.perf_counter() - start, response)
+        summary = str(response.content).strip()
+        if not summary:
+            logger.warning(f"Session {session_id}: empty summary, keeping the messages")
+            return False
+
+        updated = collection.update_one(
+            {"_id": session_id, "summarized_count": summarized},
+            {"$set": {"summary": summary, "summarized_count": fold_until}},
+        )
+        logger.info(f"Session {session_id}: summarized {len(aged)} messages")
+        return updated.modified_count == 1
+    except Exception as e:
+        logger.error(f"Summarizing session {session_id} failed: {str(e)}")
+        return False
+
+
+def get_session(session_id: str) -> Optional[dict]:
+    return get_sessions_collection().find_one({"_id": session_id})
+
+
+def to_record(session: dict) -> SessionRecord:
+    return SessionRecord(
+        session_id=session["_id"],
+        message_count=session.get("message_count", 0),
+        summary=session.get("summary"),
+        recent_messages=_unsummarized(session),
+        suppliers=session.get("suppliers") or [],
+        updated_at=session["updated_at"],
+    )
@@ -0,0 +1,85 @@
+"""
+Cache of Tavily results shared by every worker process and instance, kept
+in the `shared_cache` MongoDB collection.
+
+Per-request tool caches (RequestContext) and the hot supplier index are
+process-local, so with N worker processes each would see 1/N of the
+traffic. Tavily responses are what is expensive to repeat, and the same
+searches and supplier pages come up across requests, so they are kept
+where every process finds them: search results under their normalized
+query (tool_cache_key), extracted pages under their URL. Entries expire
+after SHARED_CACHE_TTL_HOURS. The cache is best effort: a failed lookup is
+a miss and a failed store is only logged.
+"""
+
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+
+from . import metrics
+from .config import SHARED_CACHE_ENABLED, SHARED_CACHE_TTL_HOURS
+from .utils import get_logger, get_supplier_db_and_collection, mongo_deadline
+
+logger = get_logger()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@lru_cache
+def get_shared_cache_collection() -> Collection:
+    db, _ = get_supplier_db_and_collection()
+    collection = db["shared_cache"]
+    collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+    return collection
+
+
+def lookup(kind: str, keys: list[str]) -> dict[str, Any]:
+    """Cached values of `kind` by key; missing and expired keys are left out."""
+    if not SHARED_CACHE_ENABLED or not keys:
+        return {}
+    ids = {f"{kind}:{key}": key for key in keys}
+    try:
+        with mongo_deadline():
+            documents = get_shared_cache_collection().find(
+                # MongoDB drops expired entries about once a minute
+                {"_id": {"$in": list(ids)}, "expires_at": {"$gt": _utcnow()}}
+            )
+            found = {ids[document["_id"]]: document["value"] for document in documents}
+    except PyMongoError as e:
+        logger.warning(f"Shared cache lookup failed: {str(e)}")
+        found = {}
+    if found:
+        metrics.increment(f"shared_cache.{kind}_hits", len(found))
+    if len(found) < len(ids):
+        metrics.increment(f"shared_cache.{kind}_misses", len(ids) - len(found))
+    return found
+
+
+def store(kind: str, values: dict[str, Any]) -> None:
+    """Cache upstream results of `kind` by key for SHARED_CACHE_TTL_HOURS."""
+    if not SHARED_CACHE_ENABLED or not values:
+        return
+    expires_at = _utcnow() + timedelta(hours=SHARED_CACHE_TTL_HOURS)
+    try:
+        collection = get_shared_cache_collection()
+        with mongo_deadline():
+            # One round trip for every URL of a multi-page extract
+            collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": f"{kind}:{key}"},
+                        {"$set": {"value": value, "expires_at": expires_at}},
+                        upsert=True,
+                    )
+                    for key, value in values.items()
+                ],
+                ordered=False,
+            )
+    except PyMongoError as e:
+        logger.warning(f"Storing {len(values)} {kind} results in the shared cache failed: {str(e)}")
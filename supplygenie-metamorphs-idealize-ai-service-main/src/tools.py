@@ -2,10 +2,10 @@ from langchain_core.tools import tool
 from .utils import (
     get_tavily_extract,
     get_tavily_search,
-    get_mongo_client,
     get_logger,
     create_search_index_if_not_exists,
     get_supplier_db_and_collection,
+    mongo_deadline,
 )
 from typing import List
 from .models import (
@@ -14,14 +14,28 @@ from .models import (
     WebExtractQuery,
     Supplier,
     SupplierDataValidationQuery,
+    supplier_document,
 )
-from .config import AGENT_MAX_SUPPLIERS
+from .config import AGENT_MAX_SUPPLIERS, SUPPLIER_INTERNAL_FIELDS
+from .breaker import CircuitOpenError
+from .ratelimit import get_tavily_governor, check_tavily_response
+from .validation import validate_suppliers
+from .context import cached_tool_call, get_request_context, tool_cache_key
+from . import sharedcache
+from .entities import dedupe_search_results, dedupe_urls, site_identifier
+from .hotindex import get_hot_index
+from .ranking import rank_suppliers, within_numeric_bounds
+from .retrieval import ranking_criteria
 import json
 
 logger = get_logger()
 tavily_search = get_tavily_search()
 tavily_extract = get_tavily_extract()
-mongo_client = get_mongo_client()
+
+
+async def _checked_ainvoke(tavily_tool, payload: dict) -> dict:
+    """Async Tavily call, so a cancelled request can abort it mid-flight."""
+    return check_tavily_response(await tavily_tool.ainvoke(payload))
 
 
 @tool(
@@ -35,6 +49,8 @@ def query_mongodb(
     specialties: List[str] = None,
     certifications: List[str] = None,
     lead_time: str = None,
+    max_price: float = None,
+    max_lead_time_days: float = None,
 ) -> List[dict]:
     logger.info("Starting MongoDB query for suppliers")
     logger.info(
@@ -52,10 +68,22 @@ def query_mongodb(
         specialties=specialties,
         certifications=certifications,
         lead_time=lead_time,
+        max_price=max_price,
+        max_lead_time_days=max_lead_time_days,
     )
 
     logger.debug(f"Query parameters: {search_query.dict()}")
+    return cached_tool_call(
+        "query_mongodb",
+        search_query.model_dump(),
+        lambda: run_mongodb_query(search_query),
+    )
 
+
+def run_mongodb_query(search_query: SupplierSearchIndexQuery) -> List[dict]:
+    """
+    Body of query_mongodb without the per-request cache (used by prefetch).
+    """
     try:
         create_search_index_if_not_exists()
         logger.debug("Search index verified/created")
@@ -68,9 +96,26 @@ def query_mongodb(
             logger.info("No search criteria provided, returning empty results")
             return []
 
-        logger.info("Executing MongoDB find query...")
-        results = list(collection.find(query_filter))
+        # Bounded by the request's deadline, like every upstream call
+        with mongo_deadline():
+            results = get_hot_index().search(search_query, collection)
+            if results is not None:
+                logger.info(f"Found {len(results)} suppliers in the hot supplier index")
+                return results
+
+            logger.info("Executing MongoDB find query...")
+            results = [
+                result
+                for result in collection.find(
+                    query_filter, {field: 0 for field in SUPPLIER_INTERNAL_FIELDS}
+                )
+                if within_numeric_bounds(result, search_query)
+            ]
         logger.info(f"Found {len(results)} suppliers in MongoDB")
+        # ObjectId is not JSON serializable; keep tool output plain JSON
+        for result in results:
+            if "_id" in result:
+                result["_id"] = str(result["_id"])
 
         if results:
             logger.debug(
@@ -100,13 +145,50 @@ def query_mongodb(
     args_schema=WebSearchQuery,
 )
 def web_search(query: str) -> dict:
+    response = cached_tool_call("web_search", {"query": query}, lambda: run_web_search(query))
+    visited = _visited_sites()
+    if visited and response.get("results"):
+        results = [
+            result
+            for result in response["results"]
+            if (site_identifier(result.get("url") or "") or result.get("url")) not in visited
+        ]
+        if len(results) < len(response["results"]):
+            logger.info(
+                f"Dropped {len(response['results']) - len(results)} search results of sites "
+                "the continued run already extracted"
+            )
+            response = dict(response, results=results)
+    return response
+
+
+def _visited_sites() -> set[str]:
+    context = get_request_context()
+    return context.visited_sites if context else set()
+
+
+def run_web_search(query: str) -> dict:
+    """
+    Body of web_search without the per-request cache (used by prefetch).
+    """
     logger.info("Starting Tavily web search")
     logger.info(f"Search query: '{query}'")
     logger.debug(f"Query length: {len(query)} characters")
 
+    key = tool_cache_key("web_search", {"query": query})
+    cached = sharedcache.lookup("web_search", [key])
+    if key in cached:
+        logger.info(
+            f"Tavily web search served from the shared cache - {len(cached[key].get('results', []))} results"
+        )
+        return cached[key]
+
     try:
         logger.debug("Invoking Tavily search API...")
-        response = tavily_search.invoke({"query": query})
+        response = get_tavily_governor().call(
+            lambda: check_tavily_response(tavily_search.invoke({"query": query})),
+            afn=lambda: _checked_ainvoke(tavily_search, {"query": query}),
+        )
         logger.debug("Tavily API call completed")
 
         result_count = (
@@ -124,8 +206,21 @@ def web_search(query: str) -> dict:
                 url = result.get("url", "No URL")
                 logger.debug(f"  Result {i+1}: {title}... - {url}")
 
-        return response if isinstance(response, dict) else {"results": []}
-
+        if not isinstance(response, dict):
+            return {"results": []}
+        # Pages of the same company (subdomains, marketplace listings) would
+        # each cost an extraction and context
+        results, duplicates = dedupe_search_results(response.get("results", []))
+        if duplicates:
+            logger.info(f"Dropped {duplicates} search results duplicating another company's")
+            response = dict(response, results=results, duplicates_removed=duplicates)
+        if response.get("results"):
+            sharedcache.store("web_search", {key: response})
+        return response
+
+    except CircuitOpenError as e:
+        logger.warning(f"Tavily web search skipped: {str(e)}")
+        return {"results": [], "error": f"{str(e)}; use query_mongodb instead"}
     except Exception as e:
         logger.error(f"Tavily web search failed: {str(e)}", exc_info=True)
         logger.error(f"Error type: {type(e).__name__}")
@@ -147,54 +242,90 @@ def web_extract(urls: List[str]) -> dict:
     # Key fields we need
     key_fields = ["company_name", "location", "price_range", "lead_time", "certifications", "specialties"]
 
+    unique_urls = dedupe_urls(urls)
+    if len(unique_urls) < len(urls):
+        logger.info(f"Skipping {len(urls) - len(unique_urls)} URLs of already included sites")
+        urls = unique_urls
+
+    visited = _visited_sites()
+    if visited:
+        unvisited = [url for url in urls if (site_identifier(url) or url) not in visited]
+        if not unvisited:
+            return {
+                "results": [],
+                "error": "These sites were already extracted by the earlier search; extract other URLs",
+            }
+        if len(unvisited) < len(urls):
+            logger.info(f"Skipping {len(urls) - len(unvisited)} URLs the continued run already extracted")
+            urls = unvisited
+
+    # Pages extracted recently by any worker or instance
+    cached = sharedcache.lookup("web_extract", urls)
+    cached_pages = [cached[url] for url in urls if url in cached]
+    missing = [url for url in urls if url not in cached]
+    if cached:
+        logger.info(f"Serving {len(cached)} of {len(urls)} pages from the shared cache")
+    if not missing:
+        return {"results": cached_pages, "success": True}
+
     try:
         logger.debug("Invoking Tavily extract API...")
-        response = tavily_extract.invoke({"urls": urls})
+        response = get_tavily_governor().call(
+            lambda: check_tavily_response(tavily_extract.invoke({"urls": missing})),
+            afn=lambda: _checked_ainvoke(tavily_extract, {"urls": missing}),
+        )
         logger.info("Tavily extraction completed successfully")
 
         if not isinstance(response, dict) or "results" not in response:
             logger.error("Invalid response from Tavily extraction")
-            return {"results": [], "error": "Invalid extraction response"}
+            return {"results": cached_pages, "error": "Invalid extraction response"}
 
+        pages = response.get("results", [])
+        sharedcache.store("web_extract", {page["url"]: page for page in pages if page.get("url")})
         # Simple response without excessive analysis
-        logger.info(f"Extraction completed - {len(response.get('results', []))} pages processed")
-        return {"results": response.get("results", []), "success": True}
+        logger.info(f"Extraction completed - {len(pages)} pages processed")
+        return {"results": cached_pages + pages, "success": True}
 
+    except CircuitOpenError as e:
+        logger.warning(f"Extraction skipped: {str(e)}")
+        return {"results": cached_pages, "error": f"{str(e)}; use query_mongodb instead"}
     except Exception as e:
         logger.error(f"Extraction failed: {str(e)}", exc_info=True)
-        return {"results": [], "error": str(e)}
+        return {"results": cached_pages, "error": str(e)}
 
 
 @tool(
-    description="Validate supplier data completeness and provide specific improvement recommendations for incomplete fields.",
+    description="Validate a batch of candidate suppliers in one call: completeness score and missing fields per supplier, plus duplicates across the set.",
     args_schema=SupplierDataValidationQuery
 )
-def validate_supplier_data(supplier_data: dict) -> dict:
+def validate_supplier_data(suppliers: List[dict]) -> dict:
     """
-    Validates supplier data completeness and provides specific guidance on improving incomplete fields.
-    
+    Validates completeness of every candidate supplier and flags duplicates
+    across the batch, so the whole shortlist costs a single tool call.
+
     Args:
-        supplier_data: Dictionary containing supplier information to validate
+        suppliers: List of candidate supplier dictionaries to validate
     """
-    logger.info("Starting supplier data validation")
-    
-    required_fields = ["company_name", "location", "rating", "price_range", "lead_time", "moq", "certifications", "specialties", "response_time", "stock", "time_zone", "contact"]
-    
-    missing_fields = [field for field in required_fields if not supplier_data.get(field)]
-    
-    validation_result = {
-        "is_valid": len(missing_fields) == 0,
-        "missing_fields": missing_fields,
-        "completeness_score": round(((len(required_fields) - len(missing_fields)) / len(required_fields)) * 100, 1)
-    }
-    
-    logger.info(f"Validation completed - Completeness: {validation_result['completeness_score']}%, Valid: {validation_result['is_valid']}")
-    
+    logger.info(f"Starting supplier data validation for {len(suppliers)} candidates")
+
+    validation_result = validate_suppliers(suppliers)
+
+    logger.info(
+        f"Validation completed - Valid: {validation_result['valid_count']}/{len(suppliers)}, "
+        f"Average completeness: {validation_result['average_completeness']}%, "
+        f"Duplicates: {validation_result['duplicate_count']}"
+    )
+
     return validation_result
 
 
-@tool(description=f"Complete the supplier search and return the final results. Target: {AGENT_MAX_SUPPLIERS} suppliers, but will accept fewer if context limits are reached or thorough searching yields fewer results.")
-def finalize_supplier_search(suppliers: List[Supplier]) -> dict:
+@tool(
+    description=f"Complete the supplier search and return the final results. Target: {AGENT_MAX_SUPPLIERS} suppliers, but will accept fewer if context limits are reached or thorough searching yields fewer results. Extra suppliers are ranked locally (requirement match, completeness, rating, price, lead time) and the best {AGENT_MAX_SUPPLIERS} kept, so there is no need to compare candidates yourself. This ends the search.",
+    # A successful call ends the agent run (agents.react_agent); the supplier
+    # documents ride along as the tool message artifact and become the response
+    response_format="content_and_artifact",
+)
+def finalize_supplier_search(suppliers: List[Supplier]) -> tuple[dict, list[dict]]:
     logger.info(f"Finalizing supplier search with {len(suppliers)} suppliers")
     
     # Prefer the target number but allow fewer to prevent context overflow
@@ -203,35 +334,60 @@ def finalize_supplier_search(suppliers: List[Supplier]) -> dict:
         logger.error(error_msg)
         raise ValueError(error_msg)
     
+    # The tool arguments were validated into Supplier models; from here on
+    # the suppliers are plain documents, dumped once
+    suppliers = [supplier_document(supplier) for supplier in suppliers]
+
+    # Same checks as validate_supplier_data: drop duplicates, report gaps
+    validation = validate_suppliers(suppliers)
+    for result in validation["results"]:
+        if result["duplicate_of"] is not None:
+            logger.warning(
+                f"Dropping duplicate supplier {result['company_name']} "
+                f"(same as #{result['duplicate_of'] + 1})"
+            )
+        elif result["missing_fields"]:
+            logger.warning(
+                f"Supplier {result['company_name']} is incomplete: {result['missing_fields']}"
+            )
+    suppliers = [
+        supplier
+        for supplier, result in zip(suppliers, validation["results"])
+        if result["duplicate_of"] is None
+    ]
+
     if len(suppliers) < AGENT_MAX_SUPPLIERS:
         logger.warning(f"Found {len(suppliers)} suppliers (target was {AGENT_MAX_SUPPLIERS}). Proceeding with available suppliers to avoid context overflow.")
     
-    # Trim to exact number if more than required
+    # Keep the best ranked if more than required
     if len(suppliers) > AGENT_MAX_SUPPLIERS:
-        logger.info(f"Trimming {len(suppliers)} suppliers to exactly {AGENT_MAX_SUPPLIERS}")
-        suppliers = suppliers[:AGENT_MAX_SUPPLIERS]
+        logger.info(f"Ranking {len(suppliers)} suppliers to keep the best {AGENT_MAX_SUPPLIERS}")
+        context = get_request_context()
+        ranked = rank_suppliers(
+            suppliers,
+            ranking_criteria(context.query if context else ""),
+            limit=AGENT_MAX_SUPPLIERS,
+        )
+        suppliers = [suppliers[index] for index in ranked]
 
     if not suppliers:
         logger.warning("No suppliers provided for finalization")
     else:
         logger.debug("Supplier summary:")
         for i, supplier in enumerate(suppliers[:5]):  # Log first 5
-            name = (
-                supplier.company_name
-                if hasattr(supplier, "company_name")
-                else str(supplier)[:50]
-            )
-            logger.debug(f"  {i+1}. {name}")
+            logger.debug(f"  {i+1}. {supplier['company_name']}")
         if len(suppliers) > 5:
             logger.debug(f"  ... and {len(suppliers) - 5} more suppliers")
 
     result = {
-        "suppliers": [supplier.dict() for supplier in suppliers],
+        "suppliers": suppliers,
         "count": len(suppliers),
+        "duplicates_removed": validation["duplicate_count"],
+        "average_completeness": validation["average_completeness"],
     }
 
     logger.info(f"Search completed successfully with exactly {len(suppliers)} suppliers")
     logger.debug(
         f"Result structure: count={result['count']}, suppliers_type={type(result['suppliers'])}"
     )
-    return result
+    return result, suppliers
@@ -1,5 +1,9 @@
+import os
+from contextlib import AbstractContextManager, nullcontext
+from datetime import datetime, timezone
 from functools import lru_cache
-from pymongo import MongoClient
+import pymongo
+from pymongo import MongoClient, UpdateOne
 from pymongo.collection import Collection
 from .config import (
     OPENAI_API_KEY,
@@ -9,14 +13,32 @@ from .config import (
     TAVILY_API_KEY,
     MAX_TOKENS,
     REQUEST_TIMEOUT,
-    MAX_RETRIES,
 )
 
-from langchain_openai import ChatOpenAI
+from .context import time_budget
+from .httpclients import (
+    PooledTavilyExtractAPIWrapper,
+    PooledTavilySearchAPIWrapper,
+    get_async_http_client,
+    get_http_client,
+)
+from .ratelimit import GovernedChatOpenAI
 from langchain_tavily import TavilyExtract
 from langchain_tavily import TavilySearch
 from loguru import logger
-from .config import SEARCH_INDEX_NAME, SEARCH_INDEX_SPEC
+from .config import (
+    ENTITY_INDEX_FIELD,
+    SEARCH_INDEX_NAME,
+    SEARCH_INDEX_SPEC,
+    SUPPLIER_UPDATED_FIELD,
+)
+from .entities import (
+    create_entity_index_if_not_exists,
+    find_duplicates,
+    find_stored_matches,
+    supplier_profile,
+)
+from .validation import is_missing
 
 
 @lru_cache
@@ -30,25 +52,35 @@ def get_mongo_client() -> MongoClient:
 
 
 @lru_cache
-def get_llm() -> ChatOpenAI:
-    return ChatOpenAI(
+def get_chat_model(model_name: str, max_tokens: int) -> GovernedChatOpenAI:
+    # Retries happen in the shared OpenAI governor, which honors Retry-After
+    # across all concurrent runs instead of each client retrying on its own
+    return GovernedChatOpenAI(
         temperature=LLM_TEMPERATURE,
-        model=MODEL_NAME,
+        model=model_name,
         api_key=OPENAI_API_KEY,
-        max_tokens=MAX_TOKENS,
+        max_tokens=max_tokens,
         timeout=REQUEST_TIMEOUT,
-        max_retries=MAX_RETRIES,
+        max_retries=0,
+        # Kept-alive connections shared with the other models and Tavily
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client(),
     )
 
 
+@lru_cache
+def get_llm() -> GovernedChatOpenAI:
+    return get_chat_model(MODEL_NAME, MAX_TOKENS)
+
+
 @lru_cache
 def get_tavily_search() -> TavilySearch:
-    return TavilySearch(api_key=TAVILY_API_KEY)
+    return TavilySearch(api_wrapper=PooledTavilySearchAPIWrapper(tavily_api_key=TAVILY_API_KEY))
 
 
 @lru_cache
 def get_tavily_extract() -> TavilyExtract:
-    return TavilyExtract(api_key=TAVILY_API_KEY)
+    return TavilyExtract(apiwrapper=PooledTavilyExtractAPIWrapper(tavily_api_key=TAVILY_API_KEY))
 
 
 @lru_cache
@@ -62,6 +94,36 @@ def get_supplier_db_and_collection() -> tuple[MongoClient, Collection]:
     return db, collection
 
 
+# Clients hold sockets and background threads, which a forked worker process
+# (gunicorn preloads the app) cannot share with its parent: each process
+# opens its own on first use
+_CLIENT_FACTORIES = (
+    get_mongo_client,
+    get_supplier_db_and_collection,
+    get_http_client,
+    get_async_http_client,
+    get_chat_model,
+    get_llm,
+)
+
+
+def _forget_clients() -> None:
+    for factory in _CLIENT_FACTORIES:
+        factory.cache_clear()
+
+
+os.register_at_fork(after_in_child=_forget_clients)
+
+
+def mongo_deadline() -> AbstractContextManager:
+    """
+    pymongo.timeout() bounding the MongoDB operations in its block by what
+    is left of the current request's deadline (unbounded without one).
+    """
+    timeout = time_budget()
+    return nullcontext() if timeout is None else pymongo.timeout(timeout)
+
+
 def create_search_index_if_not_exists() -> None:
     """
     Create a text index on the collection if it does not already exist.
@@ -95,27 +157,68 @@ def save_suppliers_to_mongodb(suppliers: list) -> dict:
         
         # Convert suppliers to dictionaries if they're Pydantic models
         supplier_dicts = []
+        # The agent just researched these, so this is when they were verified
+        verified_at = datetime.now(timezone.utc)
         for supplier in suppliers:
-            if hasattr(supplier, 'dict'):
+            if hasattr(supplier, 'model_dump'):
                 # Pydantic model
-                supplier_dict = supplier.dict()
-            elif hasattr(supplier, '__dict__'):
-                # Regular object
-                supplier_dict = supplier.__dict__
+                supplier_dict = supplier.model_dump()
             else:
-                # Already a dict
+                # Supplier document (models.supplier_document)
                 supplier_dict = supplier
             
-            supplier_dicts.append(supplier_dict)
+            supplier_dicts.append(
+                dict(
+                    supplier_dict,
+                    last_verified_at=verified_at,
+                    **{SUPPLIER_UPDATED_FIELD: verified_at},
+                )
+            )
         
         if supplier_dicts:
-            # Insert suppliers into MongoDB
-            result = collection.insert_many(supplier_dicts)
-            logger.info(f"Successfully saved {len(result.inserted_ids)} suppliers to MongoDB")
+            # Suppliers already stored (or repeated in this batch) update the
+            # existing record instead of becoming a second one
+            create_entity_index_if_not_exists(collection)
+            profiles = [supplier_profile(supplier) for supplier in supplier_dicts]
+            batch_duplicates = find_duplicates(profiles)
+            # One lookup and one write for the whole batch, not one per supplier
+            matches = find_stored_matches(collection, profiles)
+            new_suppliers = []
+            updates = []
+            updated_ids = []
+            for index, (supplier, profile, match) in enumerate(
+                zip(supplier_dicts, profiles, matches)
+            ):
+                if index in batch_duplicates:
+                    continue
+                if match is None:
+                    new_suppliers.append(dict(supplier, **{ENTITY_INDEX_FIELD: profile.keys()}))
+                    continue
+                # Newly researched values win, missing fields keep the stored value
+                update = {k: v for k, v in supplier.items() if not is_missing(v)}
+                update[ENTITY_INDEX_FIELD] = list(
+                    dict.fromkeys((match.get(ENTITY_INDEX_FIELD) or []) + profile.keys())
+                )
+                updates.append(UpdateOne({"_id": match["_id"]}, {"$set": update}))
+                updated_ids.append(str(match["_id"]))
+            if updates:
+                collection.bulk_write(updates, ordered=False)
+
+            inserted_ids = []
+            if new_suppliers:
+                result = collection.insert_many(new_suppliers)
+                inserted_ids = [str(id) for id in result.inserted_ids]
+            logger.info(
+                f"Successfully saved {len(inserted_ids)} new suppliers to MongoDB, updated "
+                f"{len(updated_ids)} stored ones, skipped {len(batch_duplicates)} duplicates"
+            )
             return {
                 "success": True,
-                "inserted_count": len(result.inserted_ids),
-                "inserted_ids": [str(id) for id in result.inserted_ids]
+                "inserted_count": len(inserted_ids),
+                "inserted_ids": inserted_ids,
+                "updated_count": len(updated_ids),
+                "updated_ids": updated_ids,
+                "duplicates_skipped": len(batch_duplicates),
             }
         else:
             logger.warning("No suppliers to save")
@@ -0,0 +1,67 @@
+from .entities import find_duplicate_suppliers
+
+REQUIRED_SUPPLIER_FIELDS = [
+    "company_name",
+    "location",
+    "rating",
+    "price_range",
+    "lead_time",
+    "moq",
+    "certifications",
+    "specialties",
+    "response_time",
+    "stock",
+    "time_zone",
+    "contact",
+]
+
+# Values the model fills in when it could not find a field
+PLACEHOLDER_VALUES = {"n/a", "na", "none", "unknown", "not available", "not specified", "tbd", "-"}
+
+
+def is_missing(value) -> bool:
+    if isinstance(value, str):
+        value = value.strip()
+        return not value or value.lower() in PLACEHOLDER_VALUES
+    if isinstance(value, dict):
+        return all(is_missing(v) for v in value.values()) if value else True
+    if isinstance(value, (list, tuple)):
+        return all(is_missing(v) for v in value)
+    return value is None
+
+
+def missing_supplier_fields(supplier: dict) -> list[str]:
+    return [field for field in REQUIRED_SUPPLIER_FIELDS if is_missing(supplier.get(field))]
+
+
+def completeness_score(missing_fields: list[str]) -> float:
+    total = len(REQUIRED_SUPPLIER_FIELDS)
+    return round((total - len(missing_fields)) / total * 100, 1)
+
+
+def validate_suppliers(suppliers: list[dict]) -> dict:
+    """
+    Completeness scores, missing fields and duplicates for a batch of
+    candidate suppliers.
+    """
+    duplicates = find_duplicate_suppliers(suppliers)
+    results = []
+    for index, supplier in enumerate(suppliers):
+        missing_fields = missing_supplier_fields(supplier)
+        results.append(
+            {
+                "index": index,
+                "company_name": supplier.get("company_name"),
+                "is_valid": not missing_fields and index not in duplicates,
+                "missing_fields": missing_fields,
+                "completeness_score": completeness_score(missing_fields),
+                "duplicate_of": duplicates.get(index),
+            }
+        )
+    scores = [result["completeness_score"] for result in results]
+    return {
+        "results": results,
+        "valid_count": sum(1 for result in results if result["is_valid"]),
+        "duplicate_count": len(duplicates),
+        "average_completeness": round(sum(scores) / len(scores), 1) if scores else 0.0,
+    }
@@ -0,0 +1,127 @@
+"""
+Shared fixtures. Tests run offline: upstream clients are replaced by the
+replay fakes of src/replay.py, and MongoDB by its in-memory collection.
+"""
+
+import os
+import zlib
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("TAVILY_API_KEY", "test")
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from src import (
+    context,
+    continuation,
+    jobs,
+    pipeline,
+    profiling,
+    refresher,
+    routing,
+    sessions,
+    sharedcache,
+    tools,
+    utils,
+)
+from src.replay import install_memory_mongo, install_replay, load_fixture
+
+FIXTURES = Path(__file__).parent.parent / "benchmarks" / "fixtures"
+
+
+@pytest.fixture(autouse=True)
+def no_request_context():
+    """Each test starts outside of a request, whatever the last one started."""
+    token = context._current_context.set(None)
+    yield
+    context._current_context.reset(token)
+
+
+@pytest.fixture
+def upstreams(monkeypatch):
+    """Restore the clients install_replay/install_memory_mongo swap out."""
+    for module in (utils, routing, pipeline, refresher, sessions):
+        monkeypatch.setattr(module, "get_chat_model", module.get_chat_model)
+    monkeypatch.setattr(tools, "tavily_search", tools.tavily_search)
+    monkeypatch.setattr(tools, "tavily_extract", tools.tavily_extract)
+    monkeypatch.setattr(utils, "get_mongo_client", utils.get_mongo_client)
+    yield
+    utils.get_supplier_db_and_collection.cache_clear()
+
+
+@pytest.fixture
+def collection(upstreams):
+    """An empty in-memory supplier collection that keeps what is written."""
+    install_memory_mongo({"mongo": []}, persist_suppliers=True)
+    # Collections (and the checkpointer) of the previous test's store
+    for get_collection in (
+        continuation.get_runs_collection,
+        jobs.get_jobs_collection,
+        profiling.get_profiles_collection,
+        sessions.get_sessions_collection,
+        sharedcache.get_shared_cache_collection,
+        jobs.get_checkpointer,
+    ):
+        get_collection.cache_clear()
+    _, collection = utils.get_supplier_db_and_collection()
+    return collection
+
+
+@pytest.fixture
+def replay(upstreams):
+    """Replay the recorded zinc die casting agent run."""
+    fixture = load_fixture(str(FIXTURES / "zinc_die_casting.json"))
+    return fixture, install_replay(fixture)
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Answers each step with the next scripted message."""
+
+    script: list[AIMessage]
+    calls: list
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs) -> "ScriptedChatModel":
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = self.script[len(self.calls)]
+        self.calls.append(messages)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def make_supplier(name: str, domain: str, **fields) -> dict:
+    """A complete supplier document, with `fields` overriding the defaults."""
+    contact = fields.pop("contact", {})
+    return {
+        "company_name": name,
+        "location": "Shenzhen, China",
+        "rating": 4.5,
+        "price_range": "$3-5 USD",
+        "lead_time": "10-20 days",
+        "moq": "1000 kg",
+        "certifications": ["ISO 9001"],
+        "specialties": ["zinc die casting"],
+        "response_time": "6 hours",
+        "stock": "9 tons available",
+        "time_zone": "GMT+8",
+        "contact": {
+            "website": f"https://www.{domain}",
+            "phone": f"+86 755 {zlib.crc32(domain.encode()) % 10**7:07d}",
+            "email": f"sales@{domain}",
+            **contact,
+        },
+        **fields,
+    }
+
+
+def days_ago(days: float) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=days)
@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+import httpx
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from conftest import ScriptedChatModel, days_ago, make_supplier
+from src.agents import extract_suppliers, react_agent, researched_suppliers, run_graph
+from src.context import DeadlineExceeded
+from src.tools import finalize_supplier_search, validate_supplier_data
+from src.utils import save_suppliers_to_mongodb
+
+
+def finalize_call(suppliers: list[dict], call_id: str) -> AIMessage:
+    return AIMessage(
+        content="",
+        tool_calls=[{"name": "finalize_supplier_search", "args": {"suppliers": suppliers}, "id": call_id}],
+    )
+
+
+def test_failed_finalize_lets_the_agent_retry():
+    suppliers = [make_supplier(f"Zinc Works {i}", f"zincworks{i}.com") for i in range(3)]
+    model = ScriptedChatModel(
+        script=[finalize_call([], "empty"), finalize_call(suppliers, "full")], calls=[]
+    )
+    graph = react_agent(model, [validate_supplier_data, finalize_supplier_search], "prompt")
+
+    state = graph.invoke({"messages": [HumanMessage(content="zinc die casting")]})
+
+    tool_messages = [m for m in state["messages"] if isinstance(m, ToolMessage)]
+    assert [m.status for m in tool_messages] == ["error", "success"]
+    assert len(model.calls) == 2
+    assert [s["company_name"] for s in extract_suppliers(state)] == [
+        s["company_name"] for s in suppliers
+    ]
+
+
+def test_successful_finalize_ends_the_run():
+    suppliers = [make_supplier("Zinc Works", "zincworks.com")]
+    model = ScriptedChatModel(script=[finalize_call(suppliers, "full")], calls=[])
+    graph = react_agent(model, [finalize_supplier_search], "prompt")
+
+    state = graph.invoke({"messages": [HumanMessage(content="zinc die casting")]})
+
+    assert len(model.calls) == 1
+    assert isinstance(state["messages"][-1], ToolMessage)
+    assert len(extract_suppliers(state)) == 1
+
+
+def test_text_answer_is_answered_with_the_suppliers_found_so_far():
+    suppliers = [make_supplier(f"Zinc Works {i}", f"zincworks{i}.com") for i in range(2)]
+    validate = AIMessage(
+        content="",
+        tool_calls=[{"name": "validate_supplier_data", "args": {"suppliers": suppliers}, "id": "v"}],
+    )
+    answer = AIMessage(content="Here are your suppliers")
+    model = ScriptedChatModel(script=[validate, answer], calls=[])
+    graph = react_agent(model, [validate_supplier_data, finalize_supplier_search], "prompt")
+
+    state = run_graph(
+        graph,
+        {"query": "zinc die casting", "messages": [HumanMessage(content="zinc die casting")]},
+        {},
+    )
+
+    assert {s["company_name"] for s in extract_suppliers(state)} == {"Zinc Works 0", "Zinc Works 1"}
+    assert len(researched_suppliers(state)) == 2
+
+
+class StoppingGraph:
+    """Streams the given states, then runs out of time."""
+
+    def __init__(self, *states: dict):
+        self.states = states
+
+    def stream(self, input_payload, config=None, stream_mode=None):
+        yield from self.states
+        raise DeadlineExceeded("deadline passed")
+
+
+def test_deadline_fallback_only_stamps_researched_suppliers(collection):
+    verified_at = days_ago(200).replace(microsecond=0)
+    stored = make_supplier("Old Zinc Foundry", "oldzinc.com")
+    collection.insert_one(dict(stored, last_verified_at=verified_at))
+    researched = make_supplier("New Zinc Casting", "newzinc.com")
+    state = {
+        "query": "zinc die casting",
+        "messages": [
+            HumanMessage(content="zinc die casting"),
+            AIMessage(content="", tool_calls=[{"name": "query_mongodb", "args": {}, "id": "db"}]),
+            ToolMessage(
+                content=json.dumps([stored]),
+                name="query_mongodb",
+                tool_call_id="db",
+            ),
+            AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": "validate_supplier_data", "args": {"suppliers": [researched]}, "id": "v"}
+                ],
+            ),
+        ],
+    }
+
+    final_state = run_graph(StoppingGraph(state), {"query": "zinc die casting"}, {})
+    answer = extract_suppliers(final_state)
+    save_suppliers_to_mongodb(researched_suppliers(final_state))
+
+    assert {s["company_name"] for s in answer} == {"Old Zinc Foundry", "New Zinc Casting"}
+    assert [s["company_name"] for s in researched_suppliers(final_state)] == ["New Zinc Casting"]
+    documents = {d["company_name"]: d for d in collection.find({})}
+    assert documents["Old Zinc Foundry"]["last_verified_at"] == verified_at
+    assert documents["New Zinc Casting"]["last_verified_at"] > days_ago(1)
+
+
+def test_replayed_recommendation_returns_suppliers(replay):
+    fixture, stats = replay
+    from src.main import app
+
+    async def recommend():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(
+                "/api/v1/supply-chain/recommendations",
+                json={"query": fixture["query"], "mode": "agent"},
+            )
+
+    response = asyncio.run(recommend())
+
+    assert response.status_code == 200
+    assert response.json()["suppliers"]
+    assert stats.snapshot()["calls"]["llm"] >= 1
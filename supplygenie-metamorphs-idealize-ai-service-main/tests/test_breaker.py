@@ -0,0 +1,67 @@
+import pytest
+
+from src import breaker
+from src.breaker import CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def circuit(clock):
+    return CircuitBreaker(
+        "test", slow_call_seconds=10, window=60, min_calls=4, failure_rate=0.5, open_seconds=30
+    )
+
+
+def fail(circuit: CircuitBreaker, times: int) -> None:
+    for _ in range(times):
+        circuit.record(True, 1.0, probe=circuit.admit())
+
+
+def test_opens_once_enough_calls_failed(circuit):
+    circuit.record(False, 1.0)
+    fail(circuit, 2)
+    assert circuit.state == "closed"
+
+    fail(circuit, 1)
+
+    assert circuit.state == "open"
+    with pytest.raises(CircuitOpenError):
+        circuit.admit()
+    assert circuit.stats()["rejected"] == 1
+
+
+def test_slow_calls_open_the_circuit(circuit):
+    for _ in range(4):
+        circuit.record(False, 12.0)
+
+    assert circuit.is_open()
+
+
+def test_single_probe_closes_a_recovered_circuit(circuit, clock):
+    fail(circuit, 4)
+    clock[0] += 31
+
+    assert circuit.admit() is True
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        circuit.admit()
+    circuit.record(False, 1.0, probe=True)
+
+    assert circuit.state == "closed"
+    assert circuit.admit() is False
+
+
+def test_failed_probe_opens_the_circuit_again(circuit, clock):
+    fail(circuit, 4)
+    clock[0] += 31
+
+    circuit.record(True, 1.0, probe=circuit.admit())
+
+    assert circuit.is_open()
+    assert circuit.stats()["trips"] == 2
@@ -0,0 +1,64 @@
+import threading
+
+from src import prefetch
+from src.context import start_request_context, tool_cache_key
+
+
+def test_search_keys_ignore_case_punctuation_and_word_order():
+    assert tool_cache_key("web_search", {"query": "Zinc die-casting"}) == tool_cache_key(
+        "web_search", {"query": "casting, zinc DIE"}
+    )
+
+
+def test_mongodb_keys_keep_text_search_operators():
+    plain = tool_cache_key("query_mongodb", {"query": "zinc die casting china"})
+
+    assert tool_cache_key("query_mongodb", {"query": "Zinc  die casting CHINA"}) == plain
+    assert tool_cache_key("query_mongodb", {"query": "zinc die casting -china"}) != plain
+    assert tool_cache_key("query_mongodb", {"query": 'zinc "die casting" china'}) != plain
+
+
+def test_mongodb_keys_keep_exact_match_filters_as_they_are():
+    key = tool_cache_key("query_mongodb", {"location": "China", "specialties": ["Zinc", "Brass"]})
+
+    assert key == tool_cache_key("query_mongodb", {"location": "China", "specialties": ["Brass", "Zinc"]})
+    assert key != tool_cache_key("query_mongodb", {"location": "china", "specialties": ["Zinc", "Brass"]})
+    assert key != tool_cache_key("query_mongodb", {"location": "China", "specialties": ["zinc", "brass"]})
+
+
+def test_identical_calls_share_one_result():
+    context = start_request_context()
+    calls = []
+
+    def search():
+        calls.append(1)
+        return {"results": ["zinc"]}
+
+    first = context.cached_call("web_search:zinc", search)
+    second = context.cached_call("web_search:zinc", search)
+
+    assert first == second == {"results": ["zinc"]}
+    assert len(calls) == 1
+
+
+def test_prefetching_a_query_twice_searches_once(monkeypatch):
+    context = start_request_context()
+    searches = []
+    release = threading.Event()
+
+    def run_web_search(query):
+        searches.append(query)
+        release.wait(5)
+        return {"results": []}
+
+    monkeypatch.setattr(prefetch, "run_web_search", run_web_search)
+
+    issued = prefetch.start_prefetch(context, "zinc die casting suppliers", include_mongodb=False)
+    again = prefetch.start_prefetch(context, "zinc die casting suppliers", include_mongodb=False)
+    release.set()
+    for key in context.prefetched:
+        context.tool_cache[key].result(5)
+
+    assert issued > 0
+    assert again == 0
+    assert len(searches) == issued
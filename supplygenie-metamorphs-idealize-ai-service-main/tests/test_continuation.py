@@ -0,0 +1,43 @@
+from conftest import make_supplier
+from src import continuation
+from src.config import AGENT_MAX_SUPPLIERS
+from src.continuation import continue_run, save_run
+
+NAMES = (
+    "Apex Anchor Bolt Brisk Cobalt Delta Ember Falcon Granite Harbor Iris Jade Kestrel Lumen "
+    "Meridian Nova Orion Pinnacle Quartz Ridge Summit Titan Utopia Vertex Willow Xenon Yarrow"
+).split()
+
+
+def suppliers(names: list[str]) -> list[dict]:
+    return [make_supplier(name, f"{name.lower()}.com") for name in names]
+
+
+def names(page: list[dict]) -> set[str]:
+    return {supplier["company_name"] for supplier in page}
+
+
+def test_continuing_answers_from_the_pool_before_researching(collection, monkeypatch):
+    pooled = 2 + AGENT_MAX_SUPPLIERS + 3
+    returned, pool = suppliers(NAMES[:2]), suppliers(NAMES[2:pooled])
+    save_run("run1", "zinc die casting", "agent", None, returned, {"pool": returned + pool})
+    research = []
+
+    def research_gap(run, needed, known):
+        research.append((needed, names(known)))
+        return {"structured_response": suppliers(NAMES[pooled : pooled + needed])}
+
+    monkeypatch.setattr(continuation, "research_gap", research_gap)
+
+    first, researched = continue_run("run1")
+
+    assert names(first) <= names(pool) and len(first) == AGENT_MAX_SUPPLIERS
+    assert researched == [] and research == []
+
+    second, researched = continue_run("run1")
+
+    # The 3 pooled suppliers left, and research for the rest of the page
+    assert research == [(AGENT_MAX_SUPPLIERS - 3, names(returned + pool))]
+    assert names(second) == (names(pool) - names(first)) | names(researched)
+    assert len(researched) == AGENT_MAX_SUPPLIERS - 3
+    assert continue_run("unknown") is None
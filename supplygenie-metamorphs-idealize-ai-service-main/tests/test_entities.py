@@ -0,0 +1,77 @@
+from conftest import make_supplier
+from src import entities
+from src.config import ENTITY_INDEX_FIELD
+from src.entities import (
+    backfill_entity_index,
+    find_duplicate_suppliers,
+    find_stored_matches,
+    supplier_profile,
+)
+from src.utils import save_suppliers_to_mongodb
+
+
+def test_listings_of_one_company_are_the_same_entity():
+    supplier = make_supplier("Apex Zinc Industries Co., Ltd.", "apexzinc.com")
+    listing = make_supplier(
+        "APEX ZINC INDUSTRIES",
+        "other.com",
+        contact={"website": "https://apexzinc.com/products", "phone": "", "email": ""},
+    )
+    other = make_supplier("Beta Metals", "betametals.de")
+
+    assert supplier_profile(supplier).same_entity(supplier_profile(listing))
+    assert not supplier_profile(supplier).same_entity(supplier_profile(other))
+    assert find_duplicate_suppliers([supplier, other, listing]) == {2: 0}
+
+
+def test_stored_matches_are_looked_up_in_one_query(collection):
+    save_suppliers_to_mongodb(
+        [make_supplier("Apex Zinc", "apexzinc.com"), make_supplier("Beta Metals", "beta.de")]
+    )
+    queries = []
+    find = collection.find
+    collection.find = lambda *args, **kwargs: queries.append(args) or find(*args, **kwargs)
+
+    profiles = [
+        supplier_profile(make_supplier("Beta Metals GmbH", "beta.de")),
+        supplier_profile(make_supplier("Gamma Castings", "gamma.com")),
+        supplier_profile(make_supplier("Apex Zinc", "apexzinc.com")),
+    ]
+    matches = find_stored_matches(collection, profiles)
+
+    assert len(queries) == 1
+    assert [m and m["company_name"] for m in matches] == ["Beta Metals", None, "Apex Zinc"]
+
+
+def test_saving_updates_stored_suppliers_instead_of_duplicating(collection):
+    save_suppliers_to_mongodb([make_supplier("Apex Zinc", "apexzinc.com", rating=4.0)])
+
+    result = save_suppliers_to_mongodb(
+        [
+            make_supplier("Apex Zinc", "apexzinc.com", rating=4.8, stock="N/A"),
+            make_supplier("Beta Metals", "beta.de"),
+            make_supplier("Beta Metals", "beta.de"),
+        ]
+    )
+
+    assert (result["inserted_count"], result["updated_count"], result["duplicates_skipped"]) == (1, 1, 1)
+    documents = {d["company_name"]: d for d in collection.find({})}
+    assert len(documents) == 2
+    assert documents["Apex Zinc"]["rating"] == 4.8
+    # Missing values keep what was stored
+    assert documents["Apex Zinc"]["stock"] == "9 tons available"
+
+
+def test_backfill_writes_entity_keys_in_batches(collection, monkeypatch):
+    monkeypatch.setattr(entities, "ENTITY_BACKFILL_BATCH_SIZE", 2)
+    collection.insert_many([make_supplier(f"Legacy {i}", f"legacy{i}.com") for i in range(5)])
+    writes = []
+    bulk_write = collection.bulk_write
+    collection.bulk_write = lambda requests, **kwargs: writes.append(len(requests)) or bulk_write(
+        requests, **kwargs
+    )
+
+    assert backfill_entity_index(collection) == 5
+    assert writes == [2, 2, 1]
+    for document in collection.find({}):
+        assert document[ENTITY_INDEX_FIELD] == supplier_profile(document).keys()
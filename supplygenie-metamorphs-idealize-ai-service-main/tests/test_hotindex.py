@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from conftest import make_supplier
+from src.hotindex import HotSupplierIndex
+from src.models import SupplierSearchIndexQuery
+
+
+@pytest.fixture
+def index():
+    index = HotSupplierIndex(max_bytes=1 << 20, eviction="lru", max_posting=100, ttl=900)
+    index.activate("polling")
+    return index
+
+
+def names(suppliers: list[dict]) -> list[str]:
+    return sorted(s["company_name"] for s in suppliers)
+
+
+def test_polled_updates_move_suppliers_between_postings(collection, index):
+    started = datetime.now(timezone.utc) - timedelta(minutes=1)
+    collection.insert_many(
+        [
+            make_supplier("Apex Zinc", "apexzinc.com", location="China", updated_at=started),
+            make_supplier("Beta Metals", "beta.com", location="China", updated_at=started),
+        ]
+    )
+    china = SupplierSearchIndexQuery(location="China")
+    assert names(index.search(china, collection)) == ["Apex Zinc", "Beta Metals"]
+
+    now = datetime.now(timezone.utc)
+    collection.update_one(
+        {"company_name": "Beta Metals"}, {"$set": {"location": "Vietnam", "updated_at": now}}
+    )
+    collection.insert_one(
+        make_supplier("Gamma Castings", "gamma.com", location="China", updated_at=now)
+    )
+    since = index.poll(collection, started)
+
+    assert since == now
+    # Answered from the updated posting, without reloading it
+    loads = []
+    find = collection.find
+    collection.find = lambda *args, **kwargs: loads.append(args) or find(*args, **kwargs)
+    assert names(index.search(china, collection)) == ["Apex Zinc", "Gamma Castings"]
+    assert loads == []
+
+
+def test_changes_drop_the_text_postings_they_may_enter(collection, index):
+    collection.insert_one(make_supplier("Apex Zinc", "apexzinc.com"))
+    supplier_id = str(collection.find_one({})["_id"])
+    brass = SupplierSearchIndexQuery(query="brass")
+    assert index.search(brass, collection) == []
+
+    changed = make_supplier("Apex Zinc", "apexzinc.com", specialties=["brass"])
+    index.apply_change(supplier_id, changed)
+
+    assert ("$text", "brass") not in index._postings
@@ -0,0 +1,55 @@
+import socket
+
+import httpcore
+import pytest
+
+from src import httpclients
+from src.httpclients import DnsCache, _CachingBackend
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(httpclients.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(httpclients, "_dns_cache", DnsCache(ttl=300))
+    lookups = []
+
+    def getaddrinfo(host, port, type=0):
+        lookups.append(host)
+        addresses = ("10.0.0.1", "10.0.0.2")
+        return [(socket.AF_INET, type, 6, "", (address, port)) for address in addresses]
+
+    monkeypatch.setattr(httpclients.socket, "getaddrinfo", getaddrinfo)
+    return lookups, now
+
+
+def test_hosts_are_resolved_once_per_ttl(lookups):
+    lookups, now = lookups
+
+    assert httpclients._resolve("api.tavily.com", 443) == ["10.0.0.1", "10.0.0.2"]
+    httpclients._resolve("api.tavily.com", 443)
+    assert lookups == ["api.tavily.com"]
+
+    now[0] += 301
+    httpclients._resolve("api.tavily.com", 443)
+    assert lookups == ["api.tavily.com"] * 2
+
+
+def test_unreachable_addresses_are_resolved_again(lookups):
+    lookups, _ = lookups
+    connected = []
+
+    class Backend:
+        def connect_tcp(self, address, port, *args):
+            connected.append(address)
+            raise httpcore.ConnectError(f"{address} refused")
+
+    backend = _CachingBackend()
+    backend._backend = Backend()
+
+    with pytest.raises(httpcore.ConnectError):
+        backend.connect_tcp("api.tavily.com", 443)
+    # Every cached address was tried, then the host was forgotten
+    assert connected == ["10.0.0.1", "10.0.0.2"]
+    httpclients._resolve("api.tavily.com", 443)
+    assert lookups == ["api.tavily.com"] * 2
@@ -0,0 +1,68 @@
+import csv
+from datetime import datetime, timezone
+
+import pytest
+
+from src.ingest import ingest_file
+
+ROWS = [
+    {
+        "name": "Apex Zinc",
+        "country": "China",
+        "website": "https://apexzinc.com",
+        "phone": "+86 755 2441955",
+        "certifications": "ISO 9001;RoHS",
+        "last_verified_at": "",
+    },
+    {
+        "name": "Beta Metals",
+        "country": "Germany",
+        "website": "https://beta.de",
+        "phone": "",
+        "certifications": "",
+        "last_verified_at": "2026-09-01T00:00:00+00:00",
+    },
+]
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "suppliers.csv"
+
+    def write(rows: list[dict]):
+        with open(path, "w", newline="") as handle:
+            writer = csv.DictWriter(handle, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    return write
+
+
+def counts(summary: dict) -> tuple[int, int, int]:
+    return summary["inserted"], summary["updated"], summary["unchanged"]
+
+
+def test_rows_without_a_verification_date_are_stored_unverified(collection, source):
+    ingest_file(source(ROWS))
+
+    documents = {d["company_name"]: d for d in collection.find({})}
+    assert documents["Apex Zinc"]["last_verified_at"] is None
+    assert documents["Beta Metals"]["last_verified_at"] == datetime(2026, 9, 1, tzinfo=timezone.utc)
+    assert documents["Apex Zinc"]["contact"]["website"] == "https://apexzinc.com"
+    assert documents["Apex Zinc"]["certifications"] == ["ISO 9001", "RoHS"]
+
+
+def test_reingesting_only_writes_changed_rows(collection, source):
+    assert counts(ingest_file(source(ROWS))) == (2, 0, 0)
+    updated_at = {d["company_name"]: d["updated_at"] for d in collection.find({})}
+
+    assert counts(ingest_file(source(ROWS))) == (0, 0, 2)
+
+    changed = [dict(ROWS[0], country="Vietnam"), ROWS[1]]
+    assert counts(ingest_file(source(changed))) == (0, 1, 1)
+    documents = {d["company_name"]: d for d in collection.find({})}
+    assert len(documents) == 2
+    assert documents["Apex Zinc"]["location"] == "Vietnam"
+    assert documents["Apex Zinc"]["updated_at"] > updated_at["Apex Zinc"]
+    assert documents["Beta Metals"]["updated_at"] == updated_at["Beta Metals"]
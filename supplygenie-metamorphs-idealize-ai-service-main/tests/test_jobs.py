@@ -0,0 +1,55 @@
+import threading
+
+from langchain_core.messages import AIMessage
+
+from conftest import ScriptedChatModel, make_supplier
+from src import jobs
+from src.agents import extract_suppliers, react_agent
+from src.tools import finalize_supplier_search, validate_supplier_data
+
+SUPPLIERS = [make_supplier(f"Zinc Works {i}", f"zincworks{i}.com") for i in range(2)]
+
+
+def call(name: str, call_id: str) -> AIMessage:
+    return AIMessage(
+        content="", tool_calls=[{"name": name, "args": {"suppliers": SUPPLIERS}, "id": call_id}]
+    )
+
+
+def test_interrupted_job_resumes_from_its_checkpoint(collection, monkeypatch):
+    shutdown = threading.Event()
+
+    class InterruptedModel(ScriptedChatModel):
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            # The worker shuts down while the first step runs
+            shutdown.set()
+            return super()._generate(messages, stop, run_manager, **kwargs)
+
+    model = InterruptedModel(
+        script=[call("validate_supplier_data", "v"), call("finalize_supplier_search", "f")],
+        calls=[],
+    )
+    tools = [validate_supplier_data, finalize_supplier_search]
+    monkeypatch.setattr(
+        jobs,
+        "supply_chain_agent",
+        lambda chat_history=None, checkpointer=None: react_agent(
+            model, tools, "prompt", checkpointer
+        ),
+    )
+    job = {"_id": "job1", "query": "zinc die casting", "mode": "agent"}
+
+    assert jobs._run_job_graph(job, shutdown) is None
+    assert len(model.calls) == 1
+
+    # Another worker process reclaims the job, with its own checkpointer
+    jobs.get_checkpointer.cache_clear()
+    final_state = jobs._run_job_graph(job, threading.Event())
+
+    # Only the finalize step is left to generate
+    assert len(model.calls) == 2
+    assert len(model.calls[1]) == 4
+    assert [s["company_name"] for s in extract_suppliers(final_state)] == [
+        "Zinc Works 0",
+        "Zinc Works 1",
+    ]
@@ -0,0 +1,35 @@
+from conftest import days_ago, make_supplier
+from src.ranking import rank_suppliers
+from src.retrieval import ranking_criteria
+
+
+def test_suppliers_meeting_the_request_rank_first():
+    suppliers = [
+        make_supplier("Brass Fittings", "brass.com", specialties=["brass fittings"], rating=5.0),
+        make_supplier("Zinc Castings", "zinc.com", rating=4.0, last_verified_at=days_ago(5)),
+        make_supplier(
+            "Zinc Castings Uncertified",
+            "zincnocert.com",
+            rating=4.0,
+            certifications=[],
+            last_verified_at=days_ago(5),
+        ),
+    ]
+
+    ranked = rank_suppliers(suppliers, ranking_criteria("ISO 9001 zinc die casting"), limit=2)
+
+    assert [suppliers[index]["company_name"] for index in ranked] == [
+        "Zinc Castings",
+        "Zinc Castings Uncertified",
+    ]
+
+
+def test_fresher_suppliers_win_ties():
+    suppliers = [
+        make_supplier("Stale Zinc", "stale.com", last_verified_at=days_ago(300)),
+        make_supplier("Fresh Zinc", "fresh.com", last_verified_at=days_ago(1)),
+    ]
+
+    ranked = rank_suppliers(suppliers, ranking_criteria("zinc die casting"))
+
+    assert [suppliers[index]["company_name"] for index in ranked] == ["Fresh Zinc", "Stale Zinc"]
@@ -0,0 +1,61 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from src import ratelimit
+from src.ratelimit import GovernedChatOpenAI, UpstreamGovernor
+
+
+@pytest.fixture
+def governor(monkeypatch):
+    # A frozen clock, so the buckets do not refill during the test
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: 1000.0)
+    governor = UpstreamGovernor(
+        "openai",
+        requests_per_minute=500,
+        max_concurrency=4,
+        tokens_per_minute=6000,
+        expected_output_tokens=500,
+    )
+    monkeypatch.setattr(ratelimit, "get_openai_governor", lambda: governor)
+    return governor
+
+
+def respond(monkeypatch, output_tokens: int, reservations: list):
+    def generate(self, messages, stop=None, run_manager=None, **kwargs):
+        reservations.append(6000 - ratelimit.get_openai_governor().token_bucket.tokens)
+        message = AIMessage(
+            content="ok",
+            usage_metadata={
+                "input_tokens": 100,
+                "output_tokens": output_tokens,
+                "total_tokens": 100 + output_tokens,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    monkeypatch.setattr(ratelimit.ChatOpenAI, "_generate", generate)
+
+
+def test_calls_reserve_the_expected_output_and_settle_on_usage(governor, monkeypatch):
+    reservations = []
+    respond(monkeypatch, 100, reservations)
+    model = GovernedChatOpenAI(model="gpt-4o-mini", api_key="x", max_tokens=4096, max_retries=0)
+    prompt = [HumanMessage(content="x" * 400)]
+
+    model.invoke(prompt)
+
+    # 104 prompt tokens plus the expected output, not the 4096 max_tokens
+    assert reservations[0] == pytest.approx(604)
+    # Settled against the 200 tokens the response used
+    assert 6000 - governor.token_bucket.tokens == pytest.approx(200)
+    # Later reservations follow the output the calls produce
+    assert governor.expected_output_tokens(4096) == pytest.approx(420)
+    assert governor.expected_output_tokens(256) == 256
+
+
+def test_throttling_pauses_every_caller(governor):
+    governor.penalize(2.0)
+
+    assert governor.stats()["cooldown_remaining"] == 2.0
+    assert governor._wait_time(1000.0, 0) == 2.0
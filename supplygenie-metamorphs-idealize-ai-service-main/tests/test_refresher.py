@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+
+from conftest import days_ago, make_supplier
+from src import refresher, tools
+from src.models import Supplier
+from src.refresher import claim_stale_supplier, refresh_supplier
+
+
+def test_most_returned_stale_suppliers_are_claimed_once(collection):
+    collection.insert_many(
+        [
+            make_supplier("Popular", "popular.com", times_returned=9, last_verified_at=None),
+            make_supplier("Stale", "stale.com", times_returned=3, last_verified_at=days_ago(400)),
+            make_supplier("Fresh", "fresh.com", times_returned=9, last_verified_at=days_ago(1)),
+            make_supplier("Rare", "rare.com", times_returned=1, last_verified_at=None),
+        ]
+    )
+    now = datetime.now(timezone.utc)
+
+    claimed = [claim_stale_supplier(collection, now) for _ in range(3)]
+
+    assert [s and s["company_name"] for s in claimed] == ["Popular", "Stale", None]
+
+
+def test_refresh_updates_the_record_from_its_website(collection, monkeypatch):
+    collection.insert_one(
+        make_supplier("Apex Zinc", "apexzinc.com", lead_time="30 days", last_verified_at=None)
+    )
+    supplier = collection.find_one({})
+    extracted = []
+
+    class Extract:
+        def invoke(self, params):
+            extracted.append(params["urls"])
+            page = {"url": params["urls"][0], "raw_content": "Lead time 10-15 days"}
+            return {"results": [page]}
+
+    class Model:
+        def with_structured_output(self, schema, include_raw=False):
+            return self
+
+        def invoke(self, messages):
+            refreshed = make_supplier(
+                "Apex Zinc Co.", "apexzinc.com", lead_time="10-15 days", stock="N/A"
+            )
+            return {"parsed": Supplier.model_validate(refreshed), "raw": None}
+
+    monkeypatch.setattr(tools, "tavily_extract", Extract())
+    monkeypatch.setattr(refresher, "get_chat_model", lambda name, max_tokens: Model())
+
+    assert refresh_supplier(collection, supplier)
+
+    document = collection.find_one({})
+    assert extracted == [["https://www.apexzinc.com", "https://www.apexzinc.com/contact"]]
+    assert document["company_name"] == "Apex Zinc"
+    assert document["lead_time"] == "10-15 days"
+    # Missing values keep what was stored
+    assert document["stock"] == "9 tons available"
+    assert document["last_verified_at"] > days_ago(1)
@@ -0,0 +1,79 @@
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+from conftest import days_ago, make_supplier
+from src.ranking import supplier_age_days, supplier_features
+from src.retrieval import parse_supplier_query, ranking_criteria, retrieve_suppliers
+
+
+def qualifying_names(query: str) -> list[str]:
+    return [s["company_name"] for s in retrieve_suppliers(query, min_relevance=0.0).qualifying]
+
+
+def test_suppliers_outside_the_region_or_lead_time_do_not_qualify(collection):
+    collection.insert_many(
+        [
+            make_supplier("Shenzhen Zinc", "szzinc.com", last_verified_at=days_ago(5)),
+            make_supplier(
+                "Stuttgart Zinc",
+                "stzinc.de",
+                location="Stuttgart, Germany",
+                last_verified_at=days_ago(5),
+            ),
+            make_supplier(
+                "Slow Zinc", "slowzinc.com", lead_time="45-60 days", last_verified_at=days_ago(5)
+            ),
+        ]
+    )
+
+    result = retrieve_suppliers(
+        "zinc die casting suppliers in Asia with lead time under 30 days", min_relevance=0.0
+    )
+
+    candidates = {c["document"]["company_name"]: c for c in result.candidates}
+    assert candidates["Stuttgart Zinc"]["meets_requirements"] is False
+    assert candidates["Slow Zinc"]["meets_requirements"] is False
+    assert [s["company_name"] for s in result.qualifying] == ["Shenzhen Zinc"]
+
+
+def test_stale_and_unverified_suppliers_do_not_qualify(collection):
+    collection.insert_many(
+        [
+            make_supplier("Fresh Zinc", "freshzinc.com", last_verified_at=days_ago(5)),
+            make_supplier("Stale Zinc", "stalezinc.com", last_verified_at=days_ago(400)),
+            make_supplier("Unverified Zinc", "unverifiedzinc.com", last_verified_at=None),
+        ]
+    )
+
+    assert qualifying_names("zinc die casting") == ["Fresh Zinc"]
+
+
+def test_keywords_match_whole_words_only():
+    suppliers = [
+        make_supplier("Acme Industrial", "acme.com", location="Shenzhen, China"),
+        make_supplier("Ohio Castings", "ohiocast.com", location="Ohio, US"),
+    ]
+
+    features = supplier_features(suppliers, ranking_criteria("die casting suppliers in the us"))
+
+    assert list(features["location_match"]) == [0, 1]
+
+
+def test_short_words_are_dropped_unless_country_codes():
+    assert parse_supplier_query("zinc die casting in us").query.split() == [
+        "zinc",
+        "die",
+        "casting",
+        "us",
+    ]
+    assert "in" not in parse_supplier_query("zinc in bulk").query.split()
+
+
+def test_supplier_age_distinguishes_unverified_from_legacy_documents():
+    now = datetime.now(timezone.utc)
+    legacy = {"_id": ObjectId.from_datetime(days_ago(10))}
+
+    assert supplier_age_days({"last_verified_at": None, "_id": legacy["_id"]}, now) is None
+    assert round(supplier_age_days(legacy, now)) == 10
+    assert round(supplier_age_days({"last_verified_at": days_ago(3)}, now)) == 3
@@ -0,0 +1,94 @@
+import json
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from src import routing
+from src.config import MODEL_ROUTES
+from src.context import start_request_context
+from src.routing import get_routed_llm
+from src.tools import finalize_supplier_search, query_mongodb, validate_supplier_data, web_search
+
+TOOLS = [web_search, query_mongodb, validate_supplier_data, finalize_supplier_search]
+
+
+@pytest.fixture
+def model():
+    return get_routed_llm().bind_tools(TOOLS)
+
+
+def after(*tool_messages: ToolMessage) -> list:
+    return [HumanMessage(content="zinc die casting"), *tool_messages]
+
+
+def validation(valid_count: int) -> ToolMessage:
+    return ToolMessage(
+        content=json.dumps({"valid_count": valid_count}),
+        name="validate_supplier_data",
+        tool_call_id="v",
+    )
+
+
+def bound_tool_names(runnable) -> list[str]:
+    return [tool["function"]["name"] for tool in runnable.kwargs["tools"]]
+
+
+def test_research_steps_run_on_the_fast_model(model):
+    search = ToolMessage(content="{}", name="web_search", tool_call_id="s")
+
+    assert model._route(after()) == ("tool_selection", None)
+    assert model._route(after(search)) == ("tool_selection", None)
+    _, runnable = model._phase_runnable("tool_selection")
+    assert "finalize_supplier_search" in bound_tool_names(runnable)
+
+
+def test_fast_model_finalize_is_reissued_on_the_strong_model(model, monkeypatch):
+    calls = []
+
+    class Model:
+        def __init__(self, name):
+            self.name = name
+
+        def bind_tools(self, tools, tool_choice=None, **kwargs):
+            self.tool_choice = tool_choice
+            return self
+
+        def invoke(self, messages, config=None, stop=None):
+            calls.append((self.name, self.tool_choice))
+            return AIMessage(
+                content="",
+                tool_calls=[{"name": "finalize_supplier_search", "args": {}, "id": self.name}],
+            )
+
+    monkeypatch.setattr(routing, "get_chat_model", lambda name, max_tokens: Model(name))
+
+    message = model.invoke(after())
+
+    assert calls == [
+        (MODEL_ROUTES["tool_selection"][0], None),
+        (MODEL_ROUTES["evaluation"][0], "finalize_supplier_search"),
+    ]
+    assert message.tool_calls[0]["id"] == MODEL_ROUTES["evaluation"][0]
+
+
+def test_validated_full_shortlist_is_finalized_by_the_strong_model(model):
+    assert model._route(after(validation(10))) == ("evaluation", "finalize_supplier_search")
+    _, runnable = model._phase_runnable("evaluation", "finalize_supplier_search")
+    assert "finalize_supplier_search" in bound_tool_names(runnable)
+    assert runnable.kwargs["tool_choice"]["function"]["name"] == "finalize_supplier_search"
+
+
+def test_short_shortlist_and_failed_finalize_are_evaluated_freely(model):
+    failed = ToolMessage(
+        content="error", name="finalize_supplier_search", tool_call_id="f", status="error"
+    )
+
+    assert model._route(after(validation(3))) == ("evaluation", None)
+    assert model._route(after(failed)) == ("evaluation", None)
+
+
+def test_near_deadline_forces_finalize(model):
+    start_request_context(deadline=time.monotonic() + 1)
+
+    assert model._route(after()) == ("evaluation", "finalize_supplier_search")
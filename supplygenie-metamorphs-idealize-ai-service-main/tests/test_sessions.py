@@ -0,0 +1,46 @@
+import asyncio
+
+import httpx
+import pytest
+from conftest import make_supplier
+
+from src import main, sessions
+
+
+def get(path: str, headers: dict = None) -> httpx.Response:
+    async def request():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers=headers or {})
+
+    return asyncio.run(request())
+
+
+@pytest.fixture
+def session(collection):
+    chat_history = [{"role": "user", "content": "hello"}, {"role": "assistant", "content": "hi"}]
+    sessions.begin_turn("uid_chat1", "zinc die casting suppliers", chat_history=chat_history)
+    sessions.record_reply("uid_chat1", [make_supplier("Apex Zinc", "apexzinc.com")])
+
+
+def test_later_turns_are_prompted_with_the_stored_history(session):
+    # Once the session exists, the chat_history a client sends is ignored
+    history = sessions.begin_turn("uid_chat1", "in Vietnam", chat_history=[{"role": "user", "content": "x"}])
+
+    assert [m["content"] for m in history][:3] == ["hello", "hi", "zinc die casting suppliers"]
+    assert "Apex Zinc" in history[3]["content"]
+    assert sessions.get_session("uid_chat1")["message_count"] == 5
+
+
+def test_reading_a_session_needs_the_admin_token(session, monkeypatch):
+    path = "/api/v1/supply-chain/sessions/uid_chat1"
+    monkeypatch.setattr(main, "ADMIN_TOKEN", None)
+    assert get(path).status_code == 404
+
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    assert get(path).status_code == 403
+    assert get(path, {"X-Admin-Token": "guess"}).status_code == 403
+
+    response = get(path, {"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.json()["session_id"] == "uid_chat1"
@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from src import sharedcache
+
+
+def test_stored_results_are_found_until_they_expire(collection):
+    sharedcache.store("extract", {"https://a.com": {"raw_content": "a"}, "https://b.com": {"raw_content": "b"}})
+
+    assert sharedcache.lookup("extract", ["https://a.com", "https://b.com", "https://c.com"]) == {
+        "https://a.com": {"raw_content": "a"},
+        "https://b.com": {"raw_content": "b"},
+    }
+    assert sharedcache.lookup("search", ["https://a.com"]) == {}
+
+    cache = sharedcache.get_shared_cache_collection()
+    cache.update_many({}, {"$set": {"expires_at": sharedcache._utcnow() - timedelta(seconds=1)}})
+    assert sharedcache.lookup("extract", ["https://a.com"]) == {}
+
+
+def test_storing_many_results_is_one_write(collection):
+    cache = sharedcache.get_shared_cache_collection()
+    writes = []
+    bulk_write = cache.bulk_write
+    cache.bulk_write = lambda requests, **kwargs: writes.append(len(requests)) or bulk_write(requests, **kwargs)
+    cache.update_one = None  # Per-key writes would fail
+
+    sharedcache.store("extract", {f"https://{i}.com": {"raw_content": str(i)} for i in range(5)})
+    sharedcache.store("extract", {"https://0.com": {"raw_content": "new"}})
+
+    assert writes == [5, 1]
+    assert sharedcache.lookup("extract", ["https://0.com"]) == {"https://0.com": {"raw_content": "new"}}
@@ -8,7 +8,8 @@ interface ChatHistoryItem {
 
 interface SupplyChainRequest {
   query: string;
-  chat_history: ChatHistoryItem[];
+  chat_history?: ChatHistoryItem[];
+  session_id?: string;
 }
 
 interface SupplierResponse {
@@ -33,7 +34,7 @@ const BACKEND_API_URL = process.env.NEXT_PUBLIC_SUPPLY_CHAIN_API_URL || "https:/
 export async function POST(req: NextRequest) {
   try {
     const body: SupplyChainRequest = await req.json();
-    const { query, chat_history } = body;
+    const { query, chat_history, session_id } = body;
 
     if (!query) {
       return NextResponse.json({ error: 'Query is required' }, { status: 400 });
@@ -41,7 +42,8 @@ export async function POST(req: NextRequest) {
 
     console.log('Making request to supply chain API:', { 
       query: query.substring(0, 100) + '...', 
-      historyLength: chat_history?.length || 0 
+      historyLength: chat_history?.length || 0,
+      sessionId: session_id,
     });
 
     // Make request to the backend API
@@ -53,6 +55,7 @@ export async function POST(req: NextRequest) {
       body: JSON.stringify({
         query,
         chat_history: chat_history || [],
+        ...(session_id ? { session_id } : {}),
       }),
     });
 
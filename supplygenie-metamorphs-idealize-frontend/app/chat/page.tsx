@@ -1,6 +1,6 @@
 "use client"
 
-import { useState, useEffect } from "react"
+import { useState, useEffect, useRef } from "react"
 import { useRouter } from "next/navigation"
 import { onAuthStateChanged, signOut } from "firebase/auth"
 import { auth } from "@/lib/firebase"
@@ -51,6 +51,8 @@ export default function Chat() {
   const [renameValue, setRenameValue] = useState("")
   const [search, setSearch] = useState("")
   const [isAssistantTyping, setIsAssistantTyping] = useState(false)
+  // Sessions this page has already sent the chat's earlier messages to
+  const seededSessions = useRef(new Set<string>())
 
   const handleLogout = async () => {
     await signOut(auth)
@@ -98,20 +100,20 @@ export default function Chat() {
     });
 
     try {
-      // Build chat history for the API call
-      const chatHistory = chat.messages.map(msg => ({
-        role: (msg.type === 'user' ? 'user' : 'assistant') as 'user' | 'assistant',
-        content: msg.content
-      }));
-
-      // Add the current user message to chat history
-      chatHistory.push({
-        role: 'user' as const,
-        content: userQuery
-      });
+      // The backend keeps the conversation per session, so only the new
+      // message is sent; earlier messages go once, to seed a session the
+      // backend may not have yet (chats started before sessions existed)
+      const sessionId = `${user.uid}_${activeChat}`;
+      const chatHistory = seededSessions.current.has(sessionId)
+        ? []
+        : chat.messages.map(msg => ({
+            role: (msg.type === 'user' ? 'user' : 'assistant') as 'user' | 'assistant',
+            content: msg.content
+          }));
+      seededSessions.current.add(sessionId);
 
       // Call the supply chain API using the utility function
-      const apiData = await getSupplierRecommendations(userQuery, chatHistory);
+      const apiData = await getSupplierRecommendations(userQuery, chatHistory, sessionId);
 
       setIsAssistantTyping(false);
       
@@ -26,7 +26,10 @@ export interface SupplyChainApiResponse {
 
 export interface SupplyChainRequest {
   query: string;
-  chat_history: ChatHistoryItem[];
+  // Only needed to seed a session the backend does not know yet
+  chat_history?: ChatHistoryItem[];
+  // The backend keeps the conversation of a session between requests
+  session_id?: string;
 }
 
 export class SupplyChainApiError extends Error {
@@ -38,11 +41,13 @@ export class SupplyChainApiError extends Error {
 
 export async function getSupplierRecommendations(
   query: string,
-  chatHistory: ChatHistoryItem[] = []
+  chatHistory: ChatHistoryItem[] = [],
+  sessionId?: string
 ): Promise<SupplyChainApiResponse> {
   const request: SupplyChainRequest = {
     query,
-    chat_history: chatHistory,
+    ...(chatHistory.length > 0 ? { chat_history: chatHistory } : {}),
+    ...(sessionId ? { session_id: sessionId } : {}),
   };
 
   const response = await fetch('/api/supply-chain', {